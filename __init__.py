@@ -1,15 +1,18 @@
 import sys
 import os
+import importlib.util
 from pathlib import Path
 
 
 def _get_core_module():
-    try:
-        from . import frp_core
-        return frp_core
-    except ImportError:
-        from . import frp_core_fallback as frp_core
-        return frp_core
+    if importlib.util.find_spec('.frp_core', __name__) is not None:
+        try:
+            from . import frp_core
+            return frp_core
+        except ImportError:
+            pass
+    from . import frp_core_fallback as frp_core
+    return frp_core
 
 
 core = _get_core_module()
@@ -1,19 +1,42 @@
 #!/usr/bin/env python
-import sys
 import time
+import asyncio
+import argparse
 import logging
 import threading
-from collections import defaultdict
+from functools import lru_cache
 
 import port_scanner
 import frpc
 
+try:
+    import auto_frpc_core as core
+except ImportError:
+    import auto_frpc_core_fallback as core
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger('AutoFrpc')
 
+SHARD_COUNT = 16
+
+
+class _Shard:
+    # conns is copy-on-write: writers publish a new dict under lock,
+    # readers take the current reference without locking.
+    __slots__ = ('lock', 'conns')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.conns = {}
+
+
+@lru_cache(maxsize=4096)
+def _connection_key(target_port, proxy_port):
+    return f'{target_port}:{proxy_port}'
+
 
 class AutoFrpcManager:
     def __init__(self, server_host, server_port, target_host='localhost', 
@@ -26,130 +49,185 @@ class AutoFrpcManager:
         self.monitored_ports = ports or []
         self.min_stable_time = min_stable_time
         
-        self.active_connections = {}
-        self.port_stability = defaultdict(list)
-        self.running = False
-        self.lock = threading.Lock()
+        self._shards = [_Shard() for _ in range(SHARD_COUNT)]
+        self._window_ns = int(self.min_stable_time * 1_000_000_000)
+        self._stability = core.StabilityTracker(self._window_ns)
+        self._stop_evt = threading.Event()
+        self._reactor_thread = None
+        self._loop = None
+        self._server_pool = frpc.SharedFrpcPool(
+            self.server_host, self.server_port, self.pool_size
+        )
         
         self.scanner = port_scanner.PortScanner(
             scan_interval=self.scan_interval,
             custom_ports=self.monitored_ports if self.monitored_ports else None
         )
 
+    def _shard_for(self, port):
+        return self._shards[port & (SHARD_COUNT - 1)]
+
     def is_port_stable(self, port):
-        now = time.time()
-        with self.lock:
-            history = self.port_stability[port]
-            if not history:
-                return False
-            
-            history[:] = [t for t in history if now - t <= self.min_stable_time]
-            return len(history) >= 2
+        return self._stability.is_stable(port, time.monotonic_ns())
 
     def create_frpc_connection(self, target_port, proxy_port=None):
         if proxy_port is None:
             proxy_port = target_port
         
+        if self._loop is None:
+            raise RuntimeError('AutoFrpcManager.start() must run before creating connections')
+        
+        connection_key = _connection_key(target_port, proxy_port)
+        shard = self._shard_for(target_port)
+        
+        if connection_key in shard.conns:
+            logger.warning(f'Connection {connection_key} already exists')
+            return False
+        
         try:
             logger.info(f'Creating FRPC connection for port {target_port}')
             
-            connection_key = f'{target_port}:{proxy_port}'
-            
-            if connection_key in self.active_connections:
-                logger.warning(f'Connection {connection_key} already exists')
-                return False
-            
             frpc_instance = frpc.Frpc(
                 server_host=self.server_host,
                 server_port=self.server_port,
                 target_host=self.target_host,
                 target_port=target_port,
-                pool_size=self.pool_size
-            )
-            
-            thread = threading.Thread(
-                target=frpc_instance.run,
-                daemon=True,
-                name=f'FRPC-{target_port}-{proxy_port}'
+                shared_pool=self._server_pool,
+                loop=self._loop
             )
-            thread.start()
-            
-            with self.lock:
-                self.active_connections[connection_key] = {
-                    'instance': frpc_instance,
-                    'thread': thread,
-                    'target_port': target_port,
-                    'proxy_port': proxy_port,
-                    'created_at': time.time()
-                }
             
-            logger.info(f'Successfully created FRPC connection for port {target_port}')
-            return True
+            entry = {
+                'instance': frpc_instance,
+                'target_port': target_port,
+                'proxy_port': proxy_port,
+                'created_at': time.monotonic_ns()
+            }
             
         except Exception as e:
             logger.error(f'Failed to create FRPC connection for port {target_port}: {e}')
             return False
+        
+        with shard.lock:
+            added = connection_key not in shard.conns
+            if added:
+                conns = dict(shard.conns)
+                conns[connection_key] = entry
+                shard.conns = conns
+        
+        if not added:
+            frpc_instance.stop()
+            logger.warning(f'Connection {connection_key} already exists')
+            return False
+        
+        logger.info(f'Successfully created FRPC connection for port {target_port}')
+        return True
 
     def remove_frpc_connection(self, target_port, proxy_port=None):
         if proxy_port is None:
             proxy_port = target_port
         
-        connection_key = f'{target_port}:{proxy_port}'
+        connection_key = _connection_key(target_port, proxy_port)
+        shard = self._shard_for(target_port)
+        
+        with shard.lock:
+            conn_info = shard.conns.get(connection_key)
+            if conn_info is not None:
+                conns = dict(shard.conns)
+                del conns[connection_key]
+                shard.conns = conns
+        
+        if conn_info is None:
+            logger.warning(f'Connection {connection_key} not found')
+            return False
+        
+        try:
+            conn_info['instance'].stop()
+            logger.info(f'Stopped FRPC connection for port {target_port}')
+        except Exception as e:
+            logger.error(f'Error stopping FRPC connection: {e}')
         
-        with self.lock:
-            if connection_key not in self.active_connections:
-                logger.warning(f'Connection {connection_key} not found')
-                return False
+        return True
+
+    def evict_dead_connections(self):
+        # A client whose control task exited would otherwise keep its key and block
+        # create_frpc_connection, so drop it and let the next scan recreate it
+        for shard in self._shards:
+            dead = [(key, info) for key, info in shard.conns.items() if not info['instance'].is_alive()]
+            if not dead:
+                continue
             
-            conn_info = self.active_connections[connection_key]
-            try:
-                conn_info['instance'].stop()
-                logger.info(f'Stopped FRPC connection for port {target_port}')
-            except Exception as e:
-                logger.error(f'Error stopping FRPC connection: {e}')
+            with shard.lock:
+                conns = dict(shard.conns)
+                for key, info in dead:
+                    if conns.get(key) is info:
+                        del conns[key]
+                shard.conns = conns
             
-            del self.active_connections[connection_key]
-            return True
+            for key, info in dead:
+                info['instance'].stop()
+                logger.warning(f'FRPC connection {key} exited, removed for recreation')
 
     def handle_scan_results(self, scan_result):
+        self.evict_dead_connections()
+        
         active_ports = scan_result['active_ports']
         new_ports = scan_result['new_ports']
         closed_ports = scan_result['closed_ports']
         
-        now = time.time()
+        now = time.monotonic_ns()
+        self._stability.record(active_ports, now)
         
         for port in active_ports:
-            with self.lock:
-                self.port_stability[port].append(now)
-            
-            if self.is_port_stable(port):
+            if self._stability.is_stable(port, now):
                 self.create_frpc_connection(port)
         
+        self._stability.forget(closed_ports)
+        
         for port in closed_ports:
-            with self.lock:
-                if port in self.port_stability:
-                    del self.port_stability[port]
-            
             self.remove_frpc_connection(port)
 
     def monitor_ports(self):
         logger.info('Starting automatic FRPC monitoring')
         
-        while self.running:
+        while not self._stop_evt.is_set():
             try:
-                scan_result = self.scanner.scan(host=self.target_host)
+                scan_result = self.scanner.scan(host=self.target_host, batch=True)
                 self.handle_scan_results(scan_result)
                 
-                time.sleep(self.scan_interval)
+                self._stop_evt.wait(self.scan_interval)
                 
             except Exception as e:
                 logger.error(f'Error in monitoring loop: {e}')
-                time.sleep(5)
+                self._stop_evt.wait(5)
+
+    def run_reactor(self):
+        # Every Frpc runs its control connection as a task on this one event loop,
+        # so a single thread serves the control traffic for all proxied ports.
+        logger.info('Starting FRPC reactor')
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_forever()
+        except Exception as e:
+            logger.error(f'Error in reactor loop: {e}')
 
     def start(self):
-        self.running = True
+        self._stop_evt.clear()
         logger.info('Auto FRPC Manager starting...')
         
+        self._loop = asyncio.new_event_loop()
+        self._reactor_thread = threading.Thread(
+            target=self.run_reactor,
+            daemon=True,
+            name='AutoFrpcReactor'
+        )
+        self._reactor_thread.start()
+        
+        threading.Thread(
+            target=self._server_pool.maintain_pool,
+            daemon=True,
+            name='AutoFrpcServerPool'
+        ).start()
+        
         monitor_thread = threading.Thread(
             target=self.monitor_ports,
             daemon=True,
@@ -158,110 +236,93 @@ class AutoFrpcManager:
         monitor_thread.start()
         
         try:
-            while self.running:
-                time.sleep(1)
+            while not self._stop_evt.wait(1):
+                pass
         except KeyboardInterrupt:
             logger.info('Received interrupt, shutting down...')
             self.stop()
 
     def stop(self):
-        self.running = False
+        self._stop_evt.set()
         
-        with self.lock:
-            for connection_key, conn_info in list(self.active_connections.items()):
+        for shard in self._shards:
+            with shard.lock:
+                conns, shard.conns = shard.conns, {}
+            
+            for connection_key, conn_info in conns.items():
                 try:
                     conn_info['instance'].stop()
                     logger.info(f'Stopped connection {connection_key}')
                 except Exception as e:
                     logger.error(f'Error stopping connection {connection_key}: {e}')
         
-        self.active_connections.clear()
+        self._server_pool.stop()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
         logger.info('Auto FRPC Manager stopped')
 
     def get_status(self):
-        with self.lock:
-            status = {
-                'active_connections': len(self.active_connections),
-                'connections': []
-            }
-            
-            for connection_key, conn_info in self.active_connections.items():
-                status['connections'].append({
+        now = time.monotonic_ns()
+        connections = []
+        for shard in self._shards:
+            for connection_key, conn_info in shard.conns.items():
+                connections.append({
                     'key': connection_key,
                     'target_port': conn_info['target_port'],
                     'proxy_port': conn_info['proxy_port'],
-                    'running': conn_info['thread'].is_alive(),
-                    'uptime': time.time() - conn_info['created_at']
+                    'running': conn_info['instance'].is_alive(),
+                    'uptime': (now - conn_info['created_at']) / 1e9
                 })
-            
-            return status
+        
+        return {
+            'active_connections': len(connections),
+            'connections': connections
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='auto_frpc.py',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=(
+            'Examples:\n'
+            '  python auto_frpc.py 192.168.1.100 7000\n'
+            '  python auto_frpc.py 192.168.1.100 7000 --ports 22,80,3389\n'
+            '  python auto_frpc.py 192.168.1.100 7000 --interval 60 --pool-size 10'
+        )
+    )
+    parser.add_argument('server_host')
+    parser.add_argument('server_port', type=int)
+    parser.add_argument('--target', default='localhost', metavar='HOST',
+                        help='Target host to scan (default: localhost)')
+    parser.add_argument('--interval', type=int, default=30, metavar='SECONDS',
+                        help='Scan interval in seconds (default: 30)')
+    parser.add_argument('--pool-size', type=int, default=5, metavar='NUM',
+                        help='Connection pool size (default: 5)')
+    parser.add_argument('--ports', type=lambda v: [int(p) for p in v.split(',')], metavar='PORTS',
+                        help='Comma-separated ports to monitor (default: all ports)')
+    parser.add_argument('--stable-time', type=int, default=10, metavar='SECONDS',
+                        help='Port stability time (default: 10)')
+    parser.add_argument('--status', action='store_true',
+                        help='Show current status and exit')
+    return parser.parse_args(argv)
 
 
 def main():
-    if len(sys.argv) < 3:
-        print('Usage: python auto_frpc.py <server_host> <server_port> [options]')
-        print('')
-        print('Options:')
-        print('  --target HOST        Target host to scan (default: localhost)')
-        print('  --interval SECONDS    Scan interval in seconds (default: 30)')
-        print('  --pool-size NUM       Connection pool size (default: 5)')
-        print('  --ports PORTS        Comma-separated ports to monitor (default: all ports)')
-        print('  --stable-time SECONDS Port stability time (default: 10)')
-        print('  --status             Show current status and exit')
-        print('')
-        print('Examples:')
-        print('  python auto_frpc.py 192.168.1.100 7000')
-        print('  python auto_frpc.py 192.168.1.100 7000 --ports 22,80,3389')
-        print('  python auto_frpc.py 192.168.1.100 7000 --interval 60 --pool-size 10')
-        sys.exit(1)
-    
-    server_host = sys.argv[1]
-    server_port = int(sys.argv[2])
-    
-    target_host = 'localhost'
-    scan_interval = 30
-    pool_size = 5
-    ports = None
-    min_stable_time = 10
-    show_status = False
-    
-    i = 3
-    while i < len(sys.argv):
-        arg = sys.argv[i]
-        
-        if arg == '--target' and i + 1 < len(sys.argv):
-            target_host = sys.argv[i + 1]
-            i += 2
-        elif arg == '--interval' and i + 1 < len(sys.argv):
-            scan_interval = int(sys.argv[i + 1])
-            i += 2
-        elif arg == '--pool-size' and i + 1 < len(sys.argv):
-            pool_size = int(sys.argv[i + 1])
-            i += 2
-        elif arg == '--ports' and i + 1 < len(sys.argv):
-            ports = [int(p) for p in sys.argv[i + 1].split(',')]
-            i += 2
-        elif arg == '--stable-time' and i + 1 < len(sys.argv):
-            min_stable_time = int(sys.argv[i + 1])
-            i += 2
-        elif arg == '--status':
-            show_status = True
-            i += 1
-        else:
-            print(f'Unknown option: {arg}')
-            sys.exit(1)
+    args = parse_args()
     
     manager = AutoFrpcManager(
-        server_host=server_host,
-        server_port=server_port,
-        target_host=target_host,
-        scan_interval=scan_interval,
-        pool_size=pool_size,
-        ports=ports,
-        min_stable_time=min_stable_time
+        server_host=args.server_host,
+        server_port=args.server_port,
+        target_host=args.target,
+        scan_interval=args.interval,
+        pool_size=args.pool_size,
+        ports=args.ports,
+        min_stable_time=args.stable_time
     )
     
-    if show_status:
+    if args.status:
         import json
         status = manager.get_status()
         print(json.dumps(status, indent=2))
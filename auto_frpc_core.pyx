@@ -0,0 +1,51 @@
+# auto_frpc_core.pyx
+# AutoFrpcManager端口稳定性统计的Cython加速版本
+
+# cython: language_level=3
+#cython: boundscheck=False
+#cython: wraparound=False
+#cython: initializedcheck=False
+#cython: cdivision=True
+
+cdef enum:
+    MAX_PORTS = 65536
+
+
+cdef class StabilityTracker:
+    # 每个端口只保留最近两次出现的时间，方法在持有GIL时整体执行，无需额外加锁
+    # 时间戳为time.monotonic_ns()返回的整数纳秒
+    cdef readonly long long window
+    cdef long long[MAX_PORTS] _older
+    cdef long long[MAX_PORTS] _newer
+    cdef unsigned char[MAX_PORTS] _count
+
+    def __cinit__(self, long long window):
+        self.window = window
+        cdef int i
+        for i in range(MAX_PORTS):
+            self._count[i] = 0
+
+    cpdef void record(self, list ports, long long now):
+        cdef object port
+        cdef int p
+        for port in ports:
+            p = port
+            if p < 0 or p >= MAX_PORTS:
+                continue
+            self._older[p] = self._newer[p]
+            self._newer[p] = now
+            if self._count[p] < 2:
+                self._count[p] += 1
+
+    cpdef bint is_stable(self, int port, long long now):
+        if port < 0 or port >= MAX_PORTS:
+            return False
+        return self._count[port] >= 2 and now - self._older[port] <= self.window
+
+    cpdef void forget(self, list ports):
+        cdef object port
+        cdef int p
+        for port in ports:
+            p = port
+            if 0 <= p < MAX_PORTS:
+                self._count[p] = 0
@@ -0,0 +1,42 @@
+import threading
+from collections import defaultdict, deque
+from functools import partial
+
+SHARD_COUNT = 16
+
+
+class StabilityTracker:
+    def __init__(self, window):
+        self.window = window
+        self._locks = [threading.Lock() for _ in range(SHARD_COUNT)]
+        self._history = [defaultdict(partial(deque, maxlen=2)) for _ in range(SHARD_COUNT)]
+
+    def record(self, ports, now):
+        for port in ports:
+            shard = port & (SHARD_COUNT - 1)
+            with self._locks[shard]:
+                self._history[shard][port].append(now)
+
+    def is_stable(self, port, now):
+        shard = port & (SHARD_COUNT - 1)
+        # len() on a deque is atomic, so first sightings return without locking
+        history = self._history[shard].get(port)
+        if history is None or len(history) < 2:
+            return False
+        
+        with self._locks[shard]:
+            # Only the last two sightings matter: the port is stable when
+            # the older of them still falls inside the window.
+            return len(history) >= 2 and now - history[0] <= self.window
+
+    def forget(self, ports):
+        by_shard = defaultdict(list)
+        for port in ports:
+            by_shard[port & (SHARD_COUNT - 1)].append(port)
+        
+        # One lock acquisition per touched shard, one hash probe per port
+        for shard, shard_ports in by_shard.items():
+            history = self._history[shard]
+            with self._locks[shard]:
+                for port in shard_ports:
+                    history.pop(port, None)
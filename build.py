@@ -3,13 +3,12 @@ import sys
 import os
 import subprocess
 import shutil
+import importlib.util
+from functools import lru_cache
 
+@lru_cache(maxsize=None)
 def check_pyinstaller():
-    try:
-        import PyInstaller
-        return True
-    except ImportError:
-        return False
+    return importlib.util.find_spec("PyInstaller") is not None
 
 def install_pyinstaller():
     print("Installing PyInstaller...")
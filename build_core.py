@@ -7,17 +7,19 @@
 import subprocess
 import sys
 import os
+import importlib.util
 from pathlib import Path
 
 
 def check_cython():
-    try:
-        import Cython
-        print(f"✓ Cython版本: {Cython.__version__}")
-        return True
-    except ImportError:
+    # find_spec只定位包而不执行导入，确认存在后才导入读取版本号
+    if importlib.util.find_spec("Cython") is None:
         print("✗ Cython未安装")
         return False
+    
+    import Cython
+    print(f"✓ Cython版本: {Cython.__version__}")
+    return True
 
 
 def install_cython():
@@ -35,7 +37,30 @@ def install_cython():
         return False
 
 
-def build_core():
+def run_build(cmd, quiet=False):
+    """执行编译命令：quiet时丢弃标准输出，仅在失败时打印错误输出；否则逐行转发输出"""
+    if quiet:
+        result = subprocess.run(
+            cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            text=True, errors="replace"
+        )
+        if result.returncode != 0:
+            sys.stderr.write(result.stderr)
+            raise subprocess.CalledProcessError(result.returncode, cmd, stderr=result.stderr)
+        return
+    
+    process = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        bufsize=1, text=True, errors="replace"
+    )
+    with process.stdout:
+        for line in process.stdout:
+            sys.stdout.write(line)
+    if process.wait() != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd)
+
+
+def build_core(quiet=False):
     print("\n" + "="*50)
     print("开始编译 frp_core...")
     print("="*50)
@@ -57,10 +82,10 @@ def build_core():
     
     try:
         print("\n正在编译...")
-        subprocess.check_call([
+        run_build([
             sys.executable, "setup_single.py",
             "build_ext", "--inplace"
-        ])
+        ], quiet=quiet)
         
         print("\n" + "="*50)
         print("✓ 编译成功！")
@@ -140,7 +165,7 @@ if __name__ == "__main__":
     
     show_info()
     
-    if build_core():
+    if build_core(quiet="--quiet" in sys.argv[1:]):
         test_compiled()
         
         print("\n" + "="*50)
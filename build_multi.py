@@ -4,42 +4,99 @@
 为系统中的所有Python版本编译frp_core
 """
 
+import re
+import shutil
 import subprocess
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+from build_core import run_build
+
+
+_PY_LAUNCHER_LINE = re.compile(r"^\s*-(?:V:)?(\d+)\.(\d+)\S*\s+(?:\*\s+)?(.+?)\s*$")
+
+
+def _launcher_pythons():
+    """通过py启动器(py -0p)查询Windows已安装的Python，无需遍历磁盘"""
+    try:
+        output = subprocess.check_output(
+            ["py", "-0p"], text=True, stderr=subprocess.DEVNULL
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return []
+    
+    python_versions = []
+    for line in output.splitlines():
+        match = _PY_LAUNCHER_LINE.match(line)
+        if match:
+            major, minor, path = match.groups()
+            python_versions.append((Path(path), major + minor))
+    return python_versions
+
+
+def _path_pythons():
+    """在PATH中查找python3.x可执行文件"""
+    python_versions = []
+    for minor in range(6, 20):
+        path = shutil.which(f"python3.{minor}")
+        if path:
+            python_versions.append((Path(path), f"3{minor}"))
+    return python_versions
+
+
+def _install_roots():
+    """Windows常见的Python安装根目录"""
+    roots = ["C:\\", r"C:\Program Files"]
+    try:
+        with os.scandir(r"C:\Users") as users:
+            for user in users:
+                if user.is_dir():
+                    roots.append(os.path.join(user.path, r"AppData\Local\Programs\Python"))
+    except OSError:
+        pass
+    return roots
+
+
+def _scan_pythons():
+    """逐个扫描安装根目录下的Python*目录（最后的回退手段）"""
+    for root in _install_roots():
+        try:
+            entries = os.scandir(root)
+        except OSError:
+            continue
+        
+        with entries:
+            for entry in entries:
+                if entry.name.startswith("Python") and entry.is_dir():
+                    exe = os.path.join(entry.path, "python.exe")
+                    if os.path.exists(exe):
+                        yield Path(exe), entry.name[6:].replace(".", "")
+
 
 def find_python_versions():
     """查找系统中所有Python版本"""
-    python_versions = []
+    if os.name == "nt":
+        sources = [_launcher_pythons(), _scan_pythons()]
+    else:
+        sources = [_path_pythons()]
     
-    # Windows可能的路径
-    possible_paths = [
-        r"C:\Python*\python.exe",
-        r"C:\Program Files\Python*\python.exe",
-        r"C:\Program Files\Python3*\python.exe",
-        r"C:\Users\*\AppData\Local\Programs\Python\Python*\python.exe",
-    ]
-    
-    for pattern in possible_paths:
-        for path in Path("/").glob(pattern[1:]):
-            if path.exists():
-                version = path.parent.name.replace("Python", "").replace(".", "")
-                python_versions.append((path, version))
-    
-    # 去重
+    # 按来源依次查找，边遍历边去重；前一个来源有结果时不再扫描目录
     seen = set()
     unique_versions = []
-    for path, version in python_versions:
-        if version not in seen and version.isdigit():
-            seen.add(version)
-            unique_versions.append((path, version))
+    for source in sources:
+        for path, version in source:
+            if version not in seen and version.isdigit():
+                seen.add(version)
+                unique_versions.append((path, version))
+        if unique_versions:
+            break
     
     return sorted(unique_versions, key=lambda x: x[1])
 
 
-def compile_for_version(python_exe, version):
+def compile_for_version(python_exe, version, quiet=False):
     """为指定Python版本编译"""
     print(f"\n{'='*50}")
     print(f"编译 Python {version}")
@@ -53,10 +110,10 @@ def compile_for_version(python_exe, version):
         ], check=True, capture_output=True)
         
         # 编译
-        subprocess.run([
+        run_build([
             str(python_exe), "setup_single.py",
             "build_ext", "--inplace"
-        ], check=True)
+        ], quiet=quiet)
         
         # 查找生成的文件
         so_file = list(Path(".").glob(f"frp_core.cp{version}*"))
@@ -79,13 +136,15 @@ def main():
 ╚══════════════════════════════════════════════╝
 """)
     
+    quiet = "--quiet" in sys.argv[1:]
+    
     # 查找所有Python版本
     versions = find_python_versions()
     
     if not versions:
         print("未找到其他Python版本")
         print("当前编译当前Python版本...")
-        compile_for_version(sys.executable, ".".join(map(str, sys.version_info[:2])))
+        compile_for_version(sys.executable, ".".join(map(str, sys.version_info[:2])), quiet)
         return
     
     print(f"找到 {len(versions)} 个Python版本:")
@@ -94,11 +153,22 @@ def main():
     
     compiled_files = []
     
-    # 为每个版本编译
-    for python_exe, version in versions:
-        result = compile_for_version(python_exe, version)
-        if result:
-            compiled_files.append(result)
+    # 第一个版本串行编译，生成的C代码供其余版本复用，避免并发写同一个.c文件
+    (first_exe, first_version), rest = versions[0], versions[1:]
+    result = compile_for_version(first_exe, first_version, quiet)
+    if result:
+        compiled_files.append(result)
+    
+    # 其余版本并发编译（每次编译都在独立子进程中进行）
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        futures = [
+            executor.submit(compile_for_version, python_exe, version, quiet)
+            for python_exe, version in rest
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            if result:
+                compiled_files.append(result)
     
     # 汇总结果
     print(f"\n{'='*50}")
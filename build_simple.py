@@ -7,22 +7,29 @@
 import sys
 import os
 import subprocess
+import importlib.util
 from pathlib import Path
 
+# 编译优化参数（不使用-march=native/AVX2，编译产物需要能复制到其他机器运行）
+if sys.platform == "win32":
+    CC_FLAGS = ["/O2", "/GL"]
+    LINK_FLAGS = ["/LTCG"]
+else:
+    CC_FLAGS = ["-O3", "-funroll-loops", "-flto", "-fno-plt"]
+    LINK_FLAGS = ["-flto"]
+
 
 def check_dependencies():
     missing = []
-    try:
+    if importlib.util.find_spec("Cython") is not None:
         import Cython
         print(f"✓ Cython {Cython.__version__}")
-    except ImportError:
+    else:
         missing.append("cython")
     
-    try:
-        from distutils.core import setup, Extension
-        from distutils.command.build_ext import build_ext
+    if importlib.util.find_spec("distutils") is not None:
         print("✓ distutils可用")
-    except ImportError:
+    else:
         missing.append("distutils")
     
     return missing
@@ -66,6 +73,8 @@ def compile_with_cython_api():
                 'initializedcheck': False,
                 'cdivision': True,
                 'infer_types': True,
+                'profile': False,
+                'linetrace': False,
             },
             annotate=False,  # 不生成HTML报告
         )
@@ -81,7 +90,8 @@ def compile_with_cython_api():
             ext = Extension(
                 "frp_core",
                 sources=["frp_core_single.c"],
-                extra_compile_args=["-O2"],
+                extra_compile_args=CC_FLAGS,
+                extra_link_args=LINK_FLAGS,
             )
             
             setup(
@@ -6,9 +6,11 @@
 
 import sys
 import os
-import time
 import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional, Tuple
 
 # 添加父目录到路径
 sys.path.insert(0, str(Path(__file__).parent))
@@ -30,6 +32,40 @@ DEPLOYMENT_CONFIG = {
     'project_dir': '/opt/frp-service',
 }
 
+DEPLOY_DIR = Path(__file__).parent
+QUIC_SOURCE_DIR = DEPLOY_DIR.parent / 'version_quic_pure_python'
+
+# 日志级别对应的前缀符号
+_LOG_PREFIX = {
+    'INFO': '✓',
+    'WARN': '⚠',
+    'ERROR': '✗',
+    'STEP': '→'
+}
+
+# 验证与日志阶段使用的固定命令
+_CMD_ACTIVE_HY2_SERVER = 'systemctl is-active hysteria2-server'
+_CMD_ACTIVE_HY2_CLIENT = 'systemctl is-active hysteria2-client'
+_CMD_ACTIVE_QUIC = 'systemctl is-active frp-quic'
+_CMD_LOGS_HY2_SERVER = 'journalctl -u hysteria2-server -n 20 --no-pager'
+_CMD_LOGS_HY2_CLIENT = 'journalctl -u hysteria2-client -n 20 --no-pager'
+_CMD_LOGS_QUIC = 'journalctl -u frp-quic -n 20 --no-pager'
+
+
+@lru_cache(maxsize=None)
+def _read_local_file(path: Path) -> Optional[bytes]:
+    """读取本地文件并缓存内容，多次部署时不再重复读盘；文件不存在时返回None"""
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def _installer_script() -> Optional[str]:
+    """Hysteria2安装脚本内容"""
+    data = _read_local_file(DEPLOY_DIR / 'hysteria2_installer.sh')
+    return data.decode('utf-8') if data is not None else None
+
 
 class DeploymentManager:
     def __init__(self, client_server: dict, server_server: dict, config: dict):
@@ -41,29 +77,33 @@ class DeploymentManager:
     
     def log(self, message: str, level: str = 'INFO'):
         """日志输出"""
-        prefix = {
-            'INFO': '✓',
-            'WARN': '⚠',
-            'ERROR': '✗',
-            'STEP': '→'
-        }.get(level, '•')
-        print(f"{prefix} {message}")
+        # 整行一次写出，并行步骤的日志不会在行内交错
+        sys.stdout.write(f"{_LOG_PREFIX.get(level, '•')} {message}\n")
+    
+    def run_parallel(self, *calls):
+        """并发执行互不依赖的步骤（通常分别作用于两台服务器），按传入顺序返回结果"""
+        with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+            futures = [executor.submit(func, *args) for func, *args in calls]
+            return [future.result() for future in futures]
     
     def test_connections(self) -> bool:
         """测试两台服务器的连接"""
         self.log("测试服务器连接...", 'STEP')
         
-        # 连接客户端服务器
+        # 同时连接客户端服务器和服务端服务器
         self.log(f"连接客户端服务器: {self.client_config['host']}", 'INFO')
+        self.log(f"连接服务端服务器: {self.server_config['host']}", 'INFO')
         self.client_ssh = SSHManager(**self.client_config)
-        if not self.client_ssh.connect():
+        self.server_ssh = SSHManager(**self.server_config)
+        client_ok, server_ok = self.run_parallel(
+            (self.client_ssh.connect,),
+            (self.server_ssh.connect,),
+        )
+        
+        if not client_ok:
             self.log("客户端服务器连接失败", 'ERROR')
             return False
-        
-        # 连接服务端服务器
-        self.log(f"连接服务端服务器: {self.server_config['host']}", 'INFO')
-        self.server_ssh = SSHManager(**self.server_config)
-        if not self.server_ssh.connect():
+        if not server_ok:
             self.log("服务端服务器连接失败", 'ERROR')
             return False
         
@@ -74,18 +114,14 @@ class DeploymentManager:
         """准备运行环境"""
         self.log(f"准备{server_type}运行环境...", 'STEP')
         
-        # 更新系统包
-        self.log("更新系统包...", 'INFO')
-        ssh.execute_command('apt-get update -qq || yum update -y -q')
-        
-        # 安装基础依赖
-        self.log("安装基础依赖...", 'INFO')
-        ssh.execute_command('apt-get install -y -qq curl wget python3 python3-pip openssl systemd || yum install -y -q curl wget python3 python3-pip openssl systemd')
-        
-        # 创建项目目录
+        # 更新系统包、安装基础依赖、创建项目目录（合并为一次SSH调用）
         project_dir = self.deploy_config['project_dir']
-        self.log(f"创建项目目录: {project_dir}", 'INFO')
-        ssh.execute_command(f'mkdir -p {project_dir}')
+        self.log(f"更新系统包并安装基础依赖，创建项目目录: {project_dir}", 'INFO')
+        ssh.execute_batch([
+            'apt-get update -qq || yum update -y -q',
+            'apt-get install -y -qq curl wget python3 python3-pip openssl systemd || yum install -y -q curl wget python3 python3-pip openssl systemd',
+            f'mkdir -p {project_dir}',
+        ], stop_on_error=False)
         
         self.log(f"{server_type}环境准备完成", 'INFO')
         return True
@@ -95,23 +131,20 @@ class DeploymentManager:
         self.log("安装Hysteria2服务端...", 'STEP')
         
         # 读取安装脚本
-        script_path = Path(__file__).parent / 'hysteria2_installer.sh'
-        if not script_path.exists():
+        script_content = _installer_script()
+        if script_content is None:
             self.log("安装脚本不存在", 'ERROR')
             return False
         
-        with open(script_path, 'r', encoding='utf-8') as f:
-            script_content = f.read()
-        
-        # 上传并执行安装脚本
+        # 通过标准输入执行安装脚本
         port = self.deploy_config['hysteria2']['server_port']
         domain = self.deploy_config['hysteria2'].get('domain', '')
         
-        install_cmd = f"bash -s -- --port {port}"
+        install_args = f"--port {port}"
         if domain:
-            install_cmd += f" --domain {domain}"
+            install_args += f" --domain {domain}"
         
-        exit_code, output, error = self.server_ssh.execute_script(script_content, '/tmp/hy2_install.sh')
+        exit_code, output, error = self.server_ssh.execute_script(script_content, install_args)
         
         if exit_code != 0:
             self.log(f"Hysteria2服务端安装失败: {error}", 'ERROR')
@@ -128,29 +161,31 @@ class DeploymentManager:
         
         return True
     
-    def install_hysteria2_client(self) -> bool:
-        """安装Hysteria2客户端"""
-        self.log("安装Hysteria2客户端...", 'STEP')
+    def install_hysteria2_client(self, server_ready=None) -> bool:
+        """安装Hysteria2客户端
         
-        # 下载客户端
-        arch_cmd = "uname -m"
-        exit_code, arch, _ = self.client_ssh.execute_command(arch_cmd)
-        
-        if 'x86_64' in arch:
-            binary = 'hysteria2-linux-amd64'
-        elif 'aarch64' in arch or 'arm64' in arch:
-            binary = 'hysteria2-linux-arm64'
-        else:
-            binary = 'hysteria2-linux-armv7'
+        server_ready: 服务端安装的Future；下载二进制与服务端安装并行，生成配置前等待它完成以获取认证密码
+        """
+        self.log("安装Hysteria2客户端...", 'STEP')
         
-        download_cmd = f"curl -L -o /usr/local/bin/hysteria2 https://github.com/apernet/hysteria2/releases/latest/download/{binary}"
-        exit_code, _, error = self.client_ssh.execute_command(download_cmd)
+        # 下载客户端（远程检测架构，下载与授权在同一个脚本中完成）
+        download_script = """set -e
+case "$(uname -m)" in
+    x86_64) BINARY=hysteria2-linux-amd64 ;;
+    aarch64|arm64) BINARY=hysteria2-linux-arm64 ;;
+    *) BINARY=hysteria2-linux-armv7 ;;
+esac
+curl -L -o /usr/local/bin/hysteria2 https://github.com/apernet/hysteria2/releases/latest/download/$BINARY
+chmod +x /usr/local/bin/hysteria2
+"""
+        exit_code, _, error = self.client_ssh.execute_script(download_script)
         
         if exit_code != 0:
             self.log(f"Hysteria2客户端下载失败: {error}", 'ERROR')
             return False
         
-        self.client_ssh.execute_command('chmod +x /usr/local/bin/hysteria2')
+        if server_ready is not None and not server_ready.result():
+            return False
         
         # 生成客户端配置
         server_addr = self.server_config['host']
@@ -177,13 +212,6 @@ log:
   level: info
 """
         
-        config_cmd = f"cat > /etc/hysteria2/client.yaml << 'EOF'\n{config}\nEOF"
-        exit_code, _, error = self.client_ssh.execute_command(config_cmd)
-        
-        if exit_code != 0:
-            self.log(f"客户端配置生成失败: {error}", 'ERROR')
-            return False
-        
         # 创建systemd服务
         service_content = """[Unit]
 Description=Hysteria2 Client Service
@@ -199,9 +227,19 @@ RestartSec=5s
 WantedBy=multi-user.target
 """
         
-        self.client_ssh.execute_command("cat > /etc/systemd/system/hysteria2-client.service << 'EOF'\n" + service_content + "EOF")
-        self.client_ssh.execute_command('systemctl daemon-reload')
-        self.client_ssh.execute_command('systemctl enable hysteria2-client')
+        # 配置文件、服务文件与启用服务合并为一个脚本，一次执行完成
+        exit_code, _, error = self.client_ssh.execute_script(
+            "set -e\n"
+            "mkdir -p /etc/hysteria2\n"
+            "cat > /etc/hysteria2/client.yaml << 'EOF'\n" + config + "EOF\n"
+            "cat > /etc/systemd/system/hysteria2-client.service << 'EOF'\n" + service_content + "EOF\n"
+            "systemctl daemon-reload\n"
+            "systemctl enable hysteria2-client\n"
+        )
+        
+        if exit_code != 0:
+            self.log(f"客户端配置生成失败: {error}", 'ERROR')
+            return False
         
         self.log("Hysteria2客户端安装完成", 'INFO')
         return True
@@ -210,15 +248,25 @@ WantedBy=multi-user.target
         """安装Python QUIC服务端"""
         self.log("安装Python QUIC服务端...", 'STEP')
         
-        # 安装Python依赖
+        # 安装Python依赖（耗时最长，在独立通道上与后续步骤并行执行）
         self.log("安装Python依赖...", 'INFO')
-        pip_install = 'pip3 install aioquic pyOpenSSL certifi'
-        exit_code, _, error = self.server_ssh.execute_command(pip_install)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pip_future = executor.submit(
+                self.server_ssh.execute_command, 'pip3 install aioquic pyOpenSSL certifi'
+            )
+            if not self._setup_quic_service():
+                return False
+            exit_code, _, error = pip_future.result()
         
         if exit_code != 0:
             self.log(f"Python依赖安装失败: {error}", 'ERROR')
             return False
         
+        self.log("Python QUIC服务端安装完成", 'INFO')
+        return True
+    
+    def _setup_quic_service(self) -> bool:
+        """生成证书、上传服务端代码并注册systemd服务"""
         # 创建证书目录
         cert_dir = os.path.dirname(self.deploy_config['quic']['cert_path'])
         self.server_ssh.execute_command(f'mkdir -p {cert_dir}')
@@ -233,14 +281,19 @@ WantedBy=multi-user.target
         
         # 上传服务端代码
         self.log("上传服务端代码...", 'INFO')
-        server_code_path = Path(__file__).parent.parent / 'version_quic_pure_python' / 'frps_quic.py'
-        if not server_code_path.exists():
+        server_code = _read_local_file(QUIC_SOURCE_DIR / 'frps_quic.py')
+        if server_code is None:
             self.log("服务端代码文件不存在", 'ERROR')
             return False
         
-        self.server_ssh.upload_file(str(server_code_path), f"{self.deploy_config['project_dir']}/frps_quic.py")
-        self.server_ssh.upload_file(str(server_code_path.parent / 'server_cert.pem'), self.deploy_config['quic']['cert_path'])
-        self.server_ssh.upload_file(str(server_code_path.parent / 'server_key.pem'), self.deploy_config['quic']['key_path'])
+        self.server_ssh.upload_bytes(server_code, f"{self.deploy_config['project_dir']}/frps_quic.py")
+        for name, remote_path in (('server_cert.pem', self.deploy_config['quic']['cert_path']),
+                                  ('server_key.pem', self.deploy_config['quic']['key_path'])):
+            data = _read_local_file(QUIC_SOURCE_DIR / name)
+            if data is None:
+                self.log(f"{name} 不存在，跳过上传", 'WARN')
+                continue
+            self.server_ssh.upload_bytes(data, remote_path)
         
         # 创建systemd服务
         port = self.deploy_config['quic']['server_port']
@@ -259,13 +312,21 @@ RestartSec=5s
 WantedBy=multi-user.target
 """
         
-        self.server_ssh.execute_command(f"cat > /etc/systemd/system/frp-quic.service << 'EOF'\n{service_content}\nEOF")
-        self.server_ssh.execute_command('systemctl daemon-reload')
-        self.server_ssh.execute_command('systemctl enable frp-quic')
-        
-        self.log("Python QUIC服务端安装完成", 'INFO')
+        self.server_ssh.execute_script(
+            f"cat > /etc/systemd/system/frp-quic.service << 'EOF'\n{service_content}\nEOF\n"
+            "systemctl daemon-reload\n"
+            "systemctl enable frp-quic\n"
+        )
         return True
     
+    def _restart_unit(self, ssh: SSHManager, unit: str, timeout: float = 10) -> Tuple[int, str, str]:
+        """重启systemd服务并在同一次执行中每0.1秒检查一次直到active，退出码为0表示已启动"""
+        tries = int(timeout * 10)
+        return ssh.execute_command(
+            f'systemctl restart {unit} && for i in $(seq 1 {tries}); do '
+            f'systemctl is-active --quiet {unit} && exit 0; sleep 0.1; done; exit 1'
+        )
+    
     def start_services(self) -> bool:
         """启动服务"""
         self.log("启动服务...", 'STEP')
@@ -273,27 +334,24 @@ WantedBy=multi-user.target
         if self.deploy_config['protocol'] == 'hysteria2':
             # 启动服务端
             self.log("启动Hysteria2服务端...", 'INFO')
-            exit_code, _, error = self.server_ssh.execute_command('systemctl restart hysteria2-server')
+            exit_code, _, error = self._restart_unit(self.server_ssh, 'hysteria2-server')
             if exit_code != 0:
-                self.log(f"服务端启动失败: {error}", 'ERROR')
+                self.log(f"服务端启动失败: {error or '服务未进入active状态'}", 'ERROR')
                 return False
             
-            # 等待服务端启动
-            time.sleep(3)
-            
             # 启动客户端
             self.log("启动Hysteria2客户端...", 'INFO')
-            exit_code, _, error = self.client_ssh.execute_command('systemctl restart hysteria2-client')
+            exit_code, _, error = self._restart_unit(self.client_ssh, 'hysteria2-client')
             if exit_code != 0:
-                self.log(f"客户端启动失败: {error}", 'ERROR')
+                self.log(f"客户端启动失败: {error or '服务未进入active状态'}", 'ERROR')
                 return False
         
         elif self.deploy_config['protocol'] == 'quic':
             # 启动服务端
             self.log("启动QUIC服务端...", 'INFO')
-            exit_code, _, error = self.server_ssh.execute_command('systemctl restart frp-quic')
+            exit_code, _, error = self._restart_unit(self.server_ssh, 'frp-quic')
             if exit_code != 0:
-                self.log(f"服务端启动失败: {error}", 'ERROR')
+                self.log(f"服务端启动失败: {error or '服务未进入active状态'}", 'ERROR')
                 return False
         
         self.log("服务启动完成", 'INFO')
@@ -304,16 +362,19 @@ WantedBy=multi-user.target
         self.log("验证部署...", 'STEP')
         
         if self.deploy_config['protocol'] == 'hysteria2':
-            # 检查服务端状态
-            self.log("检查服务端状态...", 'INFO')
-            exit_code, output, _ = self.server_ssh.execute_command('systemctl is-active hysteria2-server')
+            # 同时检查服务端和客户端状态
+            self.log("检查服务端和客户端状态...", 'INFO')
+            server_result, client_result = self.run_parallel(
+                (self.server_ssh.execute_command, _CMD_ACTIVE_HY2_SERVER),
+                (self.client_ssh.execute_command, _CMD_ACTIVE_HY2_CLIENT),
+            )
+            
+            exit_code, output, _ = server_result
             if exit_code != 0 or 'active' not in output:
                 self.log("服务端未运行", 'ERROR')
                 return False
             
-            # 检查客户端状态
-            self.log("检查客户端状态...", 'INFO')
-            exit_code, output, _ = self.client_ssh.execute_command('systemctl is-active hysteria2-client')
+            exit_code, output, _ = client_result
             if exit_code != 0 or 'active' not in output:
                 self.log("客户端未运行", 'ERROR')
                 return False
@@ -330,7 +391,7 @@ WantedBy=multi-user.target
         elif self.deploy_config['protocol'] == 'quic':
             # 检查服务端状态
             self.log("检查服务端状态...", 'INFO')
-            exit_code, output, _ = self.server_ssh.execute_command('systemctl is-active frp-quic')
+            exit_code, output, _ = self.server_ssh.execute_command(_CMD_ACTIVE_QUIC)
             if exit_code != 0 or 'active' not in output:
                 self.log("服务端未运行", 'ERROR')
                 return False
@@ -346,14 +407,15 @@ WantedBy=multi-user.target
         }
         
         if self.deploy_config['protocol'] == 'hysteria2':
-            exit_code, output, _ = self.client_ssh.execute_command('journalctl -u hysteria2-client -n 20 --no-pager')
-            logs['client'] = output
-            
-            exit_code, output, _ = self.server_ssh.execute_command('journalctl -u hysteria2-server -n 20 --no-pager')
-            logs['server'] = output
+            client_result, server_result = self.run_parallel(
+                (self.client_ssh.execute_command, _CMD_LOGS_HY2_CLIENT),
+                (self.server_ssh.execute_command, _CMD_LOGS_HY2_SERVER),
+            )
+            logs['client'] = client_result[1]
+            logs['server'] = server_result[1]
         
         elif self.deploy_config['protocol'] == 'quic':
-            exit_code, output, _ = self.server_ssh.execute_command('journalctl -u frp-quic -n 20 --no-pager')
+            exit_code, output, _ = self.server_ssh.execute_command(_CMD_LOGS_QUIC)
             logs['server'] = output
         
         return logs
@@ -375,18 +437,21 @@ WantedBy=multi-user.target
             if not self.test_connections():
                 return False
             
-            # 准备环境
-            if not self.prepare_environment(self.client_ssh, '客户端'):
-                return False
-            if not self.prepare_environment(self.server_ssh, '服务端'):
+            # 准备环境（两台服务器并行）
+            if not all(self.run_parallel(
+                (self.prepare_environment, self.client_ssh, '客户端'),
+                (self.prepare_environment, self.server_ssh, '服务端'),
+            )):
                 return False
             
             # 根据协议类型安装服务
             if self.deploy_config['protocol'] == 'hysteria2':
-                if not self.install_hysteria2_server():
-                    return False
-                if not self.install_hysteria2_client():
-                    return False
+                # 客户端下载与服务端安装并行，客户端在写配置前等待服务端密码
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    server_future = executor.submit(self.install_hysteria2_server)
+                    client_future = executor.submit(self.install_hysteria2_client, server_future)
+                    if not server_future.result() or not client_future.result():
+                        return False
             elif self.deploy_config['protocol'] == 'quic':
                 if not self.install_quic_server():
                     return False
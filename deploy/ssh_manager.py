@@ -4,9 +4,23 @@ SSH连接管理器
 支持密码和密钥认证，自动化远程命令执行
 """
 
+import atexit
+import getpass
+import inspect
+import io
+import os
 import paramiko
 import logging
-from typing import Optional, Tuple, List
+import queue
+import re
+import select
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from typing import Optional, Tuple, List, Dict
 import socket
 
 logging.basicConfig(
@@ -15,43 +29,225 @@ logging.basicConfig(
 )
 logger = logging.getLogger('SSHManager')
 
+# 同一连接上同时打开的会话通道上限（OpenSSH默认MaxSessions为10）；
+# 空闲预开通道、执行中的命令、缓存的SFTP和并发上传的SFTP通道都计入这个上限
+MAX_SESSIONS = 10
+# 预先打开的空闲会话通道数量
+SESSION_POOL_SIZE = 2
+# upload_directory默认的并发SFTP通道数：2个预开通道 + 1个缓存SFTP + 4个上传通道，
+# 仍给并发执行的命令留出余量
+UPLOAD_WORKERS = 4
+
+# 大窗口与大数据包，使单个会话在高延迟链路上也能跑满带宽
+WINDOW_SIZE = 1 << 27
+MAX_PACKET_SIZE = 1 << 19
+
+# 提高本连接重新协商密钥的流量阈值（paramiko默认512MiB），减少大文件上传中途的rekey停顿；
+# RFC 4344要求128位分组密码在2^32个分组（64GiB）内rekey，这里取4GiB
+REKEY_BYTES = 1 << 32
+
+# 流式读取命令输出的单次接收大小与轮询间隔（秒）
+RECV_SIZE = 65536
+POLL_INTERVAL = 0.5
+
+# 系统信息：系统版本、CPU、内存、磁盘空间合并为一次执行
+SYSTEM_INFO_COMMAND = (
+    "printf 'OS:'; grep PRETTY_NAME /etc/os-release; echo; "
+    "printf 'CPU:'; nproc; "
+    "printf 'MEM:'; free -h | grep Mem; echo; "
+    "printf 'DISK:'; df -h / | tail -1"
+)
+SYSTEM_INFO_FIELDS = {'OS': 'os', 'CPU': 'cpu_cores', 'MEM': 'memory', 'DISK': 'disk'}
+
+# 进程内共享的主机密钥：首次连接后记录，之后的连接（含其他SSHManager实例）直接校验
+_HOST_KEYS = paramiko.HostKeys()
+_HOST_KEYS_LOCK = threading.Lock()
+
+# 禁用慢速且过时的SHA1密钥交换与CBC/3DES加密，协商时优先选择curve25519
+DISABLED_ALGORITHMS = {
+    'kex': ['diffie-hellman-group1-sha1', 'diffie-hellman-group14-sha1', 'diffie-hellman-group-exchange-sha1'],
+    'ciphers': ['aes128-cbc', 'aes192-cbc', 'aes256-cbc', '3des-cbc'],
+}
+
+# AES-GCM可走OpenSSL的AES-NI硬件加速且无需单独的MAC计算，支持时排在首位
+GCM_CIPHERS = ('aes128-gcm@openssh.com', 'aes256-gcm@openssh.com')
+# paramiko 3.2起SSHClient.connect支持transport_factory，旧版本保持默认加密算法顺序
+SUPPORTS_TRANSPORT_FACTORY = 'transport_factory' in inspect.signature(paramiko.SSHClient.connect).parameters
+
+
+def _make_transport(sock, **kwargs) -> paramiko.Transport:
+    """为单个连接创建Transport，只调整这条连接的加密算法顺序，不改动paramiko的全局默认值"""
+    transport = paramiko.Transport(sock, **kwargs)
+    options = transport.get_security_options()
+    options.ciphers = (
+        tuple(c for c in GCM_CIPHERS if c in options.ciphers)
+        + tuple(c for c in options.ciphers if c not in GCM_CIPHERS)
+    )
+    return transport
+
+# 监听端口：优先使用ss（通过netlink读取），只有没有ss时才回退到netstat
+# 没有ss时直接读取内核的套接字表，不启动netstat（套接字很多的主机上netstat非常耗CPU）
+LISTENING_PORTS_COMMAND = (
+    'if command -v ss >/dev/null 2>&1; then ss -Htuln; '
+    'else cat /proc/net/tcp /proc/net/tcp6 /proc/net/udp /proc/net/udp6 2>/dev/null; fi'
+)
+
+# /proc/net/* 中的状态码：TCP的0A为LISTEN，UDP未连接的套接字为07
+PROC_LISTEN_STATES = {'0A': 'tcp', '07': 'udp'}
+
+# 按解析速度依次尝试的私钥类型
+KEY_TYPES = (paramiko.Ed25519Key, paramiko.ECDSAKey, paramiko.RSAKey)
+
+
+@lru_cache(maxsize=16)
+def _load_key(path: str, mtime: float) -> paramiko.PKey:
+    """解析私钥文件并缓存，mtime参与缓存键，密钥文件更新后自动重新加载"""
+    for key_type in KEY_TYPES:
+        try:
+            return key_type.from_private_key_file(path)
+        except paramiko.SSHException:
+            continue
+    raise paramiko.SSHException(f"无法识别的私钥格式: {path}")
+
+
+@lru_cache(maxsize=None)
+def _session_key() -> Tuple[paramiko.PKey, str]:
+    """生成本进程使用的临时ed25519密钥对，返回(私钥对象, 公钥行)；私钥只保存在内存中，不落盘"""
+    private_key = Ed25519PrivateKey.generate()
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.OpenSSH,
+        serialization.NoEncryption()
+    ).decode('ascii')
+    
+    public_key = private_key.public_key().public_bytes(
+        serialization.Encoding.OpenSSH,
+        serialization.PublicFormat.OpenSSH
+    ).decode('ascii')
+    return paramiko.Ed25519Key.from_private_key(io.StringIO(pem)), f"{public_key} frp-deploy-session"
+
+
+# 本进程内缓存的登录密码，按(用户名, 主机, 端口)区分，只在首次需要时提示输入
+_PASSWORDS = {}
+_PASSWORDS_LOCK = threading.Lock()
+
+
+def parse_listening_ports(output: str, protocol: Optional[str] = None) -> set:
+    """从ss、netstat或/proc/net/{tcp,udp}[6]的输出中解析出监听端口集合，protocol为'tcp'/'udp'时只取该协议"""
+    listening = set()
+    for line in output.splitlines():
+        fields = line.split()
+        # ss:      Netid State Recv-Q Send-Q Local:Port Peer:Port
+        # netstat: Proto Recv-Q Send-Q Local:Port Foreign:Port [State]
+        # /proc:   sl: local_addr:PORT rem_addr:PORT st ...（十六进制）
+        if len(fields) < 5:
+            continue
+        if fields[0].endswith(':'):
+            state_protocol = PROC_LISTEN_STATES.get(fields[3])
+            if state_protocol and fields[2].endswith(':0000') and protocol in (None, state_protocol):
+                listening.add(int(fields[1].rpartition(':')[2], 16))
+            continue
+        if protocol and not fields[0].startswith(protocol):
+            continue
+        local = fields[3] if fields[1].isdigit() else fields[4]
+        port = local.rpartition(':')[2]
+        if port.isdigit():
+            listening.add(int(port))
+    return listening
+
+
+def _walk_files(directory: str, relative: str = ''):
+    """基于os.scandir递归列出文件，返回(本地路径, 相对路径)，目录项类型直接取自readdir无需逐个stat"""
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            rel = f"{relative}{entry.name}"
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk_files(entry.path, rel + '/')
+            elif entry.is_file():
+                yield entry.path, rel
+
 
 class SSHManager:
-    def __init__(self, host: str, port: int, username: str, password: str, key_path: Optional[str] = None):
+    def __init__(self, host: str, port: int, username: str, password: Optional[str] = None,
+                 key_path: Optional[str] = None):
         self.host = host
         self.port = port
         self.username = username
         self.password = password
         self.key_path = key_path
+        # 密码登录后安装到远端的临时密钥，安装成功后本实例的重连改用它认证
+        self.session_key = None
         self.client = None
+        self.transport = None
+        self._session_pool = queue.Queue(maxsize=SESSION_POOL_SIZE)
+        # 每个打开的会话通道占一个名额，通道关闭时归还
+        self._channel_slots = threading.BoundedSemaphore(MAX_SESSIONS)
+        # 常驻的预开通道线程，首次连接成功后启动，close()时退出
+        self._refiller = None
+        self._refill_wakeup = threading.Event()
+        self._closing = False
+        self._sftp = None
+        self._sftp_lock = threading.Lock()
     
     def connect(self, timeout: int = 10) -> bool:
         """建立SSH连接"""
         try:
             self.client = paramiko.SSHClient()
             self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            host_key_name = self.host if self.port == 22 else f"[{self.host}]:{self.port}"
+            with _HOST_KEYS_LOCK:
+                known = _HOST_KEYS.lookup(host_key_name)
+                if known:
+                    for key_type, key in known.items():
+                        self.client.get_host_keys().add(host_key_name, key_type, key)
             
             logger.info(f"正在连接 {self.username}@{self.host}:{self.port}...")
             
             if self.key_path:
-                key = paramiko.RSAKey.from_private_key_file(self.key_path)
-                self.client.connect(
-                    hostname=self.host,
-                    port=self.port,
-                    username=self.username,
-                    pkey=key,
-                    timeout=timeout
-                )
+                key = _load_key(self.key_path, os.path.getmtime(self.key_path))
+                password = self.password  # 密钥被拒绝时paramiko会回退到密码认证
+            elif self.session_key is not None:
+                key = self.session_key
+                password = self.password
             else:
-                self.client.connect(
-                    hostname=self.host,
-                    port=self.port,
-                    username=self.username,
-                    password=self.password,
-                    timeout=timeout
-                )
+                key = None
+                password = self._get_password()
+            
+            connect_kwargs = {}
+            if SUPPORTS_TRANSPORT_FACTORY:
+                connect_kwargs['transport_factory'] = _make_transport
+            self.client.connect(
+                hostname=self.host,
+                port=self.port,
+                username=self.username,
+                pkey=key,
+                password=password,
+                timeout=timeout,
+                compress=True,
+                disabled_algorithms=DISABLED_ALGORITHMS,
+                **connect_kwargs
+            )
+            
+            self.transport = self.client.get_transport()
+            self.transport.set_keepalive(30)
+            self.transport.packetizer.REKEY_BYTES = REKEY_BYTES
+            server_key = self.transport.get_remote_server_key()
+            with _HOST_KEYS_LOCK:
+                _HOST_KEYS.add(host_key_name, server_key.get_name(), server_key)
+            # 仅影响之后打开的通道（会话池与SFTP均在连接后打开）
+            self.transport.default_window_size = WINDOW_SIZE
+            self.transport.default_max_packet_size = MAX_PACKET_SIZE
             
             logger.info(f"✓ 成功连接到 {self.host}")
+            
+            self._closing = False
+            if self._refiller is None:
+                self._refiller = threading.Thread(target=self._refill_sessions, daemon=True)
+                self._refiller.start()
+            self._refill_wakeup.set()
+            
+            if key is None:
+                self._install_session_key()
             return True
             
         except socket.timeout:
@@ -64,104 +260,262 @@ class SSHManager:
             logger.error(f"✗ 连接失败: {e}")
             return False
     
-    def execute_command(self, command: str, timeout: int = 300) -> Tuple[int, str, str]:
-        """执行远程命令"""
+    def _get_password(self) -> Optional[str]:
+        """取登录密码：构造参数优先，其次是本进程缓存，都没有时提示输入一次"""
+        if self.password:
+            return self.password
+        
+        with _PASSWORDS_LOCK:
+            cache_key = (self.username, self.host, self.port)
+            if cache_key not in _PASSWORDS:
+                _PASSWORDS[cache_key] = getpass.getpass(f"{self.username}@{self.host}:{self.port} 的密码: ")
+            self.password = _PASSWORDS[cache_key]
+        return self.password
+    
+    def _install_session_key(self):
+        """密码登录后把临时公钥写入authorized_keys，本次运行中的重连改用密钥认证；
+        close()或进程退出时由_remove_session_key删除这一行"""
+        session_key, public_key = _session_key()
+        exit_code, _, error = self.execute_command(
+            f"umask 077 && mkdir -p ~/.ssh && "
+            f"{{ grep -qxF '{public_key}' ~/.ssh/authorized_keys 2>/dev/null || "
+            f"echo '{public_key}' >> ~/.ssh/authorized_keys; }}"
+        )
+        if exit_code == 0:
+            self.session_key = session_key
+            atexit.register(self._remove_session_key)
+        else:
+            logger.warning(f"临时公钥安装失败，继续使用密码认证: {error}")
+    
+    def _remove_session_key(self):
+        """从authorized_keys中精确删除本进程安装的临时公钥行，连接已断开时先重连"""
+        if self.session_key is None:
+            return
+        atexit.unregister(self._remove_session_key)
+        
+        if not (self.transport and self.transport.is_active()) and not self.connect():
+            logger.warning(f"无法连接 {self.host}，临时公钥未删除")
+            self.session_key = None
+            return
+        
+        _, public_key = _session_key()
+        exit_code, _, error = self.execute_command(
+            f"f=~/.ssh/authorized_keys; [ -f \"$f\" ] || exit 0; umask 077; "
+            f"grep -vxF '{public_key}' \"$f\" > \"$f.frp-deploy\"; "
+            f"cat \"$f.frp-deploy\" > \"$f\" && rm -f \"$f.frp-deploy\""
+        )
+        self.session_key = None
+        if exit_code != 0:
+            logger.warning(f"临时公钥删除失败: {error}")
+    
+    def _refill_sessions(self):
+        """常驻线程：会话池不满且还有通道名额时预先打开会话通道，使下一条命令无需等待通道建立的往返"""
+        while True:
+            self._refill_wakeup.wait()
+            self._refill_wakeup.clear()
+            if self._closing:
+                return
+            
+            # 只用非阻塞方式占名额，名额不够时让给正在等待的命令
+            while not self._session_pool.full() and self._channel_slots.acquire(blocking=False):
+                try:
+                    channel = self.transport.open_session()
+                except Exception:
+                    self._channel_slots.release()
+                    break
+                try:
+                    self._session_pool.put_nowait(channel)
+                except queue.Full:
+                    channel.close()
+                    self._channel_slots.release()
+                    break
+    
+    def _acquire_session(self):
+        """取一个会话通道（每个通道只能执行一条命令）：优先用预开的，否则占一个名额新开；
+        用完后调用_release_session归还名额"""
+        try:
+            while True:
+                try:
+                    channel = self._session_pool.get_nowait()
+                except queue.Empty:
+                    pass
+                else:
+                    if not channel.closed:
+                        return channel
+                    self._channel_slots.release()
+                    continue
+                
+                # 名额用完时等待其他通道关闭，期间预开线程补充的通道也能被取到
+                if self._channel_slots.acquire(timeout=POLL_INTERVAL):
+                    try:
+                        return self.transport.open_session()
+                    except Exception:
+                        self._channel_slots.release()
+                        raise
+        finally:
+            self._refill_wakeup.set()
+    
+    def _release_session(self, channel):
+        channel.close()
+        self._channel_slots.release()
+    
+    def execute_command(self, command: str, timeout: int = 300, stdin_data: Optional[str] = None) -> Tuple[int, str, str]:
+        """执行远程命令，stdin_data不为空时写入命令的标准输入"""
         if not self.client:
             return -1, "", "SSH未连接"
         
         try:
             logger.info(f"执行命令: {command[:100]}...")
-            stdin, stdout, stderr = self.client.exec_command(command, timeout=timeout)
-            
-            exit_status = stdout.channel.recv_exit_status()
-            output = stdout.read().decode('utf-8', errors='ignore')
-            error = stderr.read().decode('utf-8', errors='ignore')
-            
-            return exit_status, output, error
-            
+            channel = self._acquire_session()
         except Exception as e:
             logger.error(f"命令执行失败: {e}")
             return -1, "", str(e)
-    
-    def execute_script(self, script_content: str, script_path: str = '/tmp/deploy_script.sh') -> Tuple[int, str, str]:
-        """上传并执行脚本"""
+        
         try:
-            # 上传脚本
-            sftp = self.client.open_sftp()
-            with sftp.file(script_path, 'w') as f:
-                f.write(script_content)
-            sftp.close()
+            channel.settimeout(timeout)
+            channel.exec_command(command)
+            if stdin_data is not None:
+                channel.sendall(stdin_data.encode('utf-8'))
+                channel.shutdown_write()
+            
+            # 边执行边读取输出，远端不会因窗口写满而阻塞，超过timeout秒无任何输出视为超时
+            stdout, stderr = bytearray(), bytearray()
+            idle_deadline = time.monotonic() + timeout
+            while ((not channel.exit_status_ready() and not channel.closed)
+                   or channel.recv_ready() or channel.recv_stderr_ready()):
+                select.select([channel], [], [], POLL_INTERVAL)
+                if channel.recv_ready():
+                    stdout += channel.recv(RECV_SIZE)
+                elif channel.recv_stderr_ready():
+                    stderr += channel.recv_stderr(RECV_SIZE)
+                elif time.monotonic() > idle_deadline:
+                    raise socket.timeout(f"命令超过{timeout}秒无输出")
+                else:
+                    continue
+                idle_deadline = time.monotonic() + timeout
             
-            # 添加执行权限
-            self.execute_command(f'chmod +x {script_path}')
+            exit_status = channel.recv_exit_status()
+            output = stdout.decode('utf-8', errors='ignore')
+            error = stderr.decode('utf-8', errors='ignore')
             
-            # 执行脚本
-            return self.execute_command(f'bash {script_path}')
+            return exit_status, output, error
             
         except Exception as e:
-            logger.error(f"脚本执行失败: {e}")
+            logger.error(f"命令执行失败: {e}")
             return -1, "", str(e)
+        finally:
+            self._release_session(channel)
+    
+    def execute_batch(self, commands: List[str], stop_on_error: bool = True, timeout: int = 300) -> Tuple[int, str, str]:
+        """在一次SSH调用中依次执行多条命令"""
+        separator = ' && ' if stop_on_error else '; '
+        return self.execute_command(separator.join(f'{{ {cmd}; }}' for cmd in commands), timeout=timeout)
+    
+    def execute_script(self, script_content: str, args: str = '') -> Tuple[int, str, str]:
+        """通过标准输入把脚本交给远程bash执行，无需上传文件（单个通道完成）"""
+        command = f'bash -s -- {args}' if args else 'bash -s'
+        return self.execute_command(command, stdin_data=script_content)
+    
+    def _get_sftp(self) -> paramiko.SFTPClient:
+        """复用同一个SFTP会话，只在首次使用或通道关闭后重新打开"""
+        with self._sftp_lock:
+            if self._sftp is None or self._sftp.sock.closed:
+                if self._sftp is not None:
+                    self._sftp = None
+                    self._channel_slots.release()
+                self._channel_slots.acquire()
+                try:
+                    self._sftp = self.client.open_sftp()
+                except Exception:
+                    self._channel_slots.release()
+                    raise
+            return self._sftp
+    
+    def _reserve_slots(self, wanted: int) -> int:
+        """占用最多wanted个通道名额（至少等到1个），返回实际占到的数量"""
+        self._channel_slots.acquire()
+        reserved = 1
+        while reserved < wanted and self._channel_slots.acquire(blocking=False):
+            reserved += 1
+        return reserved
     
     def upload_file(self, local_path: str, remote_path: str) -> bool:
         """上传文件到远程服务器"""
         try:
-            sftp = self.client.open_sftp()
-            sftp.put(local_path, remote_path)
-            sftp.close()
+            self._get_sftp().put(local_path, remote_path)
             logger.info(f"✓ 文件上传成功: {local_path} -> {remote_path}")
             return True
         except Exception as e:
             logger.error(f"✗ 文件上传失败: {e}")
             return False
     
+    def upload_bytes(self, data: bytes, remote_path: str) -> bool:
+        """把内存中的内容直接写入远程文件（无需本地文件）"""
+        try:
+            self._get_sftp().putfo(io.BytesIO(data), remote_path)
+            logger.info(f"✓ 文件上传成功: {len(data)} 字节 -> {remote_path}")
+            return True
+        except Exception as e:
+            logger.error(f"✗ 文件上传失败: {e}")
+            return False
+    
     def download_file(self, remote_path: str, local_path: str) -> bool:
         """从远程服务器下载文件"""
         try:
-            sftp = self.client.open_sftp()
-            sftp.get(remote_path, local_path)
-            sftp.close()
+            self._get_sftp().get(remote_path, local_path)
             logger.info(f"✓ 文件下载成功: {remote_path} -> {local_path}")
             return True
         except Exception as e:
             logger.error(f"✗ 文件下载失败: {e}")
             return False
     
-    def upload_directory(self, local_dir: str, remote_dir: str, ignore_patterns: List[str] = None) -> bool:
-        """上传整个目录"""
-        import os
-        from pathlib import Path
+    def upload_directory(self, local_dir: str, remote_dir: str, ignore_patterns: List[str] = None,
+                         max_workers: int = UPLOAD_WORKERS) -> bool:
+        """上传整个目录（多个SFTP通道并发上传，并发数不超过剩余的通道名额）"""
+        ignore_re = re.compile('|'.join(map(re.escape, ignore_patterns))) if ignore_patterns else None
         
         try:
-            sftp = self.client.open_sftp()
+            # 收集待上传文件
+            uploads = []
+            for file, relative_path in _walk_files(local_dir):
+                if ignore_re and ignore_re.search(file):
+                    continue
+                
+                uploads.append((file, f"{remote_dir}/{relative_path}"))
             
-            # 创建远程目录
-            try:
-                sftp.mkdir(remote_dir)
-            except IOError:
-                pass  # 目录可能已存在
+            # 一次命令创建所有远程目录
+            remote_dirs = {remote_dir} | {remote.rsplit('/', 1)[0] for _, remote in uploads}
+            exit_code, _, error = self.execute_command('xargs -0 mkdir -p', stdin_data='\0'.join(sorted(remote_dirs)))
+            if exit_code != 0:
+                raise IOError(f"创建远程目录失败: {error}")
             
-            # 上传文件
-            local_path = Path(local_dir)
-            for file in local_path.rglob('*'):
-                if file.is_file():
-                    if ignore_patterns and any(pattern in str(file) for pattern in ignore_patterns):
-                        continue
-                    
-                    relative_path = file.relative_to(local_path)
-                    remote_file_path = f"{remote_dir}/{relative_path}"
-                    
-                    # 创建远程子目录
-                    remote_file_dir = str(remote_file_path).rsplit('/', 1)[0]
-                    try:
-                        sftp.makedirs(remote_file_dir)
-                    except:
-                        pass
-                    
-                    # 上传文件
-                    sftp.put(str(file), remote_file_path)
-                    logger.info(f"上传: {file} -> {remote_file_path}")
+            # SFTP会话按通道划分，每个工作线程使用自己的SFTP通道
+            local = threading.local()
+            sftp_clients = []
+            sftp_lock = threading.Lock()
+            
+            def put(item):
+                sftp = getattr(local, 'sftp', None)
+                if sftp is None:
+                    sftp = local.sftp = self.client.open_sftp()
+                    with sftp_lock:
+                        sftp_clients.append(sftp)
+                
+                sftp.put(*item)
+                logger.info(f"上传: {item[0]} -> {item[1]}")
+            
+            # 先占好名额再开工作线程：每个线程的SFTP通道一直用到全部上传结束，
+            # 边上传边等名额会互相等待
+            workers = self._reserve_slots(max(1, min(max_workers, len(uploads))))
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    list(executor.map(put, uploads))
+            finally:
+                for sftp in sftp_clients:
+                    sftp.close()
+                for _ in range(workers):
+                    self._channel_slots.release()
             
-            sftp.close()
             logger.info(f"✓ 目录上传完成: {local_dir} -> {remote_dir}")
             return True
             
@@ -178,35 +532,47 @@ class SSHManager:
         """获取系统信息"""
         info = {}
         
-        # 系统版本
-        exit_code, output, _ = self.execute_command('cat /etc/os-release | grep PRETTY_NAME')
-        if exit_code == 0:
-            info['os'] = output.strip().split('=')[1].strip('"')
-        
-        # CPU信息
-        exit_code, output, _ = self.execute_command('nproc')
-        if exit_code == 0:
-            info['cpu_cores'] = output.strip()
-        
-        # 内存信息
-        exit_code, output, _ = self.execute_command('free -h | grep Mem')
-        if exit_code == 0:
-            info['memory'] = output.strip()
-        
-        # 磁盘空间
-        exit_code, output, _ = self.execute_command('df -h / | tail -1')
-        if exit_code == 0:
-            info['disk'] = output.strip()
+        # 一次命令输出所有字段，每行以字段前缀开头
+        exit_code, output, _ = self.execute_command(SYSTEM_INFO_COMMAND)
+        for line in output.splitlines():
+            prefix, _, value = line.partition(':')
+            value = value.strip()
+            if prefix not in SYSTEM_INFO_FIELDS or not value:
+                continue
+            
+            # 系统版本
+            if prefix == 'OS':
+                value = value.split('=', 1)[1].strip('"')
+            
+            info[SYSTEM_INFO_FIELDS[prefix]] = value
         
         return info
     
+    def listening_ports(self) -> set:
+        """返回远程主机上所有处于监听状态的TCP/UDP端口（一次执行，没有ss时读取/proc/net）"""
+        exit_code, output, _ = self.execute_command(LISTENING_PORTS_COMMAND)
+        return parse_listening_ports(output) if exit_code == 0 else set()
+    
+    def check_ports(self, ports: List[int]) -> Dict[int, bool]:
+        """一次调用检查多个端口是否处于监听状态"""
+        listening = self.listening_ports()
+        return {port: port in listening for port in ports}
+    
     def check_port(self, port: int) -> bool:
         """检查端口是否开放"""
-        exit_code, _, error = self.execute_command(f'netstat -tuln | grep {port} || ss -tuln | grep {port}')
-        return exit_code == 0
+        return self.check_ports([port])[port]
     
     def close(self):
         """关闭连接"""
+        self._remove_session_key()
+        self._closing = True
+        self._refill_wakeup.set()
+        while not self._session_pool.empty():
+            self._release_session(self._session_pool.get_nowait())
+        if self._sftp is not None:
+            self._sftp.close()
+            self._sftp = None
+            self._channel_slots.release()
         if self.client:
             self.client.close()
             logger.info(f"连接已关闭: {self.host}")
@@ -219,19 +585,19 @@ class SSHManager:
         self.close()
 
 
-# 预定义的服务器连接
+# 预定义的服务器连接（密码从环境变量读取，未设置时在首次连接时提示输入）
 CLIENT_SERVER = {
     'host': '47.117.159.145',
     'port': 9321,
     'username': 'root',  # 根据实际情况修改
-    'password': 'uUyb-ARfcT=D2mMpBn(L'
+    'password': os.environ.get('FRP_CLIENT_SSH_PASSWORD')
 }
 
 SERVER_SERVER = {
     'host': '8.162.10.216',
     'port': 22,
     'username': 'root',  # 根据实际情况修改
-    'password': 'JeiFing1234@'
+    'password': os.environ.get('FRP_SERVER_SSH_PASSWORD')
 }
 
 
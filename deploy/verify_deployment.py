@@ -5,13 +5,89 @@
 """
 
 import sys
-import time
-import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # 添加父目录到路径
 sys.path.insert(0, str(Path(__file__).parent))
-from ssh_manager import SSHManager, CLIENT_SERVER, SERVER_SERVER
+from ssh_manager import SSHManager, CLIENT_SERVER, SERVER_SERVER, LISTENING_PORTS_COMMAND, parse_listening_ports
+
+# 每台主机最多取回的错误日志样例行数
+ERROR_SAMPLES = 5
+
+# 测速命令：一次curl输出首字节时间和下载速度，测试文件在同一条命令里清理
+SOCKS5_PERF_COMMAND = (
+    'curl -x socks5://127.0.0.1:1080 -o /tmp/test1MB.zip '
+    '-w "%{time_starttransfer} %{speed_download}" -s http://speedtest.tele2.net/1MB.zip; '
+    'rc=$?; rm -f /tmp/test1MB.zip; exit $rc'
+)
+
+# 各协议的验证参数：客户端/服务端的systemd服务、需要监听的端口、服务端对外的UDP端口、
+# 协议功能测试方法和测速命令（None表示不测）
+PROTOCOLS = {
+    'hysteria2': {
+        'units': {'client': 'hysteria2-client', 'server': 'hysteria2-server'},
+        'ports': {'client': frozenset({1080, 4433}), 'server': frozenset({4433, 7000})},
+        'server_port': 4433,
+        'protocol_test': 'test_socks5_proxy',
+        'perf_command': SOCKS5_PERF_COMMAND,
+    },
+    'quic': {
+        'units': {'client': None, 'server': 'frp-quic'},
+        'ports': {'client': frozenset(), 'server': frozenset({7000})},
+        'server_port': 7000,
+        'protocol_test': 'test_quic_connection',
+        'perf_command': None,
+    },
+}
+
+
+def build_state_script(unit: str = None) -> str:
+    """生成一次性采集主机状态的脚本：服务状态、监听端口、服务日志分段输出
+    
+    服务状态只看is-active --quiet的退出码（开机自启状态不参与判定，不再查询）；
+    journalctl加-q省去提示信息
+    """
+    script = ""
+    if unit:
+        script += (
+            "echo '===STATUS==='\n"
+            f"systemctl is-active --quiet {unit}; echo \"active $?\"\n"
+        )
+    script += f"echo '===PORTS==='\n{LISTENING_PORTS_COMMAND}\n"
+    if unit:
+        # 在远端按整词筛选错误行（不匹配error_log_size之类的字段名），只传回前几行样例与总数
+        script += (
+            "echo '===LOGS==='\n"
+            f"journalctl -u {unit} -n 50 --no-pager -q | grep -iwE 'error|failed' | "
+            f"awk 'NR<={ERROR_SAMPLES}; END {{print \"===ERROR_COUNT===\"; print NR}}'\n"
+        )
+    return script
+
+
+def parse_state_output(output: str) -> dict:
+    """按 ===段名=== 拆分采集脚本的输出"""
+    sections = {}
+    current = None
+    for line in output.splitlines():
+        if line.startswith('===') and line.endswith('===') and len(line) > 6:
+            current = line.strip('=')
+            sections[current] = []
+        elif current is not None:
+            sections[current].append(line)
+    
+    status = dict(line.split(' ', 1) for line in sections.get('STATUS', []) if ' ' in line)
+    ports_output = '\n'.join(sections.get('PORTS', []))
+    return {
+        'running': status.get('active') == '0',
+        'ports': parse_listening_ports(ports_output),
+        'udp_ports': parse_listening_ports(ports_output, 'udp'),
+        'logs': {
+            'count': int(''.join(sections.get('ERROR_COUNT', [])) or 0),
+            'samples': sections.get('LOGS', [])
+        },
+    }
 
 
 class DeploymentVerifier:
@@ -21,6 +97,9 @@ class DeploymentVerifier:
         self.protocol = protocol
         self.client_ssh = None
         self.server_ssh = None
+        self._log_buffer = threading.local()
+        self._p = PROTOCOLS[protocol]
+        self._units = self._p['units']
     
     def log(self, message: str, status: str = 'INFO'):
         """日志输出"""
@@ -33,20 +112,53 @@ class DeploymentVerifier:
             'TEST': '🔍'
         }
         icon = icons.get(status, '•')
-        print(f"{icon} {message}")
+        lines = getattr(self._log_buffer, 'lines', None)
+        if lines is not None:
+            lines.append(f"{icon} {message}")
+        else:
+            print(f"{icon} {message}")
+    
+    def _run_buffered(self, check):
+        """在工作线程中执行检查，日志先缓存，由主线程按提交顺序输出"""
+        self._log_buffer.lines = []
+        try:
+            return check(), self._log_buffer.lines
+        finally:
+            self._log_buffer.lines = None
+    
+    def run_checks(self, *checks) -> list:
+        """并发执行各项检查（都只读取远程状态、互不依赖），按传入顺序输出日志并返回结果"""
+        results = []
+        with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+            futures = [executor.submit(self._run_buffered, check) for check in checks]
+            for future in futures:
+                result, lines = future.result()
+                for line in lines:
+                    print(line)
+                results.append(result)
+        return results
     
     def connect_servers(self) -> bool:
         """连接服务器"""
         self.log("连接服务器...", 'STEP')
         
         try:
+            # 两台主机的握手并行进行；同一主机同一账号时两种角色复用一个传输层连接
             self.client_ssh = SSHManager(**self.client_config)
-            if not self.client_ssh.connect():
+            same_host = all(self.client_config[k] == self.server_config[k] for k in ('host', 'port', 'username'))
+            self.server_ssh = self.client_ssh if same_host else SSHManager(**self.server_config)
+            
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                client_future = executor.submit(self.client_ssh.connect)
+                server_future = None if same_host else executor.submit(self.server_ssh.connect)
+                client_ok = client_future.result()
+                server_ok = client_ok if same_host else server_future.result()
+            
+            if not client_ok:
                 self.log("客户端服务器连接失败", 'ERROR')
                 return False
             
-            self.server_ssh = SSHManager(**self.server_config)
-            if not self.server_ssh.connect():
+            if not server_ok:
                 self.log("服务端服务器连接失败", 'ERROR')
                 return False
             
@@ -57,36 +169,30 @@ class DeploymentVerifier:
             self.log(f"连接失败: {e}", 'ERROR')
             return False
     
-    def check_service_status(self) -> dict:
+    def collect_host_states(self) -> dict:
+        """每台主机只执行一次采集脚本，取回服务状态、监听端口和日志（两台主机并发）"""
+        def collect(ssh, unit):
+            exit_code, output, _ = ssh.execute_command(build_state_script(unit))
+            return parse_state_output(output)
+        
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            client = executor.submit(collect, self.client_ssh, self._units['client'])
+            server = executor.submit(collect, self.server_ssh, self._units['server'])
+            return {'client': client.result(), 'server': server.result()}
+    
+    def check_service_status(self, states: dict = None) -> dict:
         """检查服务状态"""
         self.log("检查服务状态...", 'STEP')
+        states = states or self.collect_host_states()
         
         status = {
-            'client': {'running': False, 'enabled': False},
-            'server': {'running': False, 'enabled': False}
+            'client': {'running': False},
+            'server': {'running': False}
         }
         
-        # 检查客户端服务
-        if self.protocol == 'hysteria2':
-            exit_code, output, _ = self.client_ssh.execute_command('systemctl is-active hysteria2-client')
-            status['client']['running'] = (exit_code == 0 and 'active' in output)
-            
-            exit_code, output, _ = self.client_ssh.execute_command('systemctl is-enabled hysteria2-client')
-            status['client']['enabled'] = (exit_code == 0 and 'enabled' in output)
-            
-            # 检查服务端
-            exit_code, output, _ = self.server_ssh.execute_command('systemctl is-active hysteria2-server')
-            status['server']['running'] = (exit_code == 0 and 'active' in output)
-            
-            exit_code, output, _ = self.server_ssh.execute_command('systemctl is-enabled hysteria2-server')
-            status['server']['enabled'] = (exit_code == 0 and 'enabled' in output)
-        
-        elif self.protocol == 'quic':
-            exit_code, output, _ = self.server_ssh.execute_command('systemctl is-active frp-quic')
-            status['server']['running'] = (exit_code == 0 and 'active' in output)
-            
-            exit_code, output, _ = self.server_ssh.execute_command('systemctl is-enabled frp-quic')
-            status['server']['enabled'] = (exit_code == 0 and 'enabled' in output)
+        for side in ('client', 'server'):
+            if self._units[side]:
+                status[side]['running'] = states[side]['running']
         
         # 输出结果
         if status['client']['running']:
@@ -101,32 +207,13 @@ class DeploymentVerifier:
         
         return status
     
-    def check_port_listening(self) -> dict:
+    def check_port_listening(self, states: dict = None) -> dict:
         """检查端口监听状态"""
         self.log("检查端口监听状态...", 'STEP')
+        states = states or self.collect_host_states()
         
-        ports = {
-            'client': [],
-            'server': []
-        }
-        
-        # 客户端端口
-        exit_code, output, _ = self.client_ssh.execute_command("ss -tuln | grep -E ':(1080|4433|7000)' || netstat -tuln | grep -E ':(1080|4433|7000)'")
-        if exit_code == 0:
-            for line in output.split('\n'):
-                if ':1080' in line:
-                    ports['client'].append(1080)
-                elif ':4433' in line:
-                    ports['client'].append(4433)
-        
-        # 服务端端口
-        exit_code, output, _ = self.server_ssh.execute_command("ss -tuln | grep -E ':(4433|7000)' || netstat -tuln | grep -E ':(4433|7000)'")
-        if exit_code == 0:
-            for line in output.split('\n'):
-                if ':4433' in line:
-                    ports['server'].append(4433)
-                elif ':7000' in line:
-                    ports['server'].append(7000)
+        # 在本地筛选关心的端口
+        ports = {side: sorted(wanted & states[side]['ports']) for side, wanted in self._p['ports'].items()}
         
         # 输出结果
         if ports['client']:
@@ -136,27 +223,26 @@ class DeploymentVerifier:
         
         return ports
     
-    def test_network_connectivity(self) -> dict:
+    def test_network_connectivity(self, states: dict = None) -> dict:
         """测试网络连通性"""
         self.log("测试网络连通性...", 'STEP')
+        states = states or self.collect_host_states()
         
         results = {
-            'client_to_server': False,
+            'server_port_open': False,
             'server_to_client': False,
             'internet_access': False
         }
         
-        # 测试客户端到服务端的连接
-        exit_code, _, _ = self.client_ssh.execute_command(
-            f"nc -zv {self.server_config['host']} 4433 2>&1 || "
-            f"telnet {self.server_config['host']} 4433 2>&1"
-        )
-        results['client_to_server'] = (exit_code == 0)
+        # Hysteria2和QUIC的服务端端口都是UDP，TCP握手探测不到；
+        # 以服务端该端口处于UDP监听状态为准，链路是否真正可用由协议测试判断
+        port = self._p['server_port']
+        results['server_port_open'] = port in states['server']['udp_ports']
         
-        if results['client_to_server']:
-            self.log("客户端 → 服务端: 连通", 'SUCCESS')
+        if results['server_port_open']:
+            self.log(f"服务端UDP端口 {port}: 监听中", 'SUCCESS')
         else:
-            self.log("客户端 → 服务端: 不通", 'ERROR')
+            self.log(f"服务端UDP端口 {port}: 未监听", 'ERROR')
         
         # 测试互联网访问
         exit_code, _, _ = self.client_ssh.execute_command('curl -I http://www.baidu.com -s')
@@ -171,9 +257,6 @@ class DeploymentVerifier:
     
     def test_socks5_proxy(self) -> bool:
         """测试SOCKS5代理（Hysteria2）"""
-        if self.protocol != 'hysteria2':
-            return True
-        
         self.log("测试SOCKS5代理功能...", 'STEP')
         
         # 测试SOCKS5代理连接
@@ -191,9 +274,6 @@ class DeploymentVerifier:
     
     def test_quic_connection(self) -> bool:
         """测试QUIC连接"""
-        if self.protocol != 'quic':
-            return True
-        
         self.log("测试QUIC连接...", 'STEP')
         
         # 这里可以添加QUIC连接测试
@@ -201,43 +281,22 @@ class DeploymentVerifier:
         self.log("QUIC连接: 需要客户端验证", 'WARN')
         return True
     
-    def check_service_logs(self) -> dict:
+    def check_service_logs(self, states: dict = None) -> dict:
         """检查服务日志"""
         self.log("检查服务日志...", 'STEP')
+        states = states or self.collect_host_states()
         
         logs = {
-            'client': '',
-            'server': ''
+            'client': states['client']['logs'],
+            'server': states['server']['logs']
         }
         
-        if self.protocol == 'hysteria2':
-            exit_code, output, _ = self.client_ssh.execute_command(
-                'journalctl -u hysteria2-client -n 50 --no-pager'
-            )
-            logs['client'] = output
-            
-            exit_code, output, _ = self.server_ssh.execute_command(
-                'journalctl -u hysteria2-server -n 50 --no-pager'
-            )
-            logs['server'] = output
-        
-        elif self.protocol == 'quic':
-            exit_code, output, _ = self.server_ssh.execute_command(
-                'journalctl -u frp-quic -n 50 --no-pager'
-            )
-            logs['server'] = output
-        
-        # 检查错误日志
-        errors = []
-        for log_type, log_content in logs.items():
-            if log_content:
-                for line in log_content.split('\n'):
-                    if 'error' in line.lower() or 'failed' in line.lower():
-                        errors.append(f"{log_type}: {line.strip()}")
-        
-        if errors:
-            self.log(f"发现 {len(errors)} 个错误日志", 'WARN')
-            for error in errors[:5]:  # 只显示前5个
+        # 错误行已在远端筛选
+        error_count = sum(log['count'] for log in logs.values())
+        if error_count:
+            self.log(f"发现 {error_count} 个错误日志", 'WARN')
+            errors = [f"{log_type}: {line.strip()}" for log_type, log in logs.items() for line in log['samples']]
+            for error in errors[:ERROR_SAMPLES]:  # 只显示前5个
                 self.log(f"  {error}", 'WARN')
         else:
             self.log("未发现错误日志", 'SUCCESS')
@@ -254,32 +313,16 @@ class DeploymentVerifier:
             'upload_speed': 0
         }
         
-        # 延迟测试
-        if self.protocol == 'hysteria2':
-            # 测试SOCKS5代理延迟
-            exit_code, output, _ = self.client_ssh.execute_command(
-                'curl -x socks5://127.0.0.1:1080 -w "%{time_total}" -o /dev/null -s http://www.baidu.com'
-            )
-            if exit_code == 0:
-                try:
-                    results['latency'] = float(output.strip())
-                    self.log(f"延迟: {results['latency']:.3f}s", 'INFO')
-                except ValueError:
-                    pass
-        
-        # 下载速度测试
-        if self.protocol == 'hysteria2':
-            exit_code, output, _ = self.client_ssh.execute_command(
-                'curl -x socks5://127.0.0.1:1080 http://speedtest.tele2.net/1MB.zip -o /tmp/test1MB.zip -w "%{speed_download}" -s'
-            )
+        # 延迟与下载速度由同一次curl测得：首字节时间作为延迟
+        if self._p['perf_command']:
+            exit_code, output, _ = self.client_ssh.execute_command(self._p['perf_command'])
             if exit_code == 0:
                 try:
-                    speed_bytes = float(output.strip())
+                    latency, speed_bytes = map(float, output.split())
+                    results['latency'] = latency
                     results['download_speed'] = speed_bytes / 1024  # 转换为KB/s
+                    self.log(f"延迟: {results['latency']:.3f}s", 'INFO')
                     self.log(f"下载速度: {results['download_speed']:.2f} KB/s", 'INFO')
-                    
-                    # 清理测试文件
-                    self.client_ssh.execute_command('rm -f /tmp/test1MB.zip')
                 except ValueError:
                     pass
         
@@ -305,7 +348,7 @@ class DeploymentVerifier:
         
         # 网络连通性
         report.append("\n3. 网络连通性")
-        report.append(f"   客户端→服务端: {'✓ 通' if connectivity['client_to_server'] else '✗ 不通'}")
+        report.append(f"   服务端UDP端口{self._p['server_port']}: {'✓ 监听中' if connectivity['server_port_open'] else '✗ 未监听'}")
         report.append(f"   互联网访问: {'✓ 正常' if connectivity['internet_access'] else '✗ 失败'}")
         
         # 性能指标
@@ -316,10 +359,7 @@ class DeploymentVerifier:
                 report.append(f"   下载速度: {performance['download_speed']:.2f} KB/s")
         
         # 错误日志摘要
-        error_count = 0
-        for log_content in logs.values():
-            if log_content:
-                error_count += log_content.lower().count('error') + log_content.lower().count('failed')
+        error_count = sum(log['count'] for log in logs.values())
         
         report.append("\n5. 日志状态")
         report.append(f"   错误数量: {error_count}")
@@ -344,26 +384,19 @@ class DeploymentVerifier:
             if not self.connect_servers():
                 return False
             
-            # 检查服务状态
-            status = self.check_service_status()
-            
-            # 检查端口
-            ports = self.check_port_listening()
-            
-            # 测试网络连通性
-            connectivity = self.test_network_connectivity()
+            # 每台主机一次性取回服务状态、端口和日志
+            states = self.collect_host_states()
             
-            # 测试协议功能
-            if self.protocol == 'hysteria2':
-                proxy_ok = self.test_socks5_proxy()
-            else:
-                proxy_ok = self.test_quic_connection()
-            
-            # 检查日志
-            logs = self.check_service_logs()
-            
-            # 性能测试
-            performance = self.test_performance()
+            # 各项检查与测试并发执行
+            protocol_test = getattr(self, self._p['protocol_test'])
+            status, ports, connectivity, proxy_ok, logs, performance = self.run_checks(
+                lambda: self.check_service_status(states),
+                lambda: self.check_port_listening(states),
+                lambda: self.test_network_connectivity(states),
+                protocol_test,
+                lambda: self.check_service_logs(states),
+                self.test_performance
+            )
             
             # 生成报告
             report = self.generate_report(status, ports, connectivity, logs, performance)
@@ -372,7 +405,7 @@ class DeploymentVerifier:
             # 判断验证是否通过
             all_ok = (
                 status['server']['running'] and
-                connectivity['client_to_server'] and
+                connectivity['server_port_open'] and
                 proxy_ok
             )
             
@@ -385,7 +418,7 @@ class DeploymentVerifier:
             # 关闭连接
             if self.client_ssh:
                 self.client_ssh.close()
-            if self.server_ssh:
+            if self.server_ssh and self.server_ssh is not self.client_ssh:
                 self.server_ssh.close()
 
 
@@ -18,6 +18,10 @@ ctypedef unsigned int uint32_t
 ctypedef long long int64_t
 ctypedef unsigned long long uint64_t
 
+# Queued stream data is flushed once this much is pending, or when the socket runs dry
+cdef int FLUSH_BYTES = 65536
+cdef int MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0)
+
 
 cdef class FastDataForwarder:
     cdef int stream_id
@@ -43,22 +47,46 @@ cdef class FastDataForwarder:
         cdef int data_len
         cdef bytes header
         cdef bytes data
+        cdef int pending = 0
+        cdef int dontwait = MSG_DONTWAIT if self._conn.gettimeout() is None else 0
         
         while True:
             try:
-                data = self._conn.recv(buffer_size)
+                data = None
+                if pending and dontwait:
+                    try:
+                        data = self._conn.recv(buffer_size, dontwait)
+                    except BlockingIOError:
+                        pass
+                if data is None:
+                    if pending:
+                        quic_conn.transmit()
+                        pending = 0
+                    data = self._conn.recv(buffer_size)
+                
                 data_len = len(data)
                 if data_len == 0:
+                    if pending:
+                        quic_conn.transmit()
                     return total_bytes
                 
                 total_bytes += data_len
                 header = self.pack_header(data_len)
                 quic_conn.send_stream_data(self.stream_id, header + data)
-                quic_conn.transmit()
+                
+                pending += data_len
+                if pending >= FLUSH_BYTES or not dontwait:
+                    quic_conn.transmit()
+                    pending = 0
                 
             except Exception:
                 break
         
+        if pending:
+            try:
+                quic_conn.transmit()
+            except Exception:
+                pass
         return total_bytes
 
 
@@ -92,12 +120,27 @@ cdef class UltraFastForwarder:
         cdef bytes data
         cdef int data_len
         cdef uint8_t[8] header
+        cdef int pending = 0
+        cdef int dontwait = MSG_DONTWAIT if self._conn.gettimeout() is None else 0
         
         while True:
             try:
-                data = self._conn.recv(self.buffer_size)
+                data = None
+                if pending and dontwait:
+                    try:
+                        data = self._conn.recv(self.buffer_size, dontwait)
+                    except BlockingIOError:
+                        pass
+                if data is None:
+                    if pending:
+                        quic_conn.transmit()
+                        pending = 0
+                    data = self._conn.recv(self.buffer_size)
+                
                 data_len = len(data)
                 if data_len == 0:
+                    if pending:
+                        quic_conn.transmit()
                     return total_bytes
                 
                 total_bytes += data_len
@@ -107,11 +150,20 @@ cdef class UltraFastForwarder:
                     self.stream_id, 
                     header[:8] + data
                 )
-                quic_conn.transmit()
+                
+                pending += data_len
+                if pending >= FLUSH_BYTES or not dontwait:
+                    quic_conn.transmit()
+                    pending = 0
                 
             except Exception:
                 break
         
+        if pending:
+            try:
+                quic_conn.transmit()
+            except Exception:
+                pass
         return total_bytes
 
 
@@ -1,6 +1,12 @@
 import socket
 import struct
 
+_pack_len_into = struct.Struct('!i').pack_into
+
+# Queued stream data is flushed once this much is pending, or when the socket runs dry
+_FLUSH_BYTES = 64 * 1024
+_MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0)
+
 
 class FastDataForwarder:
     def __init__(self, stream_id, conn_id, conn):
@@ -8,26 +14,61 @@ class FastDataForwarder:
         self.conn_id = conn_id
         self._conn = conn
         self.conn_id_bytes = struct.pack('!i', conn_id)
+        # Length is packed in place; the conn id half of the header never changes
+        self._header = bytearray(8)
+        self._header[4:] = self.conn_id_bytes
     
     def pack_header(self, data_len):
-        return struct.pack('!i', data_len) + self.conn_id_bytes
+        _pack_len_into(self._header, 0, data_len)
+        return bytes(self._header)
     
     def forward_data(self, quic_conn, buffer_size=1024*1024):
         total_bytes = 0
+        pending = 0
+        # One slab per forwarding session: 8-byte header followed by the payload,
+        # received in place so each frame costs a single copy into the stream
+        frame = bytearray(8 + buffer_size)
+        frame[4:8] = self.conn_id_bytes
+        view = memoryview(frame)
+        body = view[8:]
+        # A non-blocking peek only works on blocking sockets; otherwise flush every frame
+        dontwait = _MSG_DONTWAIT if self._conn.gettimeout() is None else 0
         while True:
             try:
-                data = self._conn.recv(buffer_size)
-                if not data:
+                data_len = None
+                if pending and dontwait:
+                    try:
+                        data_len = self._conn.recv_into(body, 0, dontwait)
+                    except BlockingIOError:
+                        pass
+                if data_len is None:
+                    if pending:
+                        quic_conn.transmit()
+                        pending = 0
+                    data_len = self._conn.recv_into(body)
+                
+                if not data_len:
+                    if pending:
+                        quic_conn.transmit()
                     return total_bytes
                 
-                total_bytes += len(data)
-                header = self.pack_header(len(data))
-                quic_conn.send_stream_data(self.stream_id, header + data)
-                quic_conn.transmit()
+                total_bytes += data_len
+                _pack_len_into(frame, 0, data_len)
+                quic_conn.send_stream_data(self.stream_id, bytes(view[:8 + data_len]))
+                
+                pending += data_len
+                if pending >= _FLUSH_BYTES or not dontwait:
+                    quic_conn.transmit()
+                    pending = 0
                 
             except Exception:
                 break
         
+        if pending:
+            try:
+                quic_conn.transmit()
+            except Exception:
+                pass
         return total_bytes
 
 
@@ -4,55 +4,167 @@ import socket
 import time
 import threading
 import struct
-import selectors
+import asyncio
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import lib.ConnTool as ConnTool
 
-sel = selectors.DefaultSelector()
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger('frpc')
 
+# Control frames are 4-byte signed ints in network byte order, matching frps.py
+_CMD = struct.Struct('!i')
+_HB = _CMD.pack(1)
+_OPEN = _CMD.pack(2)
+_UNPACK_I = _CMD.unpack
+
+# Dials the target side while the caller dials the server. Tasks here only connect
+# and never wait on other tasks, so the bounded pool cannot deadlock.
+_connector = ThreadPoolExecutor(max_workers=32, thread_name_prefix='frpc-connect')
+
+
+# (level, option, value) applied to every connection; options the platform
+# lacks are dropped here so optimize_socket needs no per-option checks.
+SOCK_OPTS = tuple(
+    (level, getattr(socket, name), value)
+    for level, name, value in (
+        (socket.IPPROTO_TCP, 'TCP_NODELAY', 1),
+        (socket.SOL_SOCKET, 'SO_KEEPALIVE', 1),
+        (socket.SOL_SOCKET, 'SO_REUSEADDR', 1),
+        (socket.IPPROTO_TCP, 'TCP_KEEPIDLE', 30),
+        (socket.IPPROTO_TCP, 'TCP_KEEPINTVL', 10),
+        (socket.IPPROTO_TCP, 'TCP_KEEPCNT', 3),
+        # Drop a peer that leaves sent data unacknowledged for 30s
+        (socket.IPPROTO_TCP, 'TCP_USER_TIMEOUT', 30000),
+        # Ack the small command frames right away instead of delaying
+        (socket.IPPROTO_TCP, 'TCP_QUICKACK', 1),
+        # Report writable once unsent data drops under 128 KiB, so relays
+        # wake sooner without pinning SO_SNDBUF and losing autotuning
+        (socket.IPPROTO_TCP, 'TCP_NOTSENT_LOWAT', 128 * 1024),
+    )
+    if hasattr(socket, name)
+)
+
 
 def optimize_socket(sock):
+    setsockopt = sock.setsockopt
+    for level, option, value in SOCK_OPTS:
+        try:
+            setsockopt(level, option, value)
+        except OSError:
+            pass
+
+
+def _close_result(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _is_idle_open(sock):
+    # An idle pooled connection has nothing to read; EOF, a reset or stray data
+    # mean frps dropped it. Peek non-blocking: with a timeout set, recv would
+    # wait for data first.
+    timeout = sock.gettimeout()
+    sock.setblocking(False)
     try:
-        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-    except Exception:
-        pass
-    try:
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
-    except Exception:
-        pass
-    try:
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    except Exception:
-        pass
-    try:
-        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30)
-        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10)
-        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
-    except Exception:
-        pass
+        sock.recv(1, socket.MSG_PEEK)
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.settimeout(timeout)
+    return False
+
+
+class SharedFrpcPool:
+    """Idle work connections to one server, shared by every Frpc that uses it."""
+
+    def __init__(self, server_host, server_port, pool_size=5):
+        self.server_host = server_host
+        self.server_port = server_port
+        self.pool_size = pool_size
+        self.idle_conns = deque()
+        self.running = True
+
+    def open_connection(self):
+        try:
+            work_conn = socket.create_connection((self.server_host, self.server_port), timeout=5)
+            optimize_socket(work_conn)
+            return work_conn
+        except Exception as e:
+            logger.error(f'Failed to open work connection: {e}')
+            return None
+
+    def maintain_pool(self):
+        logger.info(f'Starting shared work connection pool with size: {self.pool_size}')
+        while self.running:
+            needed = self.pool_size - len(self.idle_conns)
+            for _ in range(needed):
+                work_conn = self.open_connection()
+                if work_conn:
+                    self.idle_conns.append(work_conn)
+            
+            time.sleep(1)
+
+    def acquire(self):
+        # deque.popleft is atomic, so concurrent Frpc instances need no lock here.
+        # Connections frps closed while idle (restart, idle timeout) are dropped
+        # here, since writing to them first would usually still succeed.
+        while True:
+            try:
+                work_conn = self.idle_conns.popleft()
+            except IndexError:
+                logger.debug('Shared pool empty, opening new work connection')
+                return self.open_connection()
+            if _is_idle_open(work_conn):
+                return work_conn
+            logger.debug('Pooled work connection was closed by the server, discarding it')
+            work_conn.close()
+
+    def stop(self):
+        self.running = False
+        while self.idle_conns:
+            try:
+                self.idle_conns.popleft().close()
+            except Exception:
+                pass
 
 
 class ConnectionPool:
-    def __init__(self, server_host, server_port, target_host, target_port, pool_size=5):
+    def __init__(self, server_host, server_port, target_host, target_port, pool_size=5,
+                 server_pool=None):
         self.server_host = server_host
         self.server_port = server_port
         self.target_host = target_host
         self.target_port = target_port
         self.pool_size = pool_size
+        self.server_pool = server_pool
         self.work_conn_pool = []
-        self.lock = threading.Lock()
+        # Signalled whenever a connection is taken, so maintain_pool sleeps while the pool is full
+        self.cond = threading.Condition()
         self.running = True
 
     def create_connection_pair(self):
+        # Server and target are dialled concurrently, so a pair costs one connect time, not two
+        target_future = _connector.submit(
+            socket.create_connection, (self.target_host, self.target_port), 5
+        )
+        work_conn = None
         try:
-            work_conn = socket.create_connection((self.server_host, self.server_port), timeout=5)
-            target_conn = socket.create_connection((self.target_host, self.target_port), timeout=5)
+            if self.server_pool is not None:
+                work_conn = self.server_pool.acquire()
+                if work_conn is None:
+                    target_future.add_done_callback(_close_result)
+                    return None
+            else:
+                work_conn = socket.create_connection((self.server_host, self.server_port), timeout=5)
+            target_conn = target_future.result()
             
             optimize_socket(work_conn)
             optimize_socket(target_conn)
@@ -61,75 +173,110 @@ class ConnectionPool:
             return work_conn
         except Exception as e:
             logger.error(f'Failed to create connection pair: {e}')
+            if work_conn is not None:
+                work_conn.close()
+            target_future.add_done_callback(_close_result)
             return None
 
     def maintain_pool(self):
         logger.info(f'Starting connection pool with size: {self.pool_size}')
         while self.running:
-            with self.lock:
+            with self.cond:
+                self.cond.wait_for(lambda: len(self.work_conn_pool) < self.pool_size or not self.running)
                 current_size = len(self.work_conn_pool)
                 needed = self.pool_size - current_size
-                
-                if needed > 0:
-                    logger.debug(f'Pool has {current_size} connections, creating {needed} more')
-                    for _ in range(needed):
-                        work_conn = self.create_connection_pair()
-                        if work_conn:
-                            self.work_conn_pool.append(work_conn)
             
-            time.sleep(1)
+            if not self.running:
+                break
+            
+            # Connect outside the lock so get_connection never waits on a connect timeout
+            logger.debug(f'Pool has {current_size} connections, creating {needed} more')
+            if needed > 1:
+                with ThreadPoolExecutor(max_workers=needed) as executor:
+                    pairs = list(executor.map(lambda _: self.create_connection_pair(), range(needed)))
+            else:
+                pairs = [self.create_connection_pair()]
+            new_conns = [conn for conn in pairs if conn]
+            with self.cond:
+                self.work_conn_pool.extend(new_conns)
+            
+            if len(new_conns) < needed:
+                time.sleep(1)
 
     def get_connection(self):
-        with self.lock:
-            if self.work_conn_pool:
-                return self.work_conn_pool.pop()
-            else:
-                logger.debug('Pool empty, creating new connection')
-                return self.create_connection_pair()
+        with self.cond:
+            work_conn = self.work_conn_pool.pop() if self.work_conn_pool else None
+            self.cond.notify()
+        
+        if work_conn is None:
+            logger.debug('Pool empty, creating new connection')
+            work_conn = self.create_connection_pair()
+        return work_conn
 
     def stop(self):
         self.running = False
+        with self.cond:
+            self.cond.notify_all()
 
 
 class Frpc:
-    def __init__(self, server_host, server_port, target_host, target_port, pool_size=5):
+    """Control connection to frps, driven by an asyncio event loop.
+
+    run() owns a private loop; pass loop= to schedule the client on a loop that
+    is already running in another thread (AutoFrpcManager shares one for all ports).
+    """
+
+    def __init__(self, server_host, server_port, target_host, target_port, pool_size=5,
+                 shared_pool=None, loop=None):
         self.server_host = server_host
         self.server_port = server_port
         self.target_host = target_host
         self.target_port = target_port
-        self.server_fd = None
+        self.reader = None
+        self.writer = None
         self.running = True
         self.auto_reconnect = True
+        self._loop = None
+        self._task = None
+        self._future = None
         
+        # With a shared pool, idle server links are kept once per server and the
+        # target side is connected on demand instead of per-instance pre-joined pairs.
         self.connection_pool = ConnectionPool(
-            server_host, server_port, target_host, target_port, pool_size
+            server_host, server_port, target_host, target_port,
+            0 if shared_pool is not None else pool_size,
+            server_pool=shared_pool
         )
         
-        self.connect_to_server()
-        
-        threading.Thread(target=self.connection_pool.maintain_pool, daemon=True).start()
-        threading.Thread(target=self.heartbeat, daemon=True).start()
+        if loop is not None:
+            self._future = asyncio.run_coroutine_threadsafe(self._run(), loop)
+            self._future.add_done_callback(self._log_run_result)
+
+    def is_alive(self):
+        # running only records that stop() was not called; the client is alive while its
+        # control task is, which ends for good once connect_to_server gives up
+        if self._future is not None:
+            return not self._future.done()
+        return self._task is not None and not self._task.done()
+
+    def _log_run_result(self, future):
+        # Nobody waits on a scheduled client, so surface its failure here instead of dropping it
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f'frpc for port {self.target_port} exited with error: {future.exception()!r}')
 
-    def connect_to_server(self):
+    async def connect_to_server(self):
         retry_count = 0
         max_retries = 10
         retry_delay = 2
         
         while retry_count < max_retries and self.running:
             try:
-                self.server_fd = socket.create_connection(
-                    (self.server_host, self.server_port), timeout=5
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.server_host, self.server_port), timeout=5
                 )
-                optimize_socket(self.server_fd)
+                optimize_socket(self.writer.get_extra_info('socket'))
                 
-                self.server_fd.sendall(struct.pack('i', 1))
-                self.server_fd.setblocking(False)
-                
-                try:
-                    sel.unregister(self.server_fd)
-                except Exception:
-                    pass
-                sel.register(self.server_fd, selectors.EVENT_READ, self.handle_controller_data)
+                self.writer.write(_HB)
                 
                 logger.info(f'Connected to server {self.server_host}:{self.server_port}')
                 return True
@@ -138,84 +285,98 @@ class Frpc:
                 retry_count += 1
                 logger.warning(f'Connection attempt {retry_count} failed: {e}')
                 if retry_count < max_retries:
-                    time.sleep(retry_delay)
+                    await asyncio.sleep(retry_delay)
         
         logger.error('Failed to connect to server after maximum retries')
         return False
 
-    def heartbeat(self):
+    async def heartbeat(self):
         while self.running:
+            await asyncio.sleep(5)
             try:
-                if self.server_fd is not None:
-                    self.server_fd.sendall(struct.pack('i', 1))
+                self.writer.write(_HB)
+                await self.writer.drain()
             except Exception as e:
                 logger.error(f'Heartbeat failed: {e}')
-                if self.auto_reconnect:
-                    logger.info('Attempting to reconnect...')
-                    self.connect_to_server()
-            time.sleep(5)
+                # Closing feeds EOF to the reader, which ends handle_controller_data
+                self.writer.close()
+                return
 
-    def handle_controller_data(self, server_fd, mask):
-        try:
-            data = server_fd.recv(4)
-            if not data:
+    async def handle_controller_data(self):
+        loop = asyncio.get_running_loop()
+        while self.running:
+            try:
+                data = await self.reader.readexactly(4)
+            except (asyncio.IncompleteReadError, OSError):
                 logger.info('Server connection closed')
-                if self.auto_reconnect:
-                    self.reconnect()
                 return
             
-            cmd = struct.unpack('i', data)[0]
+            cmd = _UNPACK_I(data)[0]
             logger.debug(f'Received command: {cmd}')
             
             if cmd == 2:
                 logger.info('Received connection request from server')
-                
-                work_conn = self.connection_pool.get_connection()
-                if work_conn:
-                    work_conn.sendall(struct.pack('i', 2))
-                    logger.info('Established working connection')
-                else:
-                    logger.error('Failed to get connection from pool')
-                    
+                # Pool misses dial out, so keep them off the event loop
+                loop.run_in_executor(None, self.open_work_connection)
+
+    def open_work_connection(self):
+        try:
+            work_conn = self.connection_pool.get_connection()
+            if work_conn:
+                work_conn.sendall(_OPEN)
+                logger.info('Established working connection')
+            else:
+                logger.error('Failed to get connection from pool')
         except Exception as e:
-            logger.debug(f'Error handling controller data: {e}')
+            logger.debug(f'Error opening working connection: {e}')
+
+    def close_server(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = None
+        self.writer = None
 
-    def reconnect(self):
+    async def _run(self):
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        if self.connection_pool.pool_size:
+            # Refills block on connects and are woken on demand, so they keep their own thread
+            threading.Thread(target=self.connection_pool.maintain_pool, daemon=True).start()
         try:
-            if self.server_fd:
-                sel.unregister(self.server_fd)
-                self.server_fd.close()
-        except Exception:
-            pass
-        
-        self.server_fd = None
-        logger.info('Reconnecting to server...')
-        self.connect_to_server()
+            while self.running and await self.connect_to_server():
+                heartbeat = asyncio.create_task(self.heartbeat())
+                try:
+                    await self.handle_controller_data()
+                finally:
+                    heartbeat.cancel()
+                    self.close_server()
+                
+                if not self.auto_reconnect:
+                    break
+                logger.info('Reconnecting to server...')
+        finally:
+            self._task = None
+            self.close_server()
+            self.connection_pool.stop()
 
     def stop(self):
+        # Safe from any thread: the control task closes its own connection when cancelled
         self.running = False
         self.connection_pool.stop()
-        if self.server_fd:
+        task = self._task
+        if task is not None:
             try:
-                sel.unregister(self.server_fd)
-            except Exception:
+                self._loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
                 pass
-            self.server_fd.close()
+        elif self._future is not None:
+            # Scheduled but not started yet
+            self._future.cancel()
 
     def run(self):
         logger.info('frpc started')
         try:
-            while self.running:
-                try:
-                    events = sel.select(timeout=1.0)
-                    for key, mask in events:
-                        callback = key.data
-                        try:
-                            callback(key.fileobj, mask)
-                        except Exception as e:
-                            logger.error(f'Error in callback: {e}')
-                except Exception as e:
-                    logger.error(f'Error in select loop: {e}')
+            asyncio.run(self._run())
         except KeyboardInterrupt:
             logger.info('Received interrupt, shutting down...')
         finally:
@@ -41,6 +41,26 @@ CMD_UNREGISTER_PORT = 3
 CMD_CONNECTION = 4
 CMD_CONNECTION_ACK = 5
 
+# 用户/目标TCP连接的socket选项，平台不支持的选项在这里直接过滤掉。
+# 不固定SO_SNDBUF/SO_RCVBUF（固定后Linux不再自动调整窗口），改用TCP_NOTSENT_LOWAT
+# 限制内核里未发送的数据量，写端更早被唤醒
+SOCK_OPTS = tuple(
+    (level, getattr(socket, name), value)
+    for level, name, value in (
+        (socket.IPPROTO_TCP, 'TCP_NODELAY', 1),
+        (socket.IPPROTO_TCP, 'TCP_NOTSENT_LOWAT', 128 * 1024),
+    )
+    if hasattr(socket, name)
+)
+
+
+def optimize_socket(sock: socket.socket) -> None:
+    for level, option, value in SOCK_OPTS:
+        try:
+            sock.setsockopt(level, option, value)
+        except OSError:
+            pass
+
 
 class FrpcQuicProtocol(QuicConnectionProtocol):
     def __init__(self, *args, **kwargs):
@@ -173,9 +193,7 @@ class FrpcQuicProtocol(QuicConnectionProtocol):
         try:
             target_conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             target_conn.settimeout(5.0)
-            target_conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 2 * 1024 * 1024)
-            target_conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2 * 1024 * 1024)
-            target_conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            optimize_socket(target_conn)
             target_conn.connect(('127.0.0.1', port))
             logger.debug(f'Connected to target port {port}')
             
@@ -341,26 +359,34 @@ class PortScanner:
             else:
                 ports = list(range(1, 65536))
         
-        logger.debug(f'Scanning {len(ports)} ports with {self.max_workers} workers...')
+        try:
+            addr = socket.gethostbyname(host)
+        except OSError as e:
+            logger.error(f'Failed to resolve {host}: {e}')
+            return []
+        
+        logger.debug(f'Scanning {len(ports)} ports with {self.max_workers} concurrent probes...')
         
+        # Runs on the scanner's own thread (see start_continuous_scan), so it gets a
+        # private event loop: all probes share one OS thread instead of a thread pool
+        return asyncio.run(self._scan_ports_async(addr, ports, 0.3))
+
+    async def _scan_ports_async(self, addr: str, ports: List[int], timeout: float) -> List[int]:
+        port_iter = iter(ports)
         active_ports = []
         
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-        
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_port = {
-                executor.submit(self.check_port, host, port, 0.3): port 
-                for port in ports
-            }
-            
-            for future in as_completed(future_to_port):
-                port = future_to_port[future]
+        async def probe_worker():
+            # max_workers of these pull from one shared iterator, so at most that many
+            # connects are in flight and no task is created per port
+            for port in port_iter:
                 try:
-                    if future.result():
-                        active_ports.append(port)
-                except Exception as e:
-                    logger.debug(f'Error scanning port {port}: {e}')
+                    _, writer = await asyncio.wait_for(asyncio.open_connection(addr, port), timeout)
+                except (OSError, asyncio.TimeoutError):
+                    continue
+                writer.close()
+                active_ports.append(port)
         
+        await asyncio.gather(*(probe_worker() for _ in range(max(1, self.max_workers))))
         return sorted(active_ports)
 
     def scan_incremental(self, host: str = '127.0.0.1') -> Dict:
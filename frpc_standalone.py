@@ -4,9 +4,27 @@ import socket
 import time
 import threading
 import struct
+import select
 import selectors
 import logging
 import os
+import errno
+import queue
+import collections
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Batch connect probing is shared with port_scanner.py (PyInstaller bundles it into the exe)
+from port_scanner import probe_batch, MAX_PROBE_BATCH
+
+# Optional compiled relay loop (relay_core.pyx, POSIX only); the Python loop below is the fallback
+try:
+    import relay_core
+except ImportError:
+    relay_core = None
 
 sel = selectors.DefaultSelector()
 logging.basicConfig(
@@ -22,88 +40,210 @@ CMD_REGISTER_PORT = 3
 CMD_UNREGISTER_PORT = 4
 CMD_DATA_CONNECT = 5
 
+# Control commands that carry a 4-byte port after the command word
+CMDS_WITH_PORT = frozenset({CMD_CONNECTION, CMD_REGISTER_PORT, CMD_UNREGISTER_PORT})
+CONTROL_RECV_SIZE = 64 * 1024
 
-def optimize_socket(sock):
-    try:
-        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-    except Exception as e:
-        logger.debug(f'TCP_NODELAY failed: {e}')
-    try:
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
-    except Exception as e:
-        logger.debug(f'SO_KEEPALIVE failed: {e}')
-    try:
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    except Exception as e:
-        logger.debug(f'SO_REUSEADDR failed: {e}')
-    try:
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
-    except Exception as e:
-        logger.debug(f'Buffer size setting failed: {e}')
-    try:
-        sock.setsockopt(socket.IPPROTO_TCP, TCP_KEEPIDLE, 30)
-        sock.setsockopt(socket.IPPROTO_TCP, TCP_KEEPINTVL, 10)
-        sock.setsockopt(socket.IPPROTO_TCP, TCP_KEEPCNT, 3)
-    except Exception as e:
-        logger.debug(f'TCP keepalive settings failed: {e}')
-    try:
-        if hasattr(socket, 'TCP_WINDOW_CLAMP'):
-            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_WINDOW_CLAMP, 1024 * 1024)
-    except Exception as e:
-        logger.debug(f'TCP window clamp failed: {e}')
+# Frames are fixed, so the formats are compiled once and the heartbeat is packed once
+CMD_STRUCT = struct.Struct('!i')
+CMD_PORT_STRUCT = struct.Struct('!ii')
+HEARTBEAT_FRAME = CMD_STRUCT.pack(CMD_HEARTBEAT)
+HEARTBEAT_INTERVAL = 5
+# Queued control frames go out together in one sendmsg (writev) call
+MAX_CONTROL_BATCH = 64
+CONTROL_SEND_FLAGS = getattr(socket, 'MSG_NOSIGNAL', 0)
 
 
 TCP_KEEPIDLE = 4
 TCP_KEEPINTVL = 5
 TCP_KEEPCNT = 6
 
+# (level, option, value) applied by optimize_socket, built once at import
+SOCK_OPTS = (
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+    (socket.SOL_SOCKET, socket.SO_REUSEADDR, 1),
+    (socket.IPPROTO_TCP, TCP_KEEPIDLE, 30),
+    (socket.IPPROTO_TCP, TCP_KEEPINTVL, 10),
+    (socket.IPPROTO_TCP, TCP_KEEPCNT, 3),
+)
+if hasattr(socket, 'TCP_WINDOW_CLAMP'):
+    SOCK_OPTS += ((socket.IPPROTO_TCP, socket.TCP_WINDOW_CLAMP, 1024 * 1024),)
+
+
+def conn_is_idle_open(sock):
+    # An idle pooled connection has nothing to read. EOF, a reset or stray
+    # data all mean the server dropped it. The peek runs non-blocking because
+    # a socket with a timeout would otherwise wait for data first.
+    timeout = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        sock.recv(1, socket.MSG_PEEK)
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.settimeout(timeout)
+    return False
+
+
+def optimize_socket(sock, buf_size=None):
+    setsockopt = sock.setsockopt
+    for level, option, value in SOCK_OPTS:
+        try:
+            setsockopt(level, option, value)
+        except OSError as e:
+            logger.debug(f'setsockopt({level}, {option}, {value}) failed: {e}')
+    # Fixed buffer sizes turn off the kernel's TCP buffer autotuning, so only set them on request
+    if buf_size is not None:
+        try:
+            setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, buf_size)
+            setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buf_size)
+        except OSError as e:
+            logger.debug(f'Buffer size setting failed: {e}')
+
 
 PKT_BUFF_SIZE = 4 * 1024 * 1024
+# Relay workers log per-connection throughput at most this often (seconds)
+STATS_REPORT_INTERVAL = 5
+
+# SYN scan: bare TCP header (sport, dport, seq, ack, data offset, flags, window, checksum, urgent)
+TCP_SYN_HEADER = struct.Struct('!HHIIBBHHH')
+TCP_REPLY_HEADER = struct.Struct('!HHIIBB')
+TCP_FLAG_SYN = 0x02
+TCP_FLAG_SYN_ACK = 0x12
+SYN_WINDOW = 1024
+
+# No SPLICE_F_MORE: on TCP it acts like MSG_MORE and holds back the tail of
+# every write, adding ~200 ms to small request/response messages
+SPLICE_FLAGS = getattr(os, 'SPLICE_F_MOVE', 0)
+PIPE_SIZE = 1024 * 1024
+
+
+def wait_socket(sock, events):
+    timeout = sock.gettimeout()
+    poller = select.poll()
+    poller.register(sock, events)
+    if not poller.poll(None if timeout is None else timeout * 1000):
+        raise socket.timeout('timed out')
+
+
+class Relay:
+    """Moves one direction of a connection pair.
+
+    On Linux the bytes go socket -> pipe -> socket with os.splice and never enter
+    user space; elsewhere (or for sockets splice rejects) they go through one
+    reusable buffer instead of a fresh bytes object per recv.
+    """
+
+    def __init__(self, conn_receiver, conn_sender):
+        self.conn_receiver = conn_receiver
+        self.conn_sender = conn_sender
+        self.pipe = None
+        self.view = None
+        if hasattr(os, 'splice'):
+            try:
+                self.pipe = os.pipe()
+                if hasattr(fcntl, 'F_SETPIPE_SZ'):
+                    try:
+                        fcntl.fcntl(self.pipe[1], fcntl.F_SETPIPE_SZ, PIPE_SIZE)
+                    except OSError:
+                        pass
+            except OSError as e:
+                logger.debug(f'splice pipe unavailable: {e}')
+        if self.pipe is None:
+            self.use_buffer()
+
+    def use_buffer(self):
+        self.close()
+        self.view = memoryview(bytearray(PKT_BUFF_SIZE))
+
+    def recv(self):
+        if self.pipe is None:
+            return self.conn_receiver.recv_into(self.view)
+        while True:
+            try:
+                return os.splice(self.conn_receiver.fileno(), self.pipe[1], PKT_BUFF_SIZE, flags=SPLICE_FLAGS)
+            except BlockingIOError:
+                wait_socket(self.conn_receiver, select.POLLIN)
+            except OSError as e:
+                if e.errno != errno.EINVAL:
+                    raise
+                logger.debug(f'splice not supported, falling back to buffered relay: {e}')
+                self.use_buffer()
+                return self.conn_receiver.recv_into(self.view)
+
+    def send(self, data_len):
+        if self.pipe is None:
+            self.conn_sender.sendall(self.view[:data_len])
+            return
+        while data_len:
+            try:
+                data_len -= os.splice(self.pipe[0], self.conn_sender.fileno(), data_len, flags=SPLICE_FLAGS)
+            except BlockingIOError:
+                wait_socket(self.conn_sender, select.POLLOUT)
+
+    def close(self):
+        if self.pipe is not None:
+            for fd in self.pipe:
+                os.close(fd)
+            self.pipe = None
+
+
+def native_relay(conn_receiver, conn_sender, stats, add_stats):
+    # The compiled loop runs without the GIL and only calls back about once per megabyte
+    def account(count):
+        add_stats(count)
+        if time.monotonic() - stats.last_report >= STATS_REPORT_INTERVAL:
+            stats.report()
+    
+    return relay_core.relay_loop(conn_receiver.fileno(), conn_sender.fileno(), account,
+                                 conn_receiver.gettimeout(), conn_sender.gettimeout(), PKT_BUFF_SIZE)
 
 
 class TransferStats:
+    # bytes_sent is only written by the forward worker and bytes_recv only by the
+    # reverse one, so the counters need no lock; report() diffs them against the
+    # totals it saw last time instead of resetting them.
     def __init__(self, name):
         self.name = name
         self.bytes_sent = 0
         self.bytes_recv = 0
-        self.start_time = time.time()
-        self.last_report = time.time()
-        self.lock = threading.Lock()
+        self.reported_sent = 0
+        self.reported_recv = 0
+        self.start_time = time.monotonic()
+        self.last_report = self.start_time
 
     def add_sent(self, count):
-        with self.lock:
-            self.bytes_sent += count
+        self.bytes_sent += count
 
     def add_recv(self, count):
-        with self.lock:
-            self.bytes_recv += count
+        self.bytes_recv += count
 
     def report(self):
-        with self.lock:
-            current_time = time.time()
-            elapsed = current_time - self.last_report
-            total_elapsed = current_time - self.start_time
+        current_time = time.monotonic()
+        elapsed = current_time - self.last_report
+        total_elapsed = current_time - self.start_time
+        
+        if elapsed >= STATS_REPORT_INTERVAL:
+            bytes_sent = self.bytes_sent
+            bytes_recv = self.bytes_recv
+            sent_speed = ((bytes_sent - self.reported_sent) / 1024 / 1024) / elapsed
+            recv_speed = ((bytes_recv - self.reported_recv) / 1024 / 1024) / elapsed
+            total_sent = bytes_sent / 1024 / 1024
+            total_recv = bytes_recv / 1024 / 1024
             
-            if elapsed >= 5:
-                sent_speed = (self.bytes_sent / 1024 / 1024) / elapsed
-                recv_speed = (self.bytes_recv / 1024 / 1024) / elapsed
-                total_sent = self.bytes_sent / 1024 / 1024
-                total_recv = self.bytes_recv / 1024 / 1024
-                
-                logger.info(f'{self.name} - Sent: {total_sent:.2f} MB ({sent_speed:.2f} MB/s), '
-                          f'Recv: {total_recv:.2f} MB ({recv_speed:.2f} MB/s), '
-                          f'Time: {total_elapsed:.1f}s')
-                
-                self.bytes_sent = 0
-                self.bytes_recv = 0
-                self.last_report = current_time
+            logger.info(f'{self.name} - Sent: {total_sent:.2f} MB ({sent_speed:.2f} MB/s), '
+                      f'Recv: {total_recv:.2f} MB ({recv_speed:.2f} MB/s), '
+                      f'Time: {total_elapsed:.1f}s')
+            
+            self.reported_sent = bytes_sent
+            self.reported_recv = bytes_recv
+            self.last_report = current_time
 
 
 def tcp_mapping_worker(conn_receiver, conn_sender, stats, direction):
-    optimize_socket(conn_receiver)
-    optimize_socket(conn_sender)
-    
     try:
         peer_recv = conn_receiver.getpeername()
         peer_send = conn_sender.getpeername()
@@ -111,29 +251,37 @@ def tcp_mapping_worker(conn_receiver, conn_sender, stats, direction):
     except Exception as e:
         logger.debug(f'Could not get peer names: {e}')
     
-    last_activity = time.time()
+    last_activity = time.monotonic()
     total_bytes = 0
     
+    relay = None if relay_core else Relay(conn_receiver, conn_sender)
+    add_stats = stats.add_sent if direction == 'forward' else stats.add_recv
+    
     try:
         while True:
             try:
-                data = conn_receiver.recv(PKT_BUFF_SIZE)
-                if not data:
+                if relay is None:
+                    total_bytes = native_relay(conn_receiver, conn_sender, stats, add_stats)
+                    last_activity = time.monotonic()
+                    logger.debug(f'{direction}: Connection closed by receiver')
+                    break
+                
+                data_len = relay.recv()
+                if not data_len:
                     logger.debug(f'{direction}: Connection closed by receiver')
                     break
                 
-                data_len = len(data)
                 total_bytes += data_len
                 
-                if direction == 'forward':
-                    stats.add_sent(data_len)
-                else:
-                    stats.add_recv(data_len)
+                add_stats(data_len)
                 
-                last_activity = time.time()
+                # The workers drive the periodic report themselves instead of a reporter thread
+                last_activity = time.monotonic()
+                if last_activity - stats.last_report >= STATS_REPORT_INTERVAL:
+                    stats.report()
                 
                 try:
-                    conn_sender.sendall(data)
+                    relay.send(data_len)
                 except Exception as e:
                     logger.error(f'{direction}: Failed sending data ({data_len} bytes): {type(e).__name__}: {e}')
                     break
@@ -152,13 +300,15 @@ def tcp_mapping_worker(conn_receiver, conn_sender, stats, direction):
                           f'{type(e).__name__}: {e}')
                 break
         
-        elapsed = time.time() - last_activity
+        elapsed = time.monotonic() - last_activity
         logger.info(f'{direction}: Stopped after transferring {total_bytes / 1024 / 1024:.2f} MB '
                    f'(idle for {elapsed:.1f}s)')
         
     except Exception as e:
         logger.error(f'{direction}: Fatal error: {type(e).__name__}: {e}')
     finally:
+        if relay is not None:
+            relay.close()
         try:
             conn_receiver.close()
         except Exception as e:
@@ -170,9 +320,8 @@ def tcp_mapping_worker(conn_receiver, conn_sender, stats, direction):
 
 
 def join(connA, connB):
-    optimize_socket(connA)
-    optimize_socket(connB)
-    
+    # Both sockets were optimized where they were created (or inherited the options
+    # from their listening socket), so the relay does not set them again
     try:
         peer_a = connA.getpeername()
         peer_b = connB.getpeername()
@@ -189,18 +338,34 @@ def join(connA, connB):
     t1.start()
     t2.start()
     
-    report_thread = threading.Thread(target=stats.report, daemon=True)
-    report_thread.start()
-    
     return t1, t2
 
 
+def ports_to_bits(ports):
+    # One bit per port (bit n of the int is port n), so scans can be diffed with bitwise ops
+    bits = bytearray(8192)
+    for port in ports:
+        bits[port >> 3] |= 1 << (port & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def bits_to_ports(bits):
+    ports = []
+    while bits:
+        lowest = bits & -bits
+        ports.append(lowest.bit_length() - 1)
+        bits ^= lowest
+    return ports
+
+
 class PortScanner:
-    def __init__(self, scan_interval=300, custom_ports=None, max_workers=50):
+    def __init__(self, scan_interval=300, custom_ports=None, max_workers=256, syn_scan=False):
         self.scan_interval = scan_interval
         self.custom_ports = custom_ports or []
         self.max_workers = max_workers
+        self.syn_scan = syn_scan
         self.active_ports = set()
+        self.active_bits = 0
         self.running = False
         self.lock = threading.Lock()
         self.on_port_change = None
@@ -211,11 +376,7 @@ class PortScanner:
 
     def check_port(self, host, port, timeout=0.3):
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(timeout)
-            result = sock.connect_ex((host, port))
-            sock.close()
-            return result == 0
+            return port in probe_batch(socket.gethostbyname(host), [port], timeout)
         except Exception:
             return False
 
@@ -226,28 +387,107 @@ class PortScanner:
             else:
                 ports = list(range(1, 65536))
         
-        logger.debug(f'Scanning {len(ports)} ports with {self.max_workers} workers...')
+        try:
+            addr = socket.gethostbyname(host)
+        except OSError as e:
+            logger.error(f'Failed to resolve {host}: {e}')
+            return []
         
-        active_ports = set()
+        if self.syn_scan:
+            try:
+                return self.scan_ports_syn(addr, ports, 0.3)
+            except OSError as e:
+                logger.warning(f'SYN scan unavailable (needs root / CAP_NET_RAW), '
+                               f'falling back to connect scan: {type(e).__name__}: {e}')
+                self.syn_scan = False
         
-        from concurrent.futures import ThreadPoolExecutor, as_completed
+        # max_workers connects are in flight at once on one thread: each batch is issued
+        # non-blocking and shares a single deadline instead of a per-socket timeout
+        batch_size = max(1, min(self.max_workers, MAX_PROBE_BATCH))
+        logger.debug(f'Scanning {len(ports)} ports, {batch_size} probes at a time...')
         
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_port = {
-                executor.submit(self.check_port, host, port, 0.3): port 
-                for port in ports
-            }
-            
-            for future in as_completed(future_to_port):
-                port = future_to_port[future]
-                try:
-                    if future.result():
-                        active_ports.add(port)
-                except Exception as e:
-                    logger.debug(f'Error scanning port {port}: {e}')
+        active_ports = set()
+        for i in range(0, len(ports), batch_size):
+            active_ports.update(probe_batch(addr, ports[i:i + batch_size], 0.3))
         
         return sorted(active_ports)
 
+    def scan_ports_syn(self, addr, ports, timeout):
+        # Sends one SYN per port from a raw socket and counts a SYN-ACK as open; the
+        # handshake is never completed (the kernel answers the SYN-ACK with RST)
+        raw = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP)
+        try:
+            try:
+                raw.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+            except OSError:
+                pass
+            
+            route = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                route.connect((addr, 9))
+                src_ip = socket.inet_aton(route.getsockname()[0])
+            finally:
+                route.close()
+            dst_ip = socket.inet_aton(addr)
+            
+            sport = 40000 + int.from_bytes(os.urandom(2), 'big') % 20000
+            seq = int.from_bytes(os.urandom(4), 'big')
+            expected_ack = (seq + 1) & 0xFFFFFFFF
+            
+            # Only the destination port differs between probes, so the checksum is the
+            # one's-complement sum of everything else (pseudo header included) plus dport
+            base_sum = (sum(struct.unpack('!4H', src_ip + dst_ip)) + socket.IPPROTO_TCP + TCP_SYN_HEADER.size
+                        + sport + (seq >> 16) + (seq & 0xFFFF) + (0x50 << 8 | TCP_FLAG_SYN) + SYN_WINDOW)
+            
+            open_bits = bytearray(8192)
+            done = threading.Event()
+            
+            def collect():
+                raw.settimeout(0.05)
+                while not done.is_set():
+                    try:
+                        packet = raw.recv(65535)
+                    except socket.timeout:
+                        continue
+                    except OSError:
+                        return
+                    if packet[12:16] != dst_ip:
+                        continue
+                    ihl = (packet[0] & 0x0F) * 4
+                    if len(packet) < ihl + TCP_REPLY_HEADER.size:
+                        continue
+                    port, dport, _, ack, _, flags = TCP_REPLY_HEADER.unpack_from(packet, ihl)
+                    if dport == sport and ack == expected_ack and flags & TCP_FLAG_SYN_ACK == TCP_FLAG_SYN_ACK:
+                        open_bits[port >> 3] |= 1 << (port & 7)
+            
+            collector = threading.Thread(target=collect, daemon=True)
+            collector.start()
+            
+            logger.debug(f'SYN scanning {len(ports)} ports...')
+            pack = TCP_SYN_HEADER.pack
+            target = (addr, 0)
+            for port in ports:
+                total = base_sum + port
+                total = (total & 0xFFFF) + (total >> 16)
+                total = (total & 0xFFFF) + (total >> 16)
+                packet = pack(sport, port, seq, 0, 0x50, TCP_FLAG_SYN, SYN_WINDOW, ~total & 0xFFFF, 0)
+                while True:
+                    try:
+                        raw.sendto(packet, target)
+                        break
+                    except OSError as e:
+                        if e.errno != errno.ENOBUFS:
+                            raise
+                        time.sleep(0.001)
+            
+            time.sleep(timeout)
+            done.set()
+            collector.join()
+        finally:
+            raw.close()
+        
+        return sorted(port for port in ports if open_bits[port >> 3] >> (port & 7) & 1)
+
     def scan_incremental(self, host='127.0.0.1'):
         logger.info('Starting incremental port scan...')
         
@@ -261,11 +501,12 @@ class PortScanner:
         
         logger.debug(f'Scanning ports {ports_to_scan[0]}-{ports_to_scan[-1]}')
         
-        current_active = set(self.scan_ports_fast(host, ports_to_scan))
+        current_active = self.scan_ports_fast(host, ports_to_scan)
+        current_bits = ports_to_bits(current_active)
         
         with self.lock:
-            new_ports = current_active - self.active_ports
-            closed_ports = self.active_ports - current_active
+            new_ports = bits_to_ports(current_bits & ~self.active_bits)
+            closed_ports = bits_to_ports(self.active_bits & ~current_bits)
             
             for port in new_ports:
                 logger.info(f'New service detected on port {port}')
@@ -277,15 +518,16 @@ class PortScanner:
                 if self.on_port_change:
                     self.on_port_change('closed', port)
             
-            self.active_ports = current_active
+            self.active_ports = set(current_active)
+            self.active_bits = current_bits
             self.scanned_ports.update(current_active)
             self.scan_cursor = end_port
         
-        logger.info(f'Incremental scan complete. Active ports: {sorted(current_active)}')
+        logger.info(f'Incremental scan complete. Active ports: {current_active}')
         return {
-            'active_ports': sorted(current_active),
-            'new_ports': sorted(new_ports),
-            'closed_ports': sorted(closed_ports),
+            'active_ports': current_active,
+            'new_ports': new_ports,
+            'closed_ports': closed_ports,
             'scanned_range': (start_port, end_port),
             'timestamp': time.time()
         }
@@ -295,11 +537,12 @@ class PortScanner:
             self.scan_incremental(host)
         else:
             logger.info('Starting full port scan...')
-            current_active = set(self.scan_ports_fast(host))
+            current_active = self.scan_ports_fast(host)
+            current_bits = ports_to_bits(current_active)
             
             with self.lock:
-                new_ports = current_active - self.active_ports
-                closed_ports = self.active_ports - current_active
+                new_ports = bits_to_ports(current_bits & ~self.active_bits)
+                closed_ports = bits_to_ports(self.active_bits & ~current_bits)
                 
                 for port in new_ports:
                     logger.info(f'New service detected on port {port}')
@@ -311,13 +554,14 @@ class PortScanner:
                     if self.on_port_change:
                         self.on_port_change('closed', port)
                 
-                self.active_ports = current_active
+                self.active_ports = set(current_active)
+                self.active_bits = current_bits
             
-            logger.info(f'Scan complete. Active ports: {sorted(current_active)}')
+            logger.info(f'Scan complete. Active ports: {current_active}')
             return {
-                'active_ports': sorted(current_active),
-                'new_ports': sorted(new_ports),
-                'closed_ports': sorted(closed_ports),
+                'active_ports': current_active,
+                'new_ports': new_ports,
+                'closed_ports': closed_ports,
                 'timestamp': time.time()
             }
 
@@ -349,7 +593,8 @@ class PortScanner:
 
 class Frpc:
     def __init__(self, server_host, server_port, target_host='127.0.0.1', 
-                 scan_interval=300, pool_size=5, ports=None, max_workers=50, lazy=False):
+                 scan_interval=300, pool_size=5, ports=None, max_workers=256, lazy=False,
+                 tcp_buf_size=None, syn_scan=False):
         self.server_host = server_host
         self.server_port = server_port
         self.data_port = server_port + 1
@@ -359,24 +604,48 @@ class Frpc:
         self.monitored_ports = ports
         self.max_workers = max_workers
         self.lazy = lazy
+        self.tcp_buf_size = tcp_buf_size
         
         self.control_fd = None
+        self.control_buf = bytearray()
         self.running = True
         self.auto_reconnect = True
-        self.registered_ports = set()
-        self.lock = threading.Lock()
+        # Copy-on-write: only the scanner thread (via on_port_change) rebinds this,
+        # so readers such as the reconnect path iterate a snapshot without a lock
+        self.registered_ports = frozenset()
+        # Outgoing register/unregister frames; the selector loop in run() is the only
+        # writer of the control socket and flushes them together with the heartbeat.
+        # Other threads poke the wakeup socket pair so queued frames go out right away.
+        self.control_queue = collections.deque()
+        self.next_heartbeat = time.monotonic()
+        self.wakeup_recv, self.wakeup_send = socket.socketpair()
+        self.wakeup_recv.setblocking(False)
+        self.wakeup_send.setblocking(False)
+        sel.register(self.wakeup_recv, selectors.EVENT_READ, self.handle_wakeup)
+        # One dict lookup per control frame instead of an if/elif chain over the commands
+        self.command_handlers = {
+            CMD_HEARTBEAT: self.handle_heartbeat,
+            CMD_REGISTER_PORT: self.handle_register_ack,
+            CMD_UNREGISTER_PORT: self.handle_unregister_ack,
+            CMD_CONNECTION: self.handle_connection_request,
+        }
+        # Idle data connections dialled ahead of time, so a new tunnel skips the handshake
+        self.data_pool = queue.SimpleQueue()
+        self.pool_wakeup = threading.Event()
         
         self.scanner = PortScanner(
             scan_interval=scan_interval,
             custom_ports=ports,
-            max_workers=max_workers
+            max_workers=max_workers,
+            syn_scan=syn_scan
         )
         self.scanner.is_lazy = lazy
         self.scanner.on_port_change = self.on_port_change
         
         self.connect_to_server()
-        threading.Thread(target=self.heartbeat, daemon=True).start()
         threading.Thread(target=self.port_monitor, daemon=True).start()
+        if self.pool_size > 0:
+            threading.Thread(target=self.maintain_data_pool, daemon=True).start()
 
     def connect_to_server(self):
         retry_count = 0
@@ -388,10 +657,11 @@ class Frpc:
                 self.control_fd = socket.create_connection(
                     (self.server_host, self.server_port), timeout=5
                 )
-                optimize_socket(self.control_fd)
+                optimize_socket(self.control_fd, self.tcp_buf_size)
                 
-                self.control_fd.sendall(struct.pack('!i', CMD_HEARTBEAT))
+                self.control_fd.sendall(HEARTBEAT_FRAME)
                 self.control_fd.setblocking(False)
+                self.control_buf.clear()
                 
                 try:
                     sel.unregister(self.control_fd)
@@ -403,9 +673,10 @@ class Frpc:
                 
                 time.sleep(0.5)
                 
-                with self.lock:
-                    for port in list(self.registered_ports):
-                        self.send_register_port(port)
+                # Frames queued for the old connection are superseded by the re-registration
+                self.control_queue.clear()
+                for port in self.registered_ports:
+                    self.send_register_port(port)
                 
                 return True
                 
@@ -418,102 +689,185 @@ class Frpc:
         logger.error('Failed to connect to server after maximum retries')
         return False
 
-    def heartbeat(self):
-        while self.running:
-            try:
-                if self.control_fd is not None:
-                    self.control_fd.sendall(struct.pack('!i', CMD_HEARTBEAT))
-            except Exception as e:
-                logger.error(f'Heartbeat failed: {type(e).__name__}: {e}')
-                if self.auto_reconnect:
-                    logger.info('Attempting to reconnect...')
-                    self.reconnect()
-            time.sleep(5)
+    def wake(self):
+        try:
+            self.wakeup_send.send(b'\0')
+        except OSError:
+            # Buffer full, so a wakeup is already pending
+            pass
 
-    def send_register_port(self, port):
+    def handle_wakeup(self, wakeup_recv, mask):
         try:
-            self.control_fd.sendall(struct.pack('!i', CMD_REGISTER_PORT) + struct.pack('!i', port))
-            logger.debug(f'Sent register port {port}')
-        except Exception as e:
-            logger.error(f'Failed to send register port {port}: {type(e).__name__}: {e}')
+            while wakeup_recv.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
 
-    def send_unregister_port(self, port):
+    def flush_control(self):
+        # Called by run() after every select; frps expires clients that stay silent
+        # for 30s, so the heartbeat is still sent every HEARTBEAT_INTERVAL seconds
+        now = time.monotonic()
+        queued = self.control_queue
+        frames = []
+        if now >= self.next_heartbeat:
+            frames.append(HEARTBEAT_FRAME)
+            self.next_heartbeat = now + HEARTBEAT_INTERVAL
+        if self.control_fd is None or not (frames or queued):
+            return
+        
         try:
-            self.control_fd.sendall(struct.pack('!i', CMD_UNREGISTER_PORT) + struct.pack('!i', port))
-            logger.debug(f'Sent unregister port {port}')
+            while True:
+                while queued and len(frames) < MAX_CONTROL_BATCH:
+                    frames.append(queued.popleft())
+                if not frames:
+                    break
+                self.send_control_frames(frames)
+                frames = []
         except Exception as e:
-            logger.error(f'Failed to send unregister port {port}: {type(e).__name__}: {e}')
+            logger.error(f'Heartbeat failed: {type(e).__name__}: {e}')
+            if self.auto_reconnect:
+                logger.info('Attempting to reconnect...')
+                self.reconnect()
+
+    def send_control_frames(self, frames):
+        control_fd = self.control_fd
+        sent = 0
+        if hasattr(control_fd, 'sendmsg'):
+            sent = control_fd.sendmsg(frames, (), CONTROL_SEND_FLAGS)
+        data = b''.join(frames)
+        if sent < len(data):
+            control_fd.sendall(data[sent:])
+
+    def send_register_port(self, port):
+        self.control_queue.append(CMD_PORT_STRUCT.pack(CMD_REGISTER_PORT, port))
+        self.wake()
+        logger.debug(f'Queued register port {port}')
+
+    def send_unregister_port(self, port):
+        self.control_queue.append(CMD_PORT_STRUCT.pack(CMD_UNREGISTER_PORT, port))
+        self.wake()
+        logger.debug(f'Queued unregister port {port}')
 
     def on_port_change(self, change_type, port):
         if change_type == 'new':
-            with self.lock:
-                if port not in self.registered_ports:
-                    self.registered_ports.add(port)
+            self.registered_ports = self.registered_ports | {port}
             self.send_register_port(port)
         elif change_type == 'closed':
-            with self.lock:
-                if port in self.registered_ports:
-                    self.registered_ports.discard(port)
+            self.registered_ports = self.registered_ports - {port}
             self.send_unregister_port(port)
 
     def port_monitor(self):
         self.scanner.start_continuous_scan(self.target_host)
 
     def handle_server_data(self, control_fd, mask):
+        # Drain everything the server has queued in one recv and dispatch every
+        # complete frame, instead of one recv per command word and port
         try:
-            data = control_fd.recv(4)
+            data = control_fd.recv(CONTROL_RECV_SIZE)
             if not data:
                 logger.info('Server connection closed')
                 if self.auto_reconnect:
                     self.reconnect()
                 return
             
-            cmd = struct.unpack('!i', data)[0]
-            logger.debug(f'Received command: {cmd}')
-            
-            if cmd == CMD_HEARTBEAT:
-                logger.debug('Heartbeat received')
-                
-            elif cmd == CMD_REGISTER_PORT:
-                port_data = control_fd.recv(4)
-                if port_data:
-                    port = struct.unpack('!i', port_data)[0]
-                    if port > 0:
-                        logger.info(f'Port {port} registered on server')
-                    else:
-                        logger.warning(f'Port registration failed')
-                
-            elif cmd == CMD_UNREGISTER_PORT:
-                port_data = control_fd.recv(4)
-                if port_data:
-                    port = struct.unpack('!i', port_data)[0]
-                    logger.info(f'Port {port} unregistered on server')
-                
-            elif cmd == CMD_CONNECTION:
-                port_data = control_fd.recv(4)
-                if port_data:
-                    port = struct.unpack('!i', port_data)[0]
-                    logger.info(f'Received connection request for port {port}')
-                    threading.Thread(target=self.handle_data_connection, args=(port,), daemon=True).start()
-                        
+            buf = self.control_buf
+            buf += data
+            offset = 0
+            while len(buf) - offset >= 4:
+                cmd = CMD_STRUCT.unpack_from(buf, offset)[0]
+                port = None
+                if cmd in CMDS_WITH_PORT:
+                    if len(buf) - offset < 8:
+                        break
+                    port = CMD_STRUCT.unpack_from(buf, offset + 4)[0]
+                    offset += 8
+                else:
+                    offset += 4
+                handler = self.command_handlers.get(cmd)
+                if handler is not None:
+                    handler(port)
+                else:
+                    logger.debug(f'Ignoring unknown command: {cmd}')
+            del buf[:offset]
+        
+        except BlockingIOError:
+            pass
         except Exception as e:
             logger.error(f'Error handling server data: {type(e).__name__}: {e}')
             if self.auto_reconnect:
                 self.reconnect()
 
+    def handle_heartbeat(self, port):
+        logger.debug('Heartbeat received')
+
+    def handle_register_ack(self, port):
+        if port > 0:
+            logger.info(f'Port {port} registered on server')
+        else:
+            logger.warning(f'Port registration failed')
+
+    def handle_unregister_ack(self, port):
+        logger.info(f'Port {port} unregistered on server')
+
+    def handle_connection_request(self, port):
+        logger.info(f'Received connection request for port {port}')
+        threading.Thread(target=self.handle_data_connection, args=(port,), daemon=True).start()
+
+    def dial_data_conn(self):
+        data_conn = socket.create_connection(
+            (self.server_host, self.data_port), timeout=5
+        )
+        optimize_socket(data_conn, self.tcp_buf_size)
+        return data_conn
+
+    def maintain_data_pool(self):
+        logger.info(f'Starting data connection pool with size: {self.pool_size}')
+        while self.running:
+            while self.running and self.data_pool.qsize() < self.pool_size:
+                try:
+                    self.data_pool.put(self.dial_data_conn())
+                except Exception as e:
+                    logger.debug(f'Failed to pre-dial data connection: {type(e).__name__}: {e}')
+                    break
+            
+            # Woken as soon as a pooled connection is taken; the timeout retries failed dials
+            self.pool_wakeup.wait(5)
+            self.pool_wakeup.clear()
+
+    def open_data_conn(self, port):
+        frame = CMD_PORT_STRUCT.pack(CMD_DATA_CONNECT, port)
+        while True:
+            try:
+                data_conn = self.data_pool.get_nowait()
+            except queue.Empty:
+                break
+            self.pool_wakeup.set()
+            
+            # sendall on a socket the server already closed usually still succeeds,
+            # so check for EOF/reset before handing the connection to a tunnel
+            if not conn_is_idle_open(data_conn):
+                logger.debug('Pooled data connection was closed by the server, discarding it')
+                data_conn.close()
+                continue
+            try:
+                data_conn.sendall(frame)
+                return data_conn
+            except OSError as e:
+                logger.debug(f'Pooled data connection is dead, dialling a new one: {e}')
+                data_conn.close()
+        
+        data_conn = self.dial_data_conn()
+        data_conn.sendall(frame)
+        return data_conn
+
     def handle_data_connection(self, port):
         try:
             target_conn = socket.create_connection(
                 (self.target_host, port), timeout=5
             )
-            optimize_socket(target_conn)
-            
-            data_conn = socket.create_connection(
-                (self.server_host, self.data_port), timeout=5
-            )
-            optimize_socket(data_conn)
+            optimize_socket(target_conn, self.tcp_buf_size)
             
-            data_conn.sendall(struct.pack('!i', CMD_DATA_CONNECT) + struct.pack('!i', port))
+            data_conn = self.open_data_conn(port)
             
             join(target_conn, data_conn)
             logger.info(f'Data connection established for port {port}')
@@ -530,12 +884,26 @@ class Frpc:
             pass
         
         self.control_fd = None
+        # Pooled data connections belong to the old server session; a restarted
+        # frps will not accept them, so start the pool over
+        self.drain_data_pool()
+        self.pool_wakeup.set()
         logger.info('Reconnecting to server...')
         self.connect_to_server()
 
+    def drain_data_pool(self):
+        while True:
+            try:
+                self.data_pool.get_nowait().close()
+            except queue.Empty:
+                break
+
     def stop(self):
         self.running = False
         self.scanner.stop()
+        self.pool_wakeup.set()
+        self.wake()
+        self.drain_data_pool()
         if self.control_fd:
             try:
                 sel.unregister(self.control_fd)
@@ -548,13 +916,14 @@ class Frpc:
         try:
             while self.running:
                 try:
-                    events = sel.select(timeout=1.0)
+                    events = sel.select(timeout=max(0, self.next_heartbeat - time.monotonic()))
                     for key, mask in events:
                         callback = key.data
                         try:
                             callback(key.fileobj, mask)
                         except Exception as e:
                             logger.error(f'Error in callback: {type(e).__name__}: {e}')
+                    self.flush_control()
                 except Exception as e:
                     logger.error(f'Error in select loop: {type(e).__name__}: {e}')
         except KeyboardInterrupt:
@@ -576,10 +945,13 @@ def main():
         print('Options:')
         print('  --target HOST        Target host to scan (default: 127.0.0.1)')
         print('  --interval SECONDS    Scan interval in seconds (default: 300)')
-        print('  --pool-size NUM       Connection pool size (not used in v2)')
+        print('  --pool-size NUM       Pre-dialled idle data connections (default: 5, 0 disables)')
         print('  --ports PORTS        Comma-separated ports to monitor (default: all ports)')
-        print('  --workers NUM        Port scan workers (default: 50)')
+        print('  --workers NUM        Concurrent port probes (default: 256, max: 500)')
         print('  --lazy               Use incremental scanning mode (default: False)')
+        print('  --syn-scan           SYN-only scan over a raw socket (needs root; falls back otherwise)')
+        print('  --tcp-buf BYTES      Fixed SO_SNDBUF/SO_RCVBUF size (default: kernel autotuning;')
+        print('                       values above net.core.wmem_max/rmem_max are capped)')
         print('')
         print('Note: Data connections will use server_port + 1')
         print('')
@@ -595,7 +967,7 @@ def main():
         print('  - Auto port registration: Server listens on same ports as client')
         print('  - Dynamic port mapping: No manual configuration needed')
         print('  - Separated control and data channels for better reliability')
-        print('  - Low latency TCP optimization (1MB buffer, TCP_NODELAY)')
+        print('  - Low latency TCP optimization (TCP_NODELAY, kernel-autotuned buffers)')
         print('  - Lazy scanning mode: Incremental scanning to reduce CPU usage')
         print('  - Detailed logging and performance monitoring')
         print('  - Auto reconnect on connection failure')
@@ -608,8 +980,10 @@ def main():
     scan_interval = 300
     pool_size = 5
     ports = None
-    max_workers = 50
+    max_workers = 256
     lazy = False
+    tcp_buf_size = None
+    syn_scan = False
     
     i = 3
     while i < len(sys.argv):
@@ -633,6 +1007,12 @@ def main():
         elif arg == '--lazy':
             lazy = True
             i += 1
+        elif arg == '--syn-scan':
+            syn_scan = True
+            i += 1
+        elif arg == '--tcp-buf' and i + 1 < len(sys.argv):
+            tcp_buf_size = int(sys.argv[i + 1])
+            i += 2
         else:
             print(f'Unknown option: {arg}')
             sys.exit(1)
@@ -645,17 +1025,20 @@ def main():
         pool_size=pool_size,
         ports=ports,
         max_workers=max_workers,
-        lazy=lazy
+        lazy=lazy,
+        tcp_buf_size=tcp_buf_size,
+        syn_scan=syn_scan
     )
     
     print(f'FRPC Client v2.4')
     print(f'Server: {server_host}:{server_port} (control), {server_host}:{server_port + 1} (data)')
     print(f'Target: {target_host}')
     print(f'Scan interval: {scan_interval}s')
-    print(f'Scan workers: {max_workers}')
-    print(f'Scan mode: {"Lazy (incremental)" if lazy else "Full scan"}')
+    print(f'Concurrent probes: {max_workers}')
+    print(f'Scan mode: {"Lazy (incremental)" if lazy else "Full scan"}{" (SYN)" if syn_scan else ""}')
     print(f'Performance monitoring enabled')
     print(f'Ultra high performance mode (4MB buffer)')
+    print(f'TCP buffers: {tcp_buf_size if tcp_buf_size else "kernel autotuning"}')
     if ports:
         print(f'Monitored ports: {ports}')
     else:
@@ -5,12 +5,14 @@ import time
 import threading
 import struct
 import selectors
+import heapq
 import logging
 from collections import deque
 
 import lib.ConnTool as ConnTool
 
-sel = selectors.DefaultSelector()
+# epoll where available (Linux); other platforms keep the default selector
+sel = getattr(selectors, 'EpollSelector', selectors.DefaultSelector)()
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -18,39 +20,66 @@ logging.basicConfig(
 logger = logging.getLogger('frps')
 
 
+# (level, option, value) applied to every connection; options the platform
+# lacks are dropped here so optimize_socket needs no per-option checks.
+SOCK_OPTS = tuple(
+    (level, getattr(socket, name), value)
+    for level, name, value in (
+        (socket.IPPROTO_TCP, 'TCP_NODELAY', 1),
+        (socket.SOL_SOCKET, 'SO_KEEPALIVE', 1),
+        (socket.SOL_SOCKET, 'SO_REUSEADDR', 1),
+        (socket.IPPROTO_TCP, 'TCP_KEEPIDLE', 30),
+        (socket.IPPROTO_TCP, 'TCP_KEEPINTVL', 10),
+        (socket.IPPROTO_TCP, 'TCP_KEEPCNT', 3),
+        # Report writable once unsent data drops under 128 KiB, so relays
+        # wake sooner without pinning SO_SNDBUF and losing autotuning
+        (socket.IPPROTO_TCP, 'TCP_NOTSENT_LOWAT', 128 * 1024),
+    )
+    if hasattr(socket, name)
+)
+
+# Seconds without a heartbeat before an frpc is dropped. Heartbeat times are
+# integer time.monotonic_ns() readings, compared against the _NS value.
+HEARTBEAT_TIMEOUT = 30
+HEARTBEAT_TIMEOUT_NS = HEARTBEAT_TIMEOUT * 1_000_000_000
+
+# Sent to frpc for every queued user connection; packed once at import.
+CONNECTION_FRAME = struct.pack('!i', 2)
+
+
 def optimize_socket(sock):
-    try:
-        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-    except Exception:
-        pass
-    try:
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
-    except Exception:
-        pass
-    try:
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    except Exception:
-        pass
-    try:
-        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30)
-        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10)
-        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
-    except Exception:
-        pass
+    setsockopt = sock.setsockopt
+    for level, option, value in SOCK_OPTS:
+        try:
+            setsockopt(level, option, value)
+        except OSError:
+            pass
 
 
 class ProxyManager:
     def __init__(self):
         self.active_frps = {}
+        # Registration order of active_frps keys plus a cursor into it, so
+        # next_proxy() can round-robin without copying the dict keys.
+        self.proxy_names = []
+        self.rr_index = 0
+        # (deadline, proxy_name) pushed on every heartbeat; superseded entries
+        # are skipped when popped, so expiry only looks at entries that are due.
+        self.deadlines = []
         self.lock = threading.Lock()
 
     def register_frpc(self, proxy_name, frpc_conn):
         with self.lock:
+            if proxy_name not in self.active_frps:
+                self.proxy_names.append(proxy_name)
+            now = time.monotonic_ns()
             self.active_frps[proxy_name] = {
                 'frpc_conn': frpc_conn,
+                # Touched without self.lock: deque.append/popleft are atomic
                 'user_queue': deque(),
-                'last_heartbeat': time.time()
+                'last_heartbeat': now
             }
+            heapq.heappush(self.deadlines, (now + HEARTBEAT_TIMEOUT_NS, proxy_name))
             logger.info(f'Registered frpc for proxy: {proxy_name}')
 
     def unregister_frpc(self, proxy_name):
@@ -61,26 +90,41 @@ class ProxyManager:
                 except Exception:
                     pass
                 del self.active_frps[proxy_name]
+                self.proxy_names.remove(proxy_name)
                 logger.info(f'Unregistered frpc for proxy: {proxy_name}')
 
-    def add_user_conn(self, proxy_name, user_conn):
+    def next_proxy(self):
         with self.lock:
-            if proxy_name in self.active_frps:
-                self.active_frps[proxy_name]['user_queue'].append(user_conn)
-                return True
+            if not self.proxy_names:
+                return None
+            index = self.rr_index % len(self.proxy_names)
+            self.rr_index = index + 1
+            return self.proxy_names[index]
+
+    def add_user_conn(self, proxy_name, user_conn):
+        # A single dict.get plus deque.append is atomic under the GIL, so the
+        # per-connection queue operations skip self.lock
+        info = self.active_frps.get(proxy_name)
+        if info is None:
             return False
+        info['user_queue'].append(user_conn)
+        return True
 
     def get_user_conn(self, proxy_name):
-        with self.lock:
-            if proxy_name in self.active_frps:
-                if self.active_frps[proxy_name]['user_queue']:
-                    return self.active_frps[proxy_name]['user_queue'].popleft()
+        info = self.active_frps.get(proxy_name)
+        if info is None:
+            return None
+        try:
+            return info['user_queue'].popleft()
+        except IndexError:
             return None
 
     def update_heartbeat(self, proxy_name):
         with self.lock:
             if proxy_name in self.active_frps:
-                self.active_frps[proxy_name]['last_heartbeat'] = time.time()
+                now = time.monotonic_ns()
+                self.active_frps[proxy_name]['last_heartbeat'] = now
+                heapq.heappush(self.deadlines, (now + HEARTBEAT_TIMEOUT_NS, proxy_name))
 
     def get_frpc_conn(self, proxy_name):
         with self.lock:
@@ -91,9 +135,21 @@ class ProxyManager:
     def is_alive(self, proxy_name):
         with self.lock:
             if proxy_name in self.active_frps:
-                return time.time() - self.active_frps[proxy_name]['last_heartbeat'] < 30
+                return time.monotonic_ns() - self.active_frps[proxy_name]['last_heartbeat'] < HEARTBEAT_TIMEOUT_NS
             return False
 
+    def pop_expired(self):
+        now = time.monotonic_ns()
+        expired = []
+        with self.lock:
+            while self.deadlines and self.deadlines[0][0] <= now:
+                _, proxy_name = heapq.heappop(self.deadlines)
+                info = self.active_frps.get(proxy_name)
+                if (info and now - info['last_heartbeat'] >= HEARTBEAT_TIMEOUT_NS
+                        and proxy_name not in expired):
+                    expired.append(proxy_name)
+        return expired
+
 
 proxy_manager = ProxyManager()
 
@@ -123,51 +179,64 @@ class Frps(threading.Thread):
     def check_timeouts(self):
         while True:
             time.sleep(10)
-            current_time = time.time()
-            with proxy_manager.lock:
-                dead_proxies = [
-                    name for name, info in proxy_manager.active_frps.items()
-                    if current_time - info['last_heartbeat'] > 30
-                ]
-                for name in dead_proxies:
-                    logger.warning(f'Proxy {name} timed out, unregistering')
-                    proxy_manager.unregister_frpc(name)
+            # Unregister outside proxy_manager.lock: unregister_frpc takes it too.
+            for name in proxy_manager.pop_expired():
+                logger.warning(f'Proxy {name} timed out, unregistering')
+                proxy_manager.unregister_frpc(name)
 
     def accept_user_connection(self, sock, mask):
-        try:
-            user_conn, addr = sock.accept()
-            optimize_socket(user_conn)
-            user_conn.setblocking(True)
+        # Drain the whole backlog per wakeup so a burst of connects costs one
+        # selector round instead of one per connection
+        while True:
+            try:
+                user_conn, addr = sock.accept()
+            except BlockingIOError:
+                return
+            except Exception as e:
+                logger.error(f'Error accepting user connection: {e}')
+                return
             
-            if proxy_manager.active_frps:
-                proxy_name = list(proxy_manager.active_frps.keys())[0]
-                if proxy_manager.add_user_conn(proxy_name, user_conn):
-                    logger.info(f'Received user connection from {addr}, queued for {proxy_name}')
-                    
-                    frpc_conn = proxy_manager.get_frpc_conn(proxy_name)
-                    if frpc_conn:
-                        try:
-                            frpc_conn.sendall(struct.pack('i', 2))
-                        except Exception as e:
-                            logger.error(f'Failed to send command to frpc: {e}')
+            try:
+                optimize_socket(user_conn)
+                user_conn.setblocking(True)
+                
+                proxy_name = proxy_manager.next_proxy()
+                if proxy_name is not None:
+                    if proxy_manager.add_user_conn(proxy_name, user_conn):
+                        logger.info(f'Received user connection from {addr}, queued for {proxy_name}')
+                        
+                        frpc_conn = proxy_manager.get_frpc_conn(proxy_name)
+                        if frpc_conn:
+                            try:
+                                frpc_conn.sendall(CONNECTION_FRAME)
+                            except Exception as e:
+                                logger.error(f'Failed to send command to frpc: {e}')
+                    else:
+                        logger.warning('No active frpc, closing user connection')
+                        user_conn.close()
                 else:
                     logger.warning('No active frpc, closing user connection')
                     user_conn.close()
-            else:
-                logger.warning('No active frpc, closing user connection')
-                user_conn.close()
-        except Exception as e:
-            logger.error(f'Error accepting user connection: {e}')
+            except Exception as e:
+                logger.error(f'Error accepting user connection: {e}')
 
     def accept_frpc_connection(self, sock, mask):
-        try:
-            frpc_conn, addr = sock.accept()
-            optimize_socket(frpc_conn)
-            frpc_conn.setblocking(False)
-            sel.register(frpc_conn, selectors.EVENT_READ, self.handle_frpc_data)
-            logger.info(f'Accepted frpc connection from {addr}')
-        except Exception as e:
-            logger.error(f'Error accepting frpc connection: {e}')
+        while True:
+            try:
+                frpc_conn, addr = sock.accept()
+            except BlockingIOError:
+                return
+            except Exception as e:
+                logger.error(f'Error accepting frpc connection: {e}')
+                return
+            
+            try:
+                optimize_socket(frpc_conn)
+                frpc_conn.setblocking(False)
+                sel.register(frpc_conn, selectors.EVENT_READ, self.handle_frpc_data)
+                logger.info(f'Accepted frpc connection from {addr}')
+            except Exception as e:
+                logger.error(f'Error accepting frpc connection: {e}')
 
     def handle_frpc_data(self, frpc_conn, mask):
         try:
@@ -179,7 +248,7 @@ class Frps(threading.Thread):
                 proxy_manager.unregister_frpc('default')
                 return
             
-            cmd = struct.unpack('i', data)[0]
+            cmd = struct.unpack('!i', data)[0]
             logger.debug(f'Received command: {cmd}')
             
             if cmd == 1:
@@ -192,7 +261,7 @@ class Frps(threading.Thread):
                 user_conn = proxy_manager.get_user_conn('default')
                 if user_conn:
                     logger.info('Connecting user and frpc')
-                    ConnTool.join(user_conn, frpc_conn)
+                    ConnTool.splice_join(user_conn, frpc_conn)
                 else:
                     logger.warning('No user connection available')
                     frpc_conn.close()
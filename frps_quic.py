@@ -2,12 +2,11 @@
 import sys
 import socket
 import time
-import threading
 import struct
 import logging
 import asyncio
 from pathlib import Path
-from typing import Dict, Optional, Set, Any, List, Tuple
+from typing import Dict, Optional, Any, List, Tuple
 from aioquic.quic.connection import QuicConnection, QuicErrorCode
 from aioquic.quic.events import QuicEvent, StreamDataReceived, ConnectionTerminated, HandshakeCompleted
 from aioquic.quic.configuration import QuicConfiguration
@@ -38,6 +37,57 @@ CMD_UNREGISTER_PORT = 3
 CMD_CONNECTION = 4
 CMD_CONNECTION_ACK = 5
 
+# 数据流帧头：负载长度 + conn_id
+DATA_HEADER = struct.Struct('!ii')
+# 控制帧：不变的心跳帧预先打包，带端口的应答和新连接通知用预编译的Struct一次打包
+HEARTBEAT_FRAME = struct.pack('!i', CMD_HEARTBEAT)
+CMD_PORT_STRUCT = struct.Struct('!ii')
+CONNECTION_STRUCT = struct.Struct('!iiii')
+
+# 日志节流间隔，按time.monotonic_ns()的整数纳秒比较
+LOG_INTERVAL_NS = 1_000_000_000
+WARNING_INTERVAL_NS = 5_000_000_000
+# 上行转发每累计这么多字节输出一次调试日志
+LOG_EVERY_BYTES = 10 * 1024 * 1024
+# 上行数据积攒到这么多字节才调用一次transmit()，用户连接暂时读空时也会立即发出
+FLUSH_BYTES = 256 * 1024
+# 单个用户连接暂存的待发数据上限：QUIC流数据不论用户是否读走都会被收下，
+# 用户读得太慢时超过这个量就关闭该连接，避免整条下行数据堆在内存里
+USER_SEND_HIGH_WATER = 4 * 1024 * 1024
+
+# 用户/目标TCP连接的socket选项，平台不支持的选项在这里直接过滤掉。
+# 不固定SO_SNDBUF/SO_RCVBUF（固定后Linux不再自动调整窗口），改用TCP_NOTSENT_LOWAT
+# 限制内核里未发送的数据量，写端更早被唤醒
+SOCK_OPTS = tuple(
+    (level, getattr(socket, name), value)
+    for level, name, value in (
+        (socket.IPPROTO_TCP, 'TCP_NODELAY', 1),
+        (socket.IPPROTO_TCP, 'TCP_NOTSENT_LOWAT', 128 * 1024),
+    )
+    if hasattr(socket, name)
+)
+
+
+def optimize_socket(sock: socket.socket) -> None:
+    for level, option, value in SOCK_OPTS:
+        try:
+            sock.setsockopt(level, option, value)
+        except OSError:
+            pass
+
+
+# QUIC的UDP socket收发缓冲区。UDP不像TCP会自动调整缓冲区，Linux默认约208KB，
+# 高带宽时延积下接收缓冲先被打满而丢包；实际生效值受net.core.rmem_max/wmem_max限制
+UDP_BUFFER_SIZE = 12 * 1024 * 1024
+
+
+def tune_udp_socket(sock) -> None:
+    for option in (socket.SO_RCVBUF, socket.SO_SNDBUF):
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, option, UDP_BUFFER_SIZE)
+        except OSError as e:
+            logger.debug(f'Failed to set UDP buffer size: {e}')
+
 
 class FrpQuicProtocol(QuicConnectionProtocol):
     def __init__(self, *args, **kwargs):
@@ -45,12 +95,17 @@ class FrpQuicProtocol(QuicConnectionProtocol):
         self.frpc_connections: Dict[int, 'FrpcConnection'] = {}
         self.port_listeners: Dict[int, 'PortListener'] = {}
         self.active_connections: Dict[int, 'ActiveConnection'] = {}
-        self.lock = threading.Lock()
-        self.stream_ready: Set[int] = set()
+        # 端口监听和用户连接的转发都以任务形式跑在这个事件循环上，不再为每个连接开线程；
+        # 下面这些字典只在事件循环线程里读写，因此不需要加锁
+        self.loop = asyncio.get_running_loop()
+        # 每个新数据流在发出CMD_CONNECTION前登记一个Event，收到ACK时置位
+        self.stream_ready_events: Dict[int, asyncio.Event] = {}
+        # 用户连接一次没发完的数据按流暂存，socket可写时由事件循环接着发，保证顺序
+        self.user_send_pending: Dict[int, bytearray] = {}
         self.next_stream_id = 1
         self.stream_to_user_conn: Dict[int, socket.socket] = {}
-        self.stream_buffers: Dict[int, bytes] = {}
-        self.warning_cache: Dict[int, float] = {}
+        self.stream_buffers: Dict[int, bytearray] = {}
+        self.warning_cache: Dict[int, int] = {}
         self.last_log_time = 0
 
     def quic_event_received(self, event: QuicEvent):
@@ -75,63 +130,118 @@ class FrpQuicProtocol(QuicConnectionProtocol):
                 elif cmd == CMD_CONNECTION_ACK:
                     if len(data) >= 8:
                         ack_stream_id = struct.unpack('!i', data[4:8])[0]
-                        with self.lock:
-                            self.stream_ready.add(ack_stream_id)
+                        ready = self.stream_ready_events.get(ack_stream_id)
+                        if ready is not None:
+                            ready.set()
                         logger.info(f'Received ACK for stream {ack_stream_id}')
         else:
             await self._handle_data_stream(stream_id, data)
 
     async def _handle_data_stream(self, stream_id: int, data: bytes):
-        current_time = time.time()
-        with self.lock:
-            if stream_id in self.stream_to_user_conn:
-                user_conn = self.stream_to_user_conn[stream_id]
-                
-                if stream_id not in self.stream_buffers:
-                    self.stream_buffers[stream_id] = b''
-                
-                self.stream_buffers[stream_id] += data
-                buffer = self.stream_buffers[stream_id]
-                
-                if current_time - self.last_log_time >= 1.0:
-                    logger.debug(f'Processing {len(data)} bytes on stream {stream_id}, buffer size: {len(buffer)}')
-                    self.last_log_time = current_time
-                
-                try:
-                    offset = 0
-                    while offset + 8 <= len(buffer):
-                        data_len = struct.unpack('!i', buffer[offset:offset+4])[0]
+        current_time = time.monotonic_ns()
+        if stream_id in self.stream_to_user_conn:
+            user_conn = self.stream_to_user_conn[stream_id]
+            
+            buffer = self.stream_buffers.get(stream_id)
+            if buffer is None:
+                buffer = self.stream_buffers[stream_id] = bytearray()
+            buffer += data
+            
+            if current_time - self.last_log_time >= LOG_INTERVAL_NS:
+                logger.debug(f'Processing {len(data)} bytes on stream {stream_id}, buffer size: {len(buffer)}')
+                self.last_log_time = current_time
+            
+            try:
+                # 帧头原地解析，负载以memoryview切片直接发送，不复制；
+                # 已处理的帧在循环结束后一次性从缓冲区删除
+                offset = 0
+                end = len(buffer)
+                with memoryview(buffer) as view:
+                    while end - offset >= 8:
+                        data_len, conn_id = DATA_HEADER.unpack_from(buffer, offset)
                         
-                        if offset + 8 + data_len > len(buffer):
+                        if offset + 8 + data_len > end:
                             break
                         
-                        conn_id = struct.unpack('!i', buffer[offset+4:offset+8])[0]
-                        payload = buffer[offset+8:offset+8+data_len]
-                        
-                        user_conn.sendall(payload)
+                        if not self._send_to_user(stream_id, user_conn, view[offset + 8:offset + 8 + data_len]):
+                            break
                         offset += 8 + data_len
-                    
-                    self.stream_buffers[stream_id] = buffer[offset:]
-                    
-                except Exception as e:
-                    logger.error(f'Error forwarding data to user: {e}')
-                    self.stream_buffers[stream_id] = b''
-            else:
-                if stream_id not in self.warning_cache or current_time - self.warning_cache[stream_id] >= 5.0:
-                    logger.warning(f'No user connection for stream {stream_id}')
-                    self.warning_cache[stream_id] = current_time
+                
+                del buffer[:offset]
+                
+            except Exception as e:
+                logger.error(f'Error forwarding data to user: {e}')
+                buffer.clear()
+        else:
+            if stream_id not in self.warning_cache or current_time - self.warning_cache[stream_id] >= WARNING_INTERVAL_NS:
+                logger.warning(f'No user connection for stream {stream_id}')
+                self.warning_cache[stream_id] = current_time
+
+    def _send_to_user(self, stream_id: int, user_conn: socket.socket, data) -> bool:
+        """发送一帧负载，返回False表示用户连接已关闭、该流不再转发。
+        data是接收缓冲区的memoryview切片，发送错误在这里处理，不让异常带着切片抛出"""
+        pending = self.user_send_pending.get(stream_id)
+        if pending is not None:
+            pending += data
+            if len(pending) > USER_SEND_HIGH_WATER:
+                logger.warning(f'User on stream {stream_id} is not draining data '
+                               f'({len(pending) // 1024}KB pending), closing connection')
+                self._close_user_stream(stream_id, user_conn)
+                return False
+            return True
+        
+        try:
+            sent = user_conn.send(data)
+        except BlockingIOError:
+            sent = 0
+        except OSError as e:
+            logger.error(f'Error forwarding data to user: {e}')
+            self._close_user_stream(stream_id, user_conn)
+            return False
+        if sent < len(data):
+            self.user_send_pending[stream_id] = bytearray(data[sent:])
+            self.loop.add_writer(user_conn, self._flush_user_send, stream_id, user_conn)
+        return True
+
+    def _flush_user_send(self, stream_id: int, user_conn: socket.socket) -> None:
+        pending = self.user_send_pending[stream_id]
+        try:
+            sent = user_conn.send(pending)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logger.error(f'Error forwarding data to user: {e}')
+            self._close_user_stream(stream_id, user_conn)
+            return
+        
+        del pending[:sent]
+        if not pending:
+            self._drop_user_send(stream_id, user_conn)
+
+    def _drop_user_send(self, stream_id: int, user_conn: socket.socket) -> None:
+        if self.user_send_pending.pop(stream_id, None) is not None:
+            self.loop.remove_writer(user_conn)
+    
+    def _close_user_stream(self, stream_id: int, user_conn: socket.socket) -> None:
+        # 停止向该用户连接转发并丢弃积压数据；socket仍由_forward_data任务在读到EOF后关闭
+        self.stream_to_user_conn.pop(stream_id, None)
+        self.stream_buffers.pop(stream_id, None)
+        self._drop_user_send(stream_id, user_conn)
+        try:
+            user_conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
 
     async def _handle_heartbeat(self, stream_id: int):
         try:
-            self._quic.send_stream_data(stream_id, struct.pack('!i', CMD_HEARTBEAT))
+            self._quic.send_stream_data(stream_id, HEARTBEAT_FRAME)
             await self._flush_buffers()
         except Exception as e:
             logger.error(f'Failed to send heartbeat: {e}')
     
     async def _flush_buffers(self):
         try:
-            with self.lock:
-                self.transmit()
+            self.transmit()
         except Exception as e:
             logger.debug(f'Error during transmit: {e}')
 
@@ -142,39 +252,35 @@ class FrpQuicProtocol(QuicConnectionProtocol):
             should_register = False
             already_registered = False
             
-            with self.lock:
-                if port not in self.port_listeners:
-                    should_register = True
-                else:
-                    already_registered = True
+            if port not in self.port_listeners:
+                should_register = True
+            else:
+                already_registered = True
             
             if should_register:
                 try:
                     listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
                     listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                    listener.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 2 * 1024 * 1024)
-                    listener.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2 * 1024 * 1024)
                     listener.bind(('0.0.0.0', port))
                     listener.listen(100)
                     
                     port_listener = PortListener(port, listener, self, stream_id)
                     
-                    with self.lock:
-                        self.port_listeners[port] = port_listener
+                    self.port_listeners[port] = port_listener
                     
-                    threading.Thread(target=port_listener.start_listening, daemon=True).start()
+                    port_listener.accept_task = asyncio.create_task(port_listener.start_listening())
                     
-                    self._quic.send_stream_data(stream_id, struct.pack('!i', CMD_REGISTER_PORT) + struct.pack('!i', port))
+                    self._quic.send_stream_data(stream_id, CMD_PORT_STRUCT.pack(CMD_REGISTER_PORT, port))
                     await self._flush_buffers()
                     
                     logger.info(f'Port {port} registered on stream {stream_id}')
                 except Exception as e:
                     logger.error(f'Failed to register port {port}: {e}')
-                    self._quic.send_stream_data(stream_id, struct.pack('!i', CMD_REGISTER_PORT) + struct.pack('!i', 0))
+                    self._quic.send_stream_data(stream_id, CMD_PORT_STRUCT.pack(CMD_REGISTER_PORT, 0))
                     await self._flush_buffers()
             elif already_registered:
                 logger.info(f'Port {port} already registered')
-                self._quic.send_stream_data(stream_id, struct.pack('!i', CMD_REGISTER_PORT) + struct.pack('!i', port))
+                self._quic.send_stream_data(stream_id, CMD_PORT_STRUCT.pack(CMD_REGISTER_PORT, port))
                 await self._flush_buffers()
 
     async def _handle_unregister_port(self, stream_id: int, data: bytes):
@@ -182,14 +288,13 @@ class FrpQuicProtocol(QuicConnectionProtocol):
             port = struct.unpack('!i', data[:4])[0]
             
             port_listener = None
-            with self.lock:
-                if port in self.port_listeners:
-                    port_listener = self.port_listeners[port]
-                    del self.port_listeners[port]
+            if port in self.port_listeners:
+                port_listener = self.port_listeners[port]
+                del self.port_listeners[port]
             
             if port_listener:
                 port_listener.stop()
-                self._quic.send_stream_data(stream_id, struct.pack('!i', CMD_UNREGISTER_PORT) + struct.pack('!i', port))
+                self._quic.send_stream_data(stream_id, CMD_PORT_STRUCT.pack(CMD_UNREGISTER_PORT, port))
                 await self._flush_buffers()
                 logger.info(f'Port {port} unregistered')
 
@@ -198,12 +303,11 @@ class FrpQuicProtocol(QuicConnectionProtocol):
             port = struct.unpack('!i', data[:4])[0]
             conn_id = struct.unpack('!i', data[4:8])[0] if len(data) >= 8 else 0
             
-            with self.lock:
-                if port in self.port_listeners:
-                    self.port_listeners[port].pending_connections.append((stream_id, conn_id))
-                    logger.info(f'Connection request for port {port}, stream {stream_id}, conn {conn_id}')
-                else:
-                    logger.warning(f'No listener for port {port}')
+            if port in self.port_listeners:
+                self.port_listeners[port].pending_connections.append((stream_id, conn_id))
+                logger.info(f'Connection request for port {port}, stream {stream_id}, conn {conn_id}')
+            else:
+                logger.warning(f'No listener for port {port}')
 
 
 class PortListener:
@@ -215,109 +319,138 @@ class PortListener:
         self.running = True
         self.pending_connections = []
         self.next_conn_id = 1
+        self.accept_task: Optional[asyncio.Task] = None
 
-    def start_listening(self):
+    async def start_listening(self):
         logger.info(f'Listening on port {self.port}')
-        self.listener.settimeout(1.0)
+        loop = self.protocol.loop
+        self.listener.setblocking(False)
         
-        while self.running:
-            try:
-                user_conn, addr = self.listener.accept()
-                user_conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-                logger.info(f'User connection from {addr} on port {self.port}')
-                
-                conn_id = self.next_conn_id
-                self.next_conn_id += 1
-                
-                with self.protocol.lock:
+        try:
+            while self.running:
+                try:
+                    user_conn, addr = await loop.sock_accept(self.listener)
+                    optimize_socket(user_conn)
+                    logger.info(f'User connection from {addr} on port {self.port}')
+                    
+                    conn_id = self.next_conn_id
+                    self.next_conn_id += 1
+                    
                     new_stream_id = self.protocol.next_stream_id
                     self.protocol.next_stream_id += 4
                     self.protocol.stream_to_user_conn[new_stream_id] = user_conn
-                
-                logger.info(f'Creating new stream {new_stream_id} for connection {conn_id}')
-                
-                self.pending_connections.append((new_stream_id, conn_id, user_conn))
-                
-                self.protocol._quic.send_stream_data(
-                    self.control_stream_id,
-                    struct.pack('!i', CMD_CONNECTION) + struct.pack('!i', new_stream_id) + struct.pack('!i', self.port) + struct.pack('!i', conn_id)
-                )
-                self.protocol.transmit()
-                
-                threading.Thread(
-                    target=self._forward_data_with_wait,
-                    args=(user_conn, new_stream_id, conn_id, addr),
-                    daemon=True
-                ).start()
-                
-            except socket.timeout:
-                continue
-            except Exception as e:
-                if self.running:
-                    logger.error(f'Error accepting connection on port {self.port}: {e}')
+                    self.protocol.stream_ready_events[new_stream_id] = asyncio.Event()
+                    
+                    logger.info(f'Creating new stream {new_stream_id} for connection {conn_id}')
+                    
+                    self.pending_connections.append((new_stream_id, conn_id, user_conn))
+                    
+                    self.protocol._quic.send_stream_data(
+                        self.control_stream_id,
+                        CONNECTION_STRUCT.pack(CMD_CONNECTION, new_stream_id, self.port, conn_id)
+                    )
+                    self.protocol.transmit()
+                    
+                    asyncio.create_task(self._forward_data_with_wait(user_conn, new_stream_id, conn_id, addr))
+                    
+                except Exception as e:
+                    if self.running:
+                        logger.error(f'Error accepting connection on port {self.port}: {e}')
+                        # 避免accept持续出错（如fd耗尽）时空转占满事件循环
+                        await asyncio.sleep(0.1)
+        finally:
+            self.listener.close()
 
-    def _forward_data_with_wait(self, user_conn: socket.socket, stream_id: int, conn_id: int, addr):
+    async def _forward_data_with_wait(self, user_conn: socket.socket, stream_id: int, conn_id: int, addr):
         logger.info(f'Waiting for client to acknowledge stream {stream_id}')
         
-        for _ in range(50):
-            time.sleep(0.1)
-            if stream_id in self.protocol.stream_ready:
-                break
+        ready = self.protocol.stream_ready_events.get(stream_id)
+        acked = False
+        if ready is not None:
+            try:
+                await asyncio.wait_for(ready.wait(), 5.0)
+                acked = True
+            except asyncio.TimeoutError:
+                pass
         
-        if stream_id not in self.protocol.stream_ready:
+        if not acked:
             logger.warning(f'No ACK from client for stream {stream_id}, closing connection')
+            self.protocol.stream_to_user_conn.pop(stream_id, None)
+            self.protocol.stream_ready_events.pop(stream_id, None)
             user_conn.close()
             return
         
         logger.info(f'Client acknowledged stream {stream_id}, starting data forwarding')
-        self._forward_data(user_conn, stream_id, conn_id, addr)
+        await self._forward_data(user_conn, stream_id, conn_id, addr)
 
-    def _forward_data(self, user_conn: socket.socket, stream_id: int, conn_id: int, addr):
+    async def _forward_data(self, user_conn: socket.socket, stream_id: int, conn_id: int, addr):
         quic_conn = self.protocol._quic
+        loop = self.protocol.loop
         
-        user_conn.settimeout(None)
         buffer_size = 1024 * 1024
         total_bytes = 0
-        last_log_time = time.time()
+        next_log_bytes = LOG_EVERY_BYTES
+        bytes_since_flush = 0
         
-        # 使用预编译的结构体提高性能
-        header_struct = struct.Struct('!ii')
+        # 整个转发过程复用一块缓冲区：前8字节是帧头，负载直接recv_into到帧头之后，
+        # 每帧只在交给send_stream_data时复制一次，不再有recv分配和帧头拼接
+        frame = bytearray(8 + buffer_size)
+        view = memoryview(frame)
+        body = view[8:]
         
         try:
             while True:
                 try:
-                    data = user_conn.recv(buffer_size)
-                    if not data:
+                    try:
+                        data_len = user_conn.recv_into(body)
+                    except BlockingIOError:
+                        # 用户暂时没有更多数据：先把积攒的帧一次发出，再挂起等待
+                        if bytes_since_flush:
+                            self.protocol.transmit()
+                            bytes_since_flush = 0
+                        data_len = await loop.sock_recv_into(user_conn, body)
+                    if not data_len:
                         logger.info(f'User closed connection')
                         break
                     
-                    total_bytes += len(data)
-                    current_time = time.time()
-                    if total_bytes % (10 * 1024 * 1024) == 0 and (current_time - last_log_time >= 1.0):
-                        logger.debug(f'Forwarding {len(data)} bytes from user to stream {stream_id} (total: {total_bytes // 1024}KB)')
-                        last_log_time = current_time
+                    total_bytes += data_len
+                    if total_bytes >= next_log_bytes:
+                        logger.debug(f'Forwarding {data_len} bytes from user to stream {stream_id} (total: {total_bytes // 1024}KB)')
+                        next_log_bytes = total_bytes + LOG_EVERY_BYTES
                     
-                    # 使用预编译的结构体打包，性能提升约20%
-                    header = header_struct.pack(len(data), conn_id)
-                    quic_conn.send_stream_data(stream_id, header + data)
-                    self.protocol.transmit()
+                    DATA_HEADER.pack_into(frame, 0, data_len, conn_id)
+                    quic_conn.send_stream_data(stream_id, bytes(view[:8 + data_len]))
+                    bytes_since_flush += 8 + data_len
+                    if bytes_since_flush >= FLUSH_BYTES:
+                        self.protocol.transmit()
+                        bytes_since_flush = 0
+                        # 数据持续到达时也让出事件循环，及时处理对端ACK和其他连接
+                        await asyncio.sleep(0)
                     
                 except Exception as e:
                     logger.error(f'Error forwarding data from user: {e}')
                     break
             
+            if bytes_since_flush:
+                self.protocol.transmit()
+            
             logger.info(f'Connection from {addr} closed, transferred {total_bytes} bytes')
             
         finally:
-            with self.protocol.lock:
-                if stream_id in self.protocol.stream_to_user_conn:
-                    del self.protocol.stream_to_user_conn[stream_id]
-                if stream_id in self.protocol.stream_buffers:
-                    del self.protocol.stream_buffers[stream_id]
+            if stream_id in self.protocol.stream_to_user_conn:
+                del self.protocol.stream_to_user_conn[stream_id]
+            if stream_id in self.protocol.stream_buffers:
+                del self.protocol.stream_buffers[stream_id]
+            self.protocol.stream_ready_events.pop(stream_id, None)
+            self.protocol._drop_user_send(stream_id, user_conn)
             user_conn.close()
 
     def stop(self):
         self.running = False
+        if self.accept_task is not None:
+            # 取消后由start_listening的finally关闭监听socket，避免关闭仍注册在事件循环上的fd
+            self.accept_task.cancel()
+            return
         try:
             self.listener.close()
         except Exception:
@@ -423,13 +556,19 @@ class FrpsQuicServer:
         logger.info(f'Certificate: {self.cert_path}')
         logger.info('0-RTT support enabled for reconnections')
         
-        await serve(
+        server = await quic_serve(
             self.host,
             self.port,
             configuration=configuration,
             create_protocol=self.create_protocol,
         )
         
+        # quic_serve不接受socket参数，只能从传输层取出已创建的UDP socket再调整
+        udp_sock = server._transport.get_extra_info('socket')
+        tune_udp_socket(udp_sock)
+        logger.info(f'UDP socket buffers: recv {udp_sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)} bytes, '
+                    f'send {udp_sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)} bytes')
+        
         await asyncio.Future()
 
 
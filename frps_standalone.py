@@ -4,9 +4,22 @@ import socket
 import time
 import threading
 import struct
+import select
 import selectors
 import logging
 import os
+import errno
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Optional compiled relay loop (relay_core.pyx, POSIX only); the Python loop below is the fallback
+try:
+    import relay_core
+except ImportError:
+    relay_core = None
 
 sel = selectors.DefaultSelector()
 logging.basicConfig(
@@ -22,88 +35,182 @@ CMD_REGISTER_PORT = 3
 CMD_UNREGISTER_PORT = 4
 CMD_DATA_CONNECT = 5
 
+# Control commands that carry a 4-byte port after the command word
+CMDS_WITH_PORT = frozenset({CMD_CONNECTION, CMD_REGISTER_PORT, CMD_UNREGISTER_PORT})
+CONTROL_RECV_SIZE = 64 * 1024
 
-def optimize_socket(sock):
-    try:
-        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-    except Exception as e:
-        logger.debug(f'TCP_NODELAY failed: {e}')
-    try:
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
-    except Exception as e:
-        logger.debug(f'SO_KEEPALIVE failed: {e}')
-    try:
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    except Exception as e:
-        logger.debug(f'SO_REUSEADDR failed: {e}')
-    try:
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
-    except Exception as e:
-        logger.debug(f'Buffer size setting failed: {e}')
-    try:
-        sock.setsockopt(socket.IPPROTO_TCP, TCP_KEEPIDLE, 30)
-        sock.setsockopt(socket.IPPROTO_TCP, TCP_KEEPINTVL, 10)
-        sock.setsockopt(socket.IPPROTO_TCP, TCP_KEEPCNT, 3)
-    except Exception as e:
-        logger.debug(f'TCP keepalive settings failed: {e}')
-    try:
-        if hasattr(socket, 'TCP_WINDOW_CLAMP'):
-            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_WINDOW_CLAMP, 1024 * 1024)
-    except Exception as e:
-        logger.debug(f'TCP window clamp failed: {e}')
+# Frames are fixed, so the formats are compiled once and the heartbeat is packed once
+CMD_STRUCT = struct.Struct('!i')
+CMD_PORT_STRUCT = struct.Struct('!ii')
+HEARTBEAT_FRAME = CMD_STRUCT.pack(CMD_HEARTBEAT)
 
 
 TCP_KEEPIDLE = 4
 TCP_KEEPINTVL = 5
 TCP_KEEPCNT = 6
 
+# (level, option, value) applied by optimize_socket, built once at import
+SOCK_OPTS = (
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+    (socket.SOL_SOCKET, socket.SO_REUSEADDR, 1),
+    (socket.IPPROTO_TCP, TCP_KEEPIDLE, 30),
+    (socket.IPPROTO_TCP, TCP_KEEPINTVL, 10),
+    (socket.IPPROTO_TCP, TCP_KEEPCNT, 3),
+)
+if hasattr(socket, 'TCP_WINDOW_CLAMP'):
+    SOCK_OPTS += ((socket.IPPROTO_TCP, socket.TCP_WINDOW_CLAMP, 1024 * 1024),)
+
+
+def optimize_socket(sock, buf_size=None):
+    setsockopt = sock.setsockopt
+    for level, option, value in SOCK_OPTS:
+        try:
+            setsockopt(level, option, value)
+        except OSError as e:
+            logger.debug(f'setsockopt({level}, {option}, {value}) failed: {e}')
+    # Fixed buffer sizes turn off the kernel's TCP buffer autotuning, so only set them on request
+    if buf_size is not None:
+        try:
+            setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, buf_size)
+            setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buf_size)
+        except OSError as e:
+            logger.debug(f'Buffer size setting failed: {e}')
+
 
 PKT_BUFF_SIZE = 4 * 1024 * 1024
+# Relay workers log per-connection throughput at most this often (seconds)
+STATS_REPORT_INTERVAL = 5
+
+# No SPLICE_F_MORE: on TCP it acts like MSG_MORE and holds back the tail of
+# every write, adding ~200 ms to small request/response messages
+SPLICE_FLAGS = getattr(os, 'SPLICE_F_MOVE', 0)
+PIPE_SIZE = 1024 * 1024
+
+
+def wait_socket(sock, events):
+    timeout = sock.gettimeout()
+    poller = select.poll()
+    poller.register(sock, events)
+    if not poller.poll(None if timeout is None else timeout * 1000):
+        raise socket.timeout('timed out')
+
+
+class Relay:
+    """Moves one direction of a connection pair.
+
+    On Linux the bytes go socket -> pipe -> socket with os.splice and never enter
+    user space; elsewhere (or for sockets splice rejects) they go through one
+    reusable buffer instead of a fresh bytes object per recv.
+    """
+
+    def __init__(self, conn_receiver, conn_sender):
+        self.conn_receiver = conn_receiver
+        self.conn_sender = conn_sender
+        self.pipe = None
+        self.view = None
+        if hasattr(os, 'splice'):
+            try:
+                self.pipe = os.pipe()
+                if hasattr(fcntl, 'F_SETPIPE_SZ'):
+                    try:
+                        fcntl.fcntl(self.pipe[1], fcntl.F_SETPIPE_SZ, PIPE_SIZE)
+                    except OSError:
+                        pass
+            except OSError as e:
+                logger.debug(f'splice pipe unavailable: {e}')
+        if self.pipe is None:
+            self.use_buffer()
+
+    def use_buffer(self):
+        self.close()
+        self.view = memoryview(bytearray(PKT_BUFF_SIZE))
+
+    def recv(self):
+        if self.pipe is None:
+            return self.conn_receiver.recv_into(self.view)
+        while True:
+            try:
+                return os.splice(self.conn_receiver.fileno(), self.pipe[1], PKT_BUFF_SIZE, flags=SPLICE_FLAGS)
+            except BlockingIOError:
+                wait_socket(self.conn_receiver, select.POLLIN)
+            except OSError as e:
+                if e.errno != errno.EINVAL:
+                    raise
+                logger.debug(f'splice not supported, falling back to buffered relay: {e}')
+                self.use_buffer()
+                return self.conn_receiver.recv_into(self.view)
+
+    def send(self, data_len):
+        if self.pipe is None:
+            self.conn_sender.sendall(self.view[:data_len])
+            return
+        while data_len:
+            try:
+                data_len -= os.splice(self.pipe[0], self.conn_sender.fileno(), data_len, flags=SPLICE_FLAGS)
+            except BlockingIOError:
+                wait_socket(self.conn_sender, select.POLLOUT)
+
+    def close(self):
+        if self.pipe is not None:
+            for fd in self.pipe:
+                os.close(fd)
+            self.pipe = None
+
+
+def native_relay(conn_receiver, conn_sender, stats, add_stats):
+    # The compiled loop runs without the GIL and only calls back about once per megabyte
+    def account(count):
+        add_stats(count)
+        if time.monotonic() - stats.last_report >= STATS_REPORT_INTERVAL:
+            stats.report()
+    
+    return relay_core.relay_loop(conn_receiver.fileno(), conn_sender.fileno(), account,
+                                 conn_receiver.gettimeout(), conn_sender.gettimeout(), PKT_BUFF_SIZE)
 
 
 class TransferStats:
+    # bytes_sent is only written by the forward worker and bytes_recv only by the
+    # reverse one, so the counters need no lock; report() diffs them against the
+    # totals it saw last time instead of resetting them.
     def __init__(self, name):
         self.name = name
         self.bytes_sent = 0
         self.bytes_recv = 0
-        self.start_time = time.time()
-        self.last_report = time.time()
-        self.lock = threading.Lock()
+        self.reported_sent = 0
+        self.reported_recv = 0
+        self.start_time = time.monotonic()
+        self.last_report = self.start_time
 
     def add_sent(self, count):
-        with self.lock:
-            self.bytes_sent += count
+        self.bytes_sent += count
 
     def add_recv(self, count):
-        with self.lock:
-            self.bytes_recv += count
+        self.bytes_recv += count
 
     def report(self):
-        with self.lock:
-            current_time = time.time()
-            elapsed = current_time - self.last_report
-            total_elapsed = current_time - self.start_time
+        current_time = time.monotonic()
+        elapsed = current_time - self.last_report
+        total_elapsed = current_time - self.start_time
+        
+        if elapsed >= STATS_REPORT_INTERVAL:
+            bytes_sent = self.bytes_sent
+            bytes_recv = self.bytes_recv
+            sent_speed = ((bytes_sent - self.reported_sent) / 1024 / 1024) / elapsed
+            recv_speed = ((bytes_recv - self.reported_recv) / 1024 / 1024) / elapsed
+            total_sent = bytes_sent / 1024 / 1024
+            total_recv = bytes_recv / 1024 / 1024
             
-            if elapsed >= 5:
-                sent_speed = (self.bytes_sent / 1024 / 1024) / elapsed
-                recv_speed = (self.bytes_recv / 1024 / 1024) / elapsed
-                total_sent = self.bytes_sent / 1024 / 1024
-                total_recv = self.bytes_recv / 1024 / 1024
-                
-                logger.info(f'{self.name} - Sent: {total_sent:.2f} MB ({sent_speed:.2f} MB/s), '
-                          f'Recv: {total_recv:.2f} MB ({recv_speed:.2f} MB/s), '
-                          f'Time: {total_elapsed:.1f}s')
-                
-                self.bytes_sent = 0
-                self.bytes_recv = 0
-                self.last_report = current_time
+            logger.info(f'{self.name} - Sent: {total_sent:.2f} MB ({sent_speed:.2f} MB/s), '
+                      f'Recv: {total_recv:.2f} MB ({recv_speed:.2f} MB/s), '
+                      f'Time: {total_elapsed:.1f}s')
+            
+            self.reported_sent = bytes_sent
+            self.reported_recv = bytes_recv
+            self.last_report = current_time
 
 
 def tcp_mapping_worker(conn_receiver, conn_sender, stats, direction):
-    optimize_socket(conn_receiver)
-    optimize_socket(conn_sender)
-    
     try:
         peer_recv = conn_receiver.getpeername()
         peer_send = conn_sender.getpeername()
@@ -111,36 +218,43 @@ def tcp_mapping_worker(conn_receiver, conn_sender, stats, direction):
     except Exception as e:
         logger.debug(f'Could not get peer names: {e}')
     
-    last_activity = time.time()
+    last_activity = time.monotonic()
     last_recv_time = last_activity
     last_send_time = last_activity
     total_bytes = 0
     recv_bytes = 0
     send_bytes = 0
     
+    relay = None if relay_core else Relay(conn_receiver, conn_sender)
+    add_stats = stats.add_sent if direction == 'forward' else stats.add_recv
+    
     try:
         while True:
             try:
-                data = conn_receiver.recv(PKT_BUFF_SIZE)
-                if not data:
+                if relay is None:
+                    total_bytes = recv_bytes = send_bytes = native_relay(conn_receiver, conn_sender, stats, add_stats)
+                    logger.debug(f'{direction}: Connection closed by receiver (after {total_bytes / 1024 / 1024:.2f} MB)')
+                    break
+                
+                data_len = relay.recv()
+                if not data_len:
                     logger.debug(f'{direction}: Connection closed by receiver (after {total_bytes / 1024 / 1024:.2f} MB)')
                     break
                 
-                data_len = len(data)
                 total_bytes += data_len
                 recv_bytes += data_len
                 
-                if direction == 'forward':
-                    stats.add_sent(data_len)
-                else:
-                    stats.add_recv(data_len)
+                add_stats(data_len)
                 
-                last_recv_time = time.time()
+                # The workers drive the periodic report themselves instead of a reporter thread
+                last_recv_time = time.monotonic()
+                if last_recv_time - stats.last_report >= STATS_REPORT_INTERVAL:
+                    stats.report()
                 
                 try:
-                    conn_sender.sendall(data)
+                    relay.send(data_len)
                     send_bytes += data_len
-                    last_send_time = time.time()
+                    last_send_time = time.monotonic()
                 except ConnectionResetError as e:
                     logger.error(f'{direction}: Connection reset while sending ({data_len} bytes): {e}')
                     logger.error(f'{direction}: Connection state - recv: {recv_bytes/1024/1024:.2f} MB, '
@@ -184,13 +298,15 @@ def tcp_mapping_worker(conn_receiver, conn_sender, stats, direction):
                            f'send: {send_bytes/1024/1024:.2f} MB')
                 break
         
-        elapsed = time.time() - last_activity
+        elapsed = time.monotonic() - last_activity
         logger.info(f'{direction}: Stopped after transferring {total_bytes / 1024 / 1024:.2f} MB '
                    f'(idle for {elapsed:.1f}s)')
         
     except Exception as e:
         logger.error(f'{direction}: Fatal error: {type(e).__name__}: {e}')
     finally:
+        if relay is not None:
+            relay.close()
         try:
             conn_receiver.close()
         except Exception as e:
@@ -202,9 +318,8 @@ def tcp_mapping_worker(conn_receiver, conn_sender, stats, direction):
 
 
 def join(connA, connB):
-    optimize_socket(connA)
-    optimize_socket(connB)
-    
+    # Both sockets were optimized where they were created (or inherited the options
+    # from their listening socket), so the relay does not set them again
     try:
         peer_a = connA.getpeername()
         peer_b = connB.getpeername()
@@ -221,9 +336,6 @@ def join(connA, connB):
     t1.start()
     t2.start()
     
-    report_thread = threading.Thread(target=stats.report, daemon=True)
-    report_thread.start()
-    
     return t1, t2
 
 
@@ -233,6 +345,7 @@ class ProxyManager:
         self.port_listeners = {}
         self.user_queues = {}
         self.data_connections = {}
+        self.tcp_buf_size = None
         self.lock = threading.Lock()
 
     def register_frpc(self, frpc_conn, addr):
@@ -274,6 +387,7 @@ class ProxyManager:
             try:
                 listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
                 listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                optimize_socket(listener, self.tcp_buf_size)
                 listener.bind(('0.0.0.0', port))
                 listener.listen(100)
                 listener.setblocking(False)
@@ -364,7 +478,6 @@ class ProxyManager:
     def accept_user_connection(self, sock, mask, port):
         try:
             user_conn, addr = sock.accept()
-            optimize_socket(user_conn)
             user_conn.setblocking(True)
             
             logger.info(f'Received user connection from {addr} on port {port}')
@@ -373,7 +486,7 @@ class ProxyManager:
                 frpc_info = self.get_frpc_conn(port)
                 if frpc_info:
                     try:
-                        frpc_info['conn'].sendall(struct.pack('!i', CMD_CONNECTION) + struct.pack('!i', port))
+                        frpc_info['conn'].sendall(CMD_PORT_STRUCT.pack(CMD_CONNECTION, port))
                         logger.debug(f'Sent connection request for port {port} to FRPC')
                     except Exception as e:
                         logger.error(f'Failed to send connection request: {type(e).__name__}: {e}')
@@ -392,13 +505,17 @@ proxy_manager = ProxyManager()
 
 
 class Frps(threading.Thread):
-    def __init__(self, frps_port):
+    def __init__(self, frps_port, tcp_buf_size=None):
         threading.Thread.__init__(self)
         self.frps_port = frps_port
+        self.tcp_buf_size = tcp_buf_size
+        proxy_manager.tcp_buf_size = tcp_buf_size
         self.data_port = frps_port + 1
         
         self.frps_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.frps_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Accepted sockets inherit these options, so they are set once here rather than per accept
+        optimize_socket(self.frps_sock, tcp_buf_size)
         self.frps_sock.bind(('0.0.0.0', self.frps_port))
         self.frps_sock.setblocking(False)
         self.frps_sock.listen(200)
@@ -406,6 +523,7 @@ class Frps(threading.Thread):
         
         self.data_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.data_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        optimize_socket(self.data_sock, tcp_buf_size)
         self.data_sock.bind(('0.0.0.0', self.data_port))
         self.data_sock.setblocking(False)
         self.data_sock.listen(200)
@@ -421,11 +539,10 @@ class Frps(threading.Thread):
     def accept_frpc_connection(self, sock, mask):
         try:
             frpc_conn, addr = sock.accept()
-            optimize_socket(frpc_conn)
             frpc_conn.setblocking(False)
             conn_id = proxy_manager.register_frpc(frpc_conn, addr)
             sel.register(frpc_conn, selectors.EVENT_READ, 
-                     lambda c, m, cid=conn_id: self.handle_frpc_data(c, m, cid))
+                     lambda c, m, cid=conn_id, buf=bytearray(): self.handle_frpc_data(c, m, cid, buf))
             logger.info(f'Accepted FRPC connection from {addr}')
         except Exception as e:
             logger.error(f'Error accepting FRPC connection: {type(e).__name__}: {e}')
@@ -433,13 +550,24 @@ class Frps(threading.Thread):
     def accept_data_connection(self, sock, mask):
         try:
             data_conn, addr = sock.accept()
-            optimize_socket(data_conn)
+            # frpc may open data connections ahead of time, so wait for the handshake
+            # in the selector instead of blocking the loop on recv
+            data_conn.setblocking(False)
+            sel.register(data_conn, selectors.EVENT_READ,
+                         lambda c, m, a=addr: self.handle_data_handshake(c, a))
+        except Exception as e:
+            logger.error(f'Error accepting data connection: {type(e).__name__}: {e}')
+
+    def handle_data_handshake(self, data_conn, addr):
+        try:
+            sel.unregister(data_conn)
+            data_conn.settimeout(5)
             
             try:
-                data = data_conn.recv(8)
+                data = data_conn.recv(8, socket.MSG_WAITALL)
+                data_conn.settimeout(None)
                 if len(data) == 8:
-                    cmd = struct.unpack('!i', data[:4])[0]
-                    port = struct.unpack('!i', data[4:8])[0]
+                    cmd, port = CMD_PORT_STRUCT.unpack(data)
                     
                     if cmd == CMD_DATA_CONNECT:
                         logger.info(f'Data connection request from {addr} for port {port}')
@@ -466,11 +594,14 @@ class Frps(threading.Thread):
                 logger.error(f'Error in data connection handshake: {type(e).__name__}: {e}')
                 data_conn.close()
         except Exception as e:
-            logger.error(f'Error accepting data connection: {type(e).__name__}: {e}')
+            logger.error(f'Error handling data connection from {addr}: {type(e).__name__}: {e}')
+            data_conn.close()
 
-    def handle_frpc_data(self, frpc_conn, mask, conn_id):
+    def handle_frpc_data(self, frpc_conn, mask, conn_id, buf):
+        # Drain everything frpc has queued in one recv and dispatch every complete
+        # frame; a partial frame stays in this connection's buffer until the next read
         try:
-            data = frpc_conn.recv(4)
+            data = frpc_conn.recv(CONTROL_RECV_SIZE)
             if not data:
                 logger.info(f'FRPC connection {conn_id} closed')
                 try:
@@ -480,35 +611,41 @@ class Frps(threading.Thread):
                 proxy_manager.unregister_frpc(conn_id)
                 return
             
-            cmd = struct.unpack('!i', data)[0]
-            logger.debug(f'Received command: {cmd} from FRPC {conn_id}')
-            
-            if cmd == CMD_HEARTBEAT:
-                proxy_manager.update_heartbeat(conn_id)
-                try:
-                    frpc_conn.sendall(struct.pack('!i', CMD_HEARTBEAT))
-                except Exception as e:
-                    logger.error(f'Failed to send heartbeat response: {type(e).__name__}: {e}')
+            buf += data
+            offset = 0
+            replies = []
+            while len(buf) - offset >= 4:
+                cmd = CMD_STRUCT.unpack_from(buf, offset)[0]
+                port = None
+                if cmd in CMDS_WITH_PORT:
+                    if len(buf) - offset < 8:
+                        break
+                    port = CMD_STRUCT.unpack_from(buf, offset + 4)[0]
+                    offset += 8
+                else:
+                    offset += 4
+                logger.debug(f'Received command: {cmd} from FRPC {conn_id}')
                 
-            elif cmd == CMD_REGISTER_PORT:
-                port_data = frpc_conn.recv(4)
-                if port_data:
-                    port = struct.unpack('!i', port_data)[0]
+                if cmd == CMD_HEARTBEAT:
+                    proxy_manager.update_heartbeat(conn_id)
+                    replies.append(HEARTBEAT_FRAME)
+                    
+                elif cmd == CMD_REGISTER_PORT:
                     if proxy_manager.register_port(conn_id, port):
-                        frpc_conn.sendall(struct.pack('!i', CMD_REGISTER_PORT) + 
-                                        struct.pack('!i', port))
+                        replies.append(CMD_PORT_STRUCT.pack(CMD_REGISTER_PORT, port))
                     else:
-                        frpc_conn.sendall(struct.pack('!i', CMD_REGISTER_PORT) + 
-                                        struct.pack('!i', 0))
-                
-            elif cmd == CMD_UNREGISTER_PORT:
-                port_data = frpc_conn.recv(4)
-                if port_data:
-                    port = struct.unpack('!i', port_data)[0]
+                        replies.append(CMD_PORT_STRUCT.pack(CMD_REGISTER_PORT, 0))
+                    
+                elif cmd == CMD_UNREGISTER_PORT:
                     proxy_manager.unregister_port(port)
-                    frpc_conn.sendall(struct.pack('!i', CMD_UNREGISTER_PORT) + 
-                                    struct.pack('!i', port))
-                
+                    replies.append(CMD_PORT_STRUCT.pack(CMD_UNREGISTER_PORT, port))
+            del buf[:offset]
+            
+            if replies:
+                frpc_conn.sendall(b''.join(replies))
+        
+        except BlockingIOError:
+            pass
         except Exception as e:
             logger.error(f'Error handling FRPC data: {type(e).__name__}: {e}')
             try:
@@ -533,13 +670,15 @@ class Frps(threading.Thread):
 
 
 def main():
-    if len(sys.argv) != 2:
+    if len(sys.argv) not in (2, 4) or (len(sys.argv) == 4 and sys.argv[2] != '--tcp-buf'):
         print('FRPS Server v2.4 - High Performance Reverse Proxy with Dynamic Port Mapping')
         print('')
-        print('Usage: frps <frps_port>')
+        print('Usage: frps <frps_port> [--tcp-buf BYTES]')
         print('')
         print('Arguments:')
         print('  frps_port    Port for FRPC clients to connect (default: 7000)')
+        print('  --tcp-buf    Fixed SO_SNDBUF/SO_RCVBUF size (default: kernel autotuning;')
+        print('               values above net.core.wmem_max/rmem_max are capped)')
         print('')
         print('Note: Data connections will use port + 1 (e.g., 7001 if control port is 7000)')
         print('')
@@ -550,13 +689,14 @@ def main():
         print('  - Dynamic port mapping: Server automatically listens on same ports as client')
         print('  - Auto port registration: Client scans local ports and notifies server')
         print('  - Separated control and data channels for better reliability')
-        print('  - Ultra high performance: 4MB buffer, TCP window optimization')
+        print('  - Ultra high performance: 4MB relay buffer, kernel-autotuned TCP buffers')
         print('  - Detailed logging and performance monitoring')
         print('  - Connection pooling and keep-alive')
         sys.exit(1)
     
     try:
         frps_port = int(sys.argv[1])
+        tcp_buf_size = int(sys.argv[3]) if len(sys.argv) == 4 else None
         
         print(f'FRPS Server v2.4')
         print(f'Control port: {frps_port}')
@@ -564,9 +704,10 @@ def main():
         print('Dynamic port mapping enabled')
         print('Performance monitoring enabled')
         print('Ultra high performance mode (4MB buffer)')
+        print(f'TCP buffers: {tcp_buf_size if tcp_buf_size else "kernel autotuning"}')
         print('')
         
-        Frps(frps_port=frps_port).start()
+        Frps(frps_port=frps_port, tcp_buf_size=tcp_buf_size).start()
         
     except ValueError:
         print('Error: Port must be an integer')
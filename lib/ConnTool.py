@@ -4,10 +4,21 @@ import sys
 import socket
 import logging
 import threading
+import select
 import os
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 PKT_BUFF_SIZE = 65536
 
+# os.splice only exists on Linux (Python 3.10+); elsewhere splice_join falls back to join
+HAS_SPLICE = hasattr(os, 'splice')
+SPLICE_CHUNK = 1024 * 1024
+SPLICE_FLAGS = os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK if HAS_SPLICE else 0
+
 logger = logging.getLogger("Proxy Logging")
 formatter = logging.Formatter('%(name)-12s %(asctime)s %(levelname)-8s %(lineno)-4d %(message)s', '%Y %b %d %a %H:%M:%S')
 
@@ -17,44 +28,48 @@ logger.addHandler(stream_handler)
 logger.setLevel(logging.INFO)
 
 
+# (level, option, value) applied to every connection; options the platform
+# lacks are dropped here so optimize_socket needs no per-option checks.
+SOCK_OPTS = tuple(
+    (level, getattr(socket, name), value)
+    for level, name, value in (
+        (socket.IPPROTO_TCP, 'TCP_NODELAY', 1),
+        (socket.SOL_SOCKET, 'SO_KEEPALIVE', 1),
+        (socket.SOL_SOCKET, 'SO_REUSEADDR', 1),
+        (socket.IPPROTO_TCP, 'TCP_KEEPIDLE', 30),
+        (socket.IPPROTO_TCP, 'TCP_KEEPINTVL', 10),
+        (socket.IPPROTO_TCP, 'TCP_KEEPCNT', 3),
+        # Report writable once unsent data drops under 128 KiB, so relays
+        # wake sooner without pinning SO_SNDBUF and losing autotuning
+        (socket.IPPROTO_TCP, 'TCP_NOTSENT_LOWAT', 128 * 1024),
+    )
+    if hasattr(socket, name)
+)
+
+
 def optimize_socket(sock):
-    try:
-        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-    except Exception:
-        pass
-    
-    try:
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
-    except Exception:
-        pass
-    
-    try:
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    except Exception:
-        pass
-    
-    try:
-        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30)
-        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10)
-        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
-    except Exception:
-        pass
+    setsockopt = sock.setsockopt
+    for level, option, value in SOCK_OPTS:
+        try:
+            setsockopt(level, option, value)
+        except OSError:
+            pass
 
 
 def tcp_mapping_worker(conn_receiver, conn_sender):
-    optimize_socket(conn_receiver)
-    optimize_socket(conn_sender)
+    # One buffer per direction, reused for every chunk instead of a new bytes object per recv
+    buf = memoryview(bytearray(PKT_BUFF_SIZE))
     
     logger.debug("start")
     try:
         while True:
-            data = conn_receiver.recv(PKT_BUFF_SIZE)
-            if not data:
+            data_len = conn_receiver.recv_into(buf)
+            if not data_len:
                 logger.debug('No more data is received.')
                 break
             
             try:
-                conn_sender.sendall(data)
+                conn_sender.sendall(buf[:data_len])
             except Exception:
                 logger.error('Failed sending data.')
                 break
@@ -72,9 +87,7 @@ def tcp_mapping_worker(conn_receiver, conn_sender):
 
 
 def join(connA, connB):
-    optimize_socket(connA)
-    optimize_socket(connB)
-    
+    # Callers optimize their sockets when they create or accept them
     t1 = threading.Thread(target=tcp_mapping_worker, args=(connA, connB), daemon=True)
     t2 = threading.Thread(target=tcp_mapping_worker, args=(connB, connA), daemon=True)
     
@@ -84,6 +97,87 @@ def join(connA, connB):
     return t1, t2
 
 
+def splice_worker(connA, connB):
+    # Both directions in one thread: poll says which socket is ready and
+    # os.splice moves the bytes socket -> pipe -> socket inside the kernel.
+    # Each direction is [src_fd, dst_fd, pipe_r, pipe_w, bytes_in_pipe].
+    directions = []
+    pipes = []
+    poller = select.poll()
+    try:
+        for src, dst in ((connA, connB), (connB, connA)):
+            src.setblocking(False)
+            r, w = os.pipe()
+            pipes += (r, w)
+            if fcntl is not None and hasattr(fcntl, 'F_SETPIPE_SZ'):
+                try:
+                    fcntl.fcntl(w, fcntl.F_SETPIPE_SZ, SPLICE_CHUNK)
+                except OSError:
+                    pass
+            directions.append([src.fileno(), dst.fileno(), r, w, 0])
+        
+        fds = (connA.fileno(), connB.fileno())
+        while True:
+            masks = dict.fromkeys(fds, 0)
+            for src, dst, _, _, pending in directions:
+                if pending:
+                    masks[dst] |= select.POLLOUT
+                else:
+                    masks[src] |= select.POLLIN
+            for fd, mask in masks.items():
+                if mask:
+                    poller.register(fd, mask)
+                else:
+                    try:
+                        poller.unregister(fd)
+                    except KeyError:
+                        pass
+            
+            ready = dict(poller.poll())
+            for direction in directions:
+                src, dst, r, w, pending = direction
+                if not pending:
+                    if src not in ready:
+                        continue
+                    try:
+                        pending = os.splice(src, w, SPLICE_CHUNK, flags=SPLICE_FLAGS)
+                    except BlockingIOError:
+                        continue
+                    if not pending:
+                        logger.debug('No more data is received.')
+                        return
+                elif dst not in ready:
+                    continue
+                
+                while pending:
+                    try:
+                        pending -= os.splice(r, dst, pending, flags=SPLICE_FLAGS)
+                    except BlockingIOError:
+                        break
+                direction[4] = pending
+    except Exception as e:
+        logger.debug(f'Connection error: {e}')
+    finally:
+        for fd in pipes:
+            os.close(fd)
+        for conn in (connA, connB):
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def splice_join(connA, connB):
+    # One thread per pair instead of join's two, and no copy through user space
+    if not HAS_SPLICE:
+        return join(connA, connB)
+    
+    t = threading.Thread(target=splice_worker, args=(connA, connB), daemon=True)
+    t.start()
+    
+    return t
+
+
 if __name__ == '__main__':
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     sock.bind(('0.0.0.0', 8080))
@@ -1,5 +1,8 @@
 #!/usr/bin/env python
+import errno
+import struct
 import socket
+import selectors
 import time
 import logging
 import threading
@@ -11,6 +14,67 @@ logging.basicConfig(
 )
 logger = logging.getLogger('PortScanner')
 
+CONNECT_PENDING = tuple(
+    getattr(errno, name) for name in ('EINPROGRESS', 'EWOULDBLOCK', 'EAGAIN', 'WSAEWOULDBLOCK')
+    if hasattr(errno, name)
+)
+SOCK_NONBLOCK = getattr(socket, 'SOCK_NONBLOCK', 0)
+# select() on Windows handles at most 512 sockets, so probes are issued in batches below that
+MAX_PROBE_BATCH = 500
+# SO_LINGER {on, 0}: closing a probe that connected sends RST instead of FIN
+PROBE_LINGER = struct.pack('ii', 1, 0)
+
+
+# Connect-probes every port on addr at once without blocking and returns the ports that
+# accepted, all sharing one deadline; pass at most MAX_PROBE_BATCH ports per call.
+# With reset=True a connected probe is closed with RST: repeated scans leave no TIME_WAIT
+# entries behind, but the scanned service sees ECONNRESET instead of a normal close.
+# Pass reset=False for services that log or misbehave on resets.
+def probe_batch(addr, ports, timeout, reset=True):
+    active_ports = []
+    pending = {}
+    sel = selectors.DefaultSelector()
+    
+    try:
+        for port in ports:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM | SOCK_NONBLOCK)
+            if not SOCK_NONBLOCK:
+                sock.setblocking(False)
+            
+            result = sock.connect_ex((addr, port))
+            if result in CONNECT_PENDING:
+                pending[sock] = port
+                sel.register(sock, selectors.EVENT_WRITE, port)
+                continue
+            
+            if result == 0:
+                active_ports.append(port)
+                if reset:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, PROBE_LINGER)
+            sock.close()
+        
+        deadline = time.monotonic() + timeout
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            
+            for key, _ in sel.select(remaining):
+                sock = key.fileobj
+                sel.unregister(sock)
+                if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                    active_ports.append(key.data)
+                    if reset:
+                        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, PROBE_LINGER)
+                sock.close()
+                del pending[sock]
+    finally:
+        for sock in pending:
+            sock.close()
+        sel.close()
+    
+    return active_ports
+
 
 class PortScanner:
     def __init__(self, scan_interval=30, custom_ports=None, max_workers=100):
@@ -59,10 +123,35 @@ class PortScanner:
         
         return sorted(active_ports)
 
-    def scan(self, host='127.0.0.1'):
+    def scan_batch(self, host='127.0.0.1', ports=None, timeout=0.5, batch_size=MAX_PROBE_BATCH):
+        if ports is None:
+            if self.custom_ports:
+                ports = self.custom_ports
+            else:
+                ports = range(1, 65536)
+        
+        ports = list(ports)
+        logger.info(f'Batch scanning {len(ports)} ports, {batch_size} per batch...')
+        
+        try:
+            addr = socket.gethostbyname(host)
+        except OSError as e:
+            logger.error(f'Failed to resolve {host}: {e}')
+            return []
+        
+        active_ports = set()
+        for i in range(0, len(ports), batch_size):
+            active_ports.update(probe_batch(addr, ports[i:i + batch_size], timeout))
+        
+        return sorted(active_ports)
+
+    def scan(self, host='127.0.0.1', batch=False):
         logger.info('Starting port scan...')
         
-        current_active = set(self.scan_ports_fast(host))
+        if batch:
+            current_active = set(self.scan_batch(host))
+        else:
+            current_active = set(self.scan_ports_fast(host))
         
         with self.lock:
             new_ports = current_active - self.active_ports
@@ -6,14 +6,50 @@ from Cython.Build import cythonize
 import sys
 import os
 
+# 最高优化级别 + 链接时优化（不使用-march=native，.pyd/.so需要能复制到其他机器）
+if sys.platform == "win32":
+    CC_FLAGS = ["/O2", "/GL"]
+    LINK_FLAGS = ["/LTCG"]
+else:
+    CC_FLAGS = ["-O3", "-funroll-loops", "-flto", "-fno-plt"]
+    LINK_FLAGS = ["-flto"]
+
 ext = Extension(
     "frp_core",  # 编译后的模块名
     sources=["frp_core_single.pyx"],
-    extra_compile_args=["-O3"],  # 最高优化级别
+    extra_compile_args=CC_FLAGS,
+    extra_link_args=LINK_FLAGS,
+)
+
+auto_ext = Extension(
+    "auto_frpc_core",  # auto_frpc端口稳定性统计
+    sources=["auto_frpc_core.pyx"],
+    extra_compile_args=CC_FLAGS,
+    extra_link_args=LINK_FLAGS,
 )
 
+ext_modules = [ext, auto_ext]
+
+# 独立版frpc/frps的转发循环（splice/recv/send），只支持POSIX；Windows继续用纯Python循环
+if sys.platform != "win32":
+    ext_modules.append(Extension(
+        "relay_core",
+        sources=["relay_core.pyx"],
+        extra_compile_args=CC_FLAGS,
+        extra_link_args=LINK_FLAGS,
+    ))
+
 setup(
     name="frp-core",
-    ext_modules=cythonize([ext], language_level="3"),
+    ext_modules=cythonize(
+        ext_modules,
+        language_level="3",
+        compiler_directives={
+            'profile': False,
+            'linetrace': False,
+            'cdivision': True,
+            'boundscheck': False,
+        },
+    ),
     zip_safe=False,
 )